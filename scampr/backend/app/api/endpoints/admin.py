@@ -0,0 +1,38 @@
+# app/api/endpoints/admin.py
+from typing import Any, Dict, List
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from ...core.auth import get_current_admin
+from ...core.config import settings
+from ...core.profiling import request_profiler, blocking_detector
+from ...models.user import User
+
+router = APIRouter()
+
+@router.get("/profiles", response_model=List[Dict[str, Any]])
+async def list_profiles(admin: User = Depends(get_current_admin)):
+    """List the request profiles in the ring buffer, newest first"""
+    return request_profiler.summaries()
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def download_profile(profile_id: str, admin: User = Depends(get_current_admin)):
+    """Download a request profile as folded stacks (flamegraph.pl / speedscope)"""
+    recording = request_profiler.get(profile_id)
+    if recording is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    return PlainTextResponse(
+        recording.folded(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+    )
+
+@router.get("/loop-blocks", response_model=Dict[str, Any])
+async def list_loop_blocks(admin: User = Depends(get_current_admin)):
+    """Recent stalls of the event loop, with the stack that was blocking it"""
+    return {
+        "enabled": settings.BLOCKING_DETECTOR_ENABLED,
+        "threshold_ms": settings.BLOCKING_THRESHOLD_MS,
+        "events": list(reversed(blocking_detector.events)),
+    }
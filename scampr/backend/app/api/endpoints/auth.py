@@ -3,12 +3,21 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from collections import defaultdict
+from typing import Dict, Optional, Set
 from ...core.config import settings
+from ...core.cache import invalidate
+from ...core.change_streams import publish_local
 from ...core.auth import create_access_token, get_password_hash, verify_password, get_current_user
+from ...core.tasks import task_queue
 from ...models.user import User
 from ...models.tree import Tree
 from ...models.review import Review
+from ...models.user_tree import UserTree
+from ...services.fanout import rename_user
+from ...services.recommendations import record_reviews_removed, remove_tree_from_similarities
+from ...services.tree_stats import refresh_tree_stats
+from ...services.trending import activity_weight, apply_trending_weights
 
 router = APIRouter()
 
@@ -108,9 +117,14 @@ async def sync_firebase_user(user_data: UserSync):
     if existing_user:
         # Update existing user with Firebase UID if not set
         if not existing_user.firebase_uid:
-            existing_user.firebase_uid = user_data.firebase_uid
-            existing_user.display_name = user_data.display_name
-            await existing_user.save()
+            if existing_user.display_name != user_data.display_name:
+                # Rename fans out to the user_name copies on trees and reviews
+                if await rename_user(existing_user, user_data.display_name, firebase_uid=user_data.firebase_uid) is None:
+                    raise HTTPException(status_code=404, detail="User not found")
+            else:
+                existing_user.firebase_uid = user_data.firebase_uid
+                await existing_user.save()
+                invalidate(User.Settings.name, str(existing_user.id))
         user = existing_user
     else:
         # Create new user (should not happen in Firebase flow, but just in case)
@@ -165,21 +179,47 @@ async def delete_user_account(user_id: str, current_user: User = Depends(get_cur
         )
     
     try:
-        # Delete all reviews by this user
+        # Delete all reviews by this user, then refresh the aggregates of the trees they reviewed
+        # and take back the trending weight the reviews added
+        trending: Dict[str, float] = defaultdict(float)
+        cursor = Review.get_motor_collection().find({"user_id": str(current_user.id)}, {"tree_id": 1, "created_at": 1})
+        async for review in cursor:
+            trending[review["tree_id"]] -= activity_weight(review["created_at"])
+        reviewed_tree_ids = list(trending)
         await Review.find(Review.user_id == str(current_user.id)).delete()
+        for tree_id in reviewed_tree_ids:
+            task_queue.enqueue(f"tree-stats:{tree_id}", refresh_tree_stats, tree_id)
+        if trending:
+            task_queue.enqueue(f"trending-removed-user:{current_user.id}", apply_trending_weights, dict(trending))
+        task_queue.enqueue(f"similarities-removed:{current_user.id}", record_reviews_removed, str(current_user.id), reviewed_tree_ids)
         
         # Get all trees added by this user
         user_trees = await Tree.find(Tree.user_id == str(current_user.id)).to_list()
         
-        # Delete all reviews for trees added by this user
-        for tree in user_trees:
-            await Review.find(Review.tree_id == tree.id).delete()
+        # Delete all reviews for trees added by this user; their authors' co-reviews go with them
+        user_tree_ids = [str(tree.id) for tree in user_trees]
+        reviews_of_trees = Review.get_motor_collection().find({"tree_id": {"$in": user_tree_ids}}, {"user_id": 1, "tree_id": 1})
+        removed_by_reviewer: Dict[str, Set[str]] = defaultdict(set)
+        async for review in reviews_of_trees:
+            removed_by_reviewer[review["user_id"]].add(review["tree_id"])
+        await Review.find({"tree_id": {"$in": user_tree_ids}}).delete()
+        for reviewer_id, tree_ids in removed_by_reviewer.items():
+            task_queue.enqueue(
+                f"similarities-removed:{reviewer_id}:{current_user.id}", record_reviews_removed, reviewer_id, sorted(tree_ids)
+            )
         
         # Delete all trees added by this user
         await Tree.find(Tree.user_id == str(current_user.id)).delete()
+        for tree in user_trees:
+            await publish_local(Tree.Settings.name, "delete", tree.id)
+            task_queue.enqueue(f"tree-similarities:{tree.id}", remove_tree_from_similarities, str(tree.id))
+        
+        # Delete the user's climbed/added tree lists
+        await UserTree.find(UserTree.user_id == str(current_user.id)).delete()
         
         # Finally, delete the user account
         await current_user.delete()
+        invalidate(User.Settings.name, str(current_user.id))
         
         return {"message": "Account deleted successfully"}
         
@@ -0,0 +1,35 @@
+# app/api/endpoints/images.py
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from ...core.auth import get_current_user
+from ...models.user import User
+from ...services.images import store_image, UploadTooLarge
+
+router = APIRouter()
+
+def image_response(image) -> dict:
+    return {
+        "id": image.content_hash,
+        "variants": {name: variant.model_dump() for name, variant in image.variants.items()},
+        "size_bytes": image.size_bytes
+    }
+
+async def upload_image(file: UploadFile, current_user: User) -> dict:
+    """Store an upload, mapping failures to HTTP errors"""
+    try:
+        image = await store_image(file, str(current_user.id))
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Image is too large"
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return image_response(image)
+
+@router.post("/", response_model=dict, status_code=status.HTTP_201_CREATED)
+async def create_image(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+    """Upload an image and get URLs of its thumbnail and resized variants"""
+    return await upload_image(file, current_user)
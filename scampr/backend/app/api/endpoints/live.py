@@ -0,0 +1,58 @@
+# app/api/endpoints/live.py
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, List
+from fastapi import APIRouter, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
+from ...core.config import settings
+from ...core.geo import encode_geohash, REGION_PRECISIONS
+from ...services.live_feed import hub, tree_topic, area_topic
+
+router = APIRouter()
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _event_stream(topics: List[str]) -> StreamingResponse:
+    """Server-Sent Events response that stays subscribed until the client disconnects"""
+    if hub.at_capacity():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Live feed is at capacity, retry later",
+            headers={"Retry-After": str(settings.LIVE_RETRY_MS // 1000)}
+        )
+    
+    async def stream() -> AsyncIterator[str]:
+        # Subscribing inside the generator ties the subscription to the response's lifetime
+        subscription = hub.subscribe(topics)
+        if subscription is None:
+            return
+        yield f"retry: {settings.LIVE_RETRY_MS}\n\n"
+        async for event in subscription.events(settings.LIVE_HEARTBEAT_SECONDS):
+            if event is None:
+                # Comment line keeps idle connections open through proxies
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=_json_default)}\n\n"
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/trees/{tree_id}")
+async def live_tree_feed(tree_id: str):
+    """Stream new reviews of a tree as Server-Sent Events"""
+    return _event_stream([tree_topic(tree_id)])
+
+@router.get("/area")
+async def live_area_feed(
+    lat: float = Query(..., description="Latitude of the area to follow"),
+    lon: float = Query(..., description="Longitude of the area to follow"),
+    region_precision: int = Query(4, ge=min(REGION_PRECISIONS), le=max(REGION_PRECISIONS), description="Geohash length of the area: 3 (~156km), 4 (~39km) or 5 (~5km)")
+):
+    """Stream new trees and reviews in an area as Server-Sent Events"""
+    return _event_stream([area_topic(encode_geohash(lat, lon, region_precision))])
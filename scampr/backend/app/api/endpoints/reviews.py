@@ -1,11 +1,19 @@
 # app/api/endpoints/reviews.py
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Query, Response
+from typing import List, Optional
 from pydantic import BaseModel
+from pymongo import ReturnDocument
 from ...core.auth import get_current_user
+from ...core.change_streams import publish_local
+from ...core.tasks import task_queue
+from ...core.versioning import etag, parse_if_match, version_filter, conflict_exception
 from ...models.user import User
 from ...models.tree import Tree
 from ...models.review import Review
+from ...services.recommendations import record_reviews_removed
+from ...services.tree_stats import refresh_tree_stats, record_review_created, record_review_updated, record_review_deleted
+from ...services.trending import record_review_activity
+from ...services.user_trees import sync_climbed_tree
 
 router = APIRouter()
 
@@ -18,6 +26,11 @@ class ReviewUpdate(BaseModel):
     rating: float
     comment: str
 
+def enqueue_review_side_effects(user_id: str, tree_id: str):
+    """Queue the aggregate and climbed-list updates that follow a review write"""
+    task_queue.enqueue(f"tree-stats:{tree_id}", refresh_tree_stats, tree_id)
+    task_queue.enqueue(f"climbed-tree:{user_id}:{tree_id}", sync_climbed_tree, user_id, tree_id)
+
 @router.post("/", response_model=dict)
 async def create_review(review_data: ReviewCreate, current_user: User = Depends(get_current_user)):
     """Create a new review for a tree"""
@@ -42,31 +55,28 @@ async def create_review(review_data: ReviewCreate, current_user: User = Depends(
         tree_id=review_data.tree_id,
         user_id=str(current_user.id),
         user_name=current_user.display_name,
+        user_name_version=current_user.display_name_version,
         rating=review_data.rating,
         comment=review_data.comment
     )
     await review.insert()
+    await publish_local(Review.Settings.name, "insert", review.id, review.model_dump())
+    await record_review_created(review)
     
-    # Update tree's average rating and climb count
-    all_reviews = await Review.find(Review.tree_id == review_data.tree_id).to_list()
-    if all_reviews:
-        avg_rating = sum(r.rating for r in all_reviews) / len(all_reviews)
-        tree.average_rating = round(avg_rating, 2)
-        tree.climb_count = len(all_reviews)
-        await tree.save()
-    
-    # Add tree to user's climbed_trees if not already there
-    if review_data.tree_id not in current_user.climbed_trees:
-        current_user.climbed_trees.append(review_data.tree_id)
-        current_user.total_climbs += 1
-        await current_user.save()
+    # Update tree's average rating and climb count, and the user's climbed trees, in the background
+    enqueue_review_side_effects(str(current_user.id), review_data.tree_id)
+    task_queue.enqueue(f"trending:{review.id}", record_review_activity, review.tree_id, review.created_at)
     
     return {"id": str(review.id), "message": "Review created successfully"}
 
 @router.get("/tree/{tree_id}", response_model=List[dict])
-async def get_tree_reviews(tree_id: str):
-    """Get all reviews for a specific tree"""
-    reviews = await Review.find(Review.tree_id == tree_id).to_list()
+async def get_tree_reviews(
+    tree_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    skip: int = Query(0, ge=0)
+):
+    """Get a page of reviews for a specific tree, newest first"""
+    reviews = await Review.find(Review.tree_id == tree_id).sort(-Review.created_at).skip(skip).limit(limit).to_list()
     
     return [
         {
@@ -75,7 +85,8 @@ async def get_tree_reviews(tree_id: str):
             "user_name": review.user_name,
             "rating": review.rating,
             "comment": review.comment,
-            "created_at": review.created_at
+            "created_at": review.created_at,
+            "version": review.version
         } for review in reviews
     ]
 
@@ -96,13 +107,20 @@ async def get_my_reviews(current_user: User = Depends(get_current_user)):
             "tree_name": tree_info["name"],
             "rating": review.rating,
             "comment": review.comment,
-            "created_at": review.created_at
+            "created_at": review.created_at,
+            "version": review.version
         })
     
     return result
 
 @router.put("/{review_id}", response_model=dict)
-async def update_review(review_id: str, review_data: ReviewUpdate, current_user: User = Depends(get_current_user)):
+async def update_review(
+    review_id: str,
+    review_data: ReviewUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None, description="ETag from a previous read; 409 if the review changed since"),
+    current_user: User = Depends(get_current_user)
+):
     """Update a review (only by the review's author)"""
     review = await Review.get(review_id)
     if not review:
@@ -111,21 +129,29 @@ async def update_review(review_id: str, review_data: ReviewUpdate, current_user:
     if review.user_id != str(current_user.id):
         raise HTTPException(status_code=403, detail="Not authorized to update this review")
     
-    # Update review
+    expected_version = parse_if_match(if_match, review.version)
+    
+    # Update review, guarded by the version we read
+    updated = await Review.get_motor_collection().find_one_and_update(
+        {"_id": review.id, **version_filter(expected_version)},
+        {"$set": {"rating": review_data.rating, "comment": review_data.comment}, "$inc": {"version": 1}},
+        projection={"version": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated is None:
+        raise conflict_exception("Review")
+    
+    old_rating = review.rating
     review.rating = review_data.rating
     review.comment = review_data.comment
-    await review.save()
+    review.version = updated["version"]
+    await record_review_updated(review, old_rating)
     
-    # Update tree's average rating
-    all_reviews = await Review.find(Review.tree_id == review.tree_id).to_list()
-    if all_reviews:
-        avg_rating = sum(r.rating for r in all_reviews) / len(all_reviews)
-        tree = await Tree.get(review.tree_id)
-        if tree:
-            tree.average_rating = round(avg_rating, 2)
-            await tree.save()
+    # Update tree's average rating in the background
+    task_queue.enqueue(f"tree-stats:{review.tree_id}", refresh_tree_stats, review.tree_id)
     
-    return {"message": "Review updated successfully"}
+    response.headers["ETag"] = etag(updated["version"])
+    return {"message": "Review updated successfully", "version": updated["version"]}
 
 @router.delete("/{review_id}")
 async def delete_review(review_id: str, current_user: User = Depends(get_current_user)):
@@ -139,29 +165,11 @@ async def delete_review(review_id: str, current_user: User = Depends(get_current
     
     tree_id = review.tree_id
     await review.delete()
+    await record_review_deleted(review)
     
-    # Update tree's average rating and climb count
-    remaining_reviews = await Review.find(Review.tree_id == tree_id).to_list()
-    tree = await Tree.get(tree_id)
-    if tree:
-        if remaining_reviews:
-            avg_rating = sum(r.rating for r in remaining_reviews) / len(remaining_reviews)
-            tree.average_rating = round(avg_rating, 2)
-            tree.climb_count = len(remaining_reviews)
-        else:
-            tree.average_rating = 0.0
-            tree.climb_count = 0
-        await tree.save()
-    
-    # Remove from user's climbed_trees if no more reviews
-    user_reviews = await Review.find(
-        Review.user_id == str(current_user.id),
-        Review.tree_id == tree_id
-    ).to_list()
-    
-    if not user_reviews and tree_id in current_user.climbed_trees:
-        current_user.climbed_trees.remove(tree_id)
-        current_user.total_climbs = max(0, current_user.total_climbs - 1)
-        await current_user.save()
+    # Update tree's average rating and climb count, and the user's climbed trees, in the background
+    enqueue_review_side_effects(str(current_user.id), tree_id)
+    task_queue.enqueue(f"trending-removed:{review.id}", record_review_activity, tree_id, review.created_at, True)
+    task_queue.enqueue(f"similarities-removed:{review.id}", record_reviews_removed, review.user_id, [tree_id])
     
     return {"message": "Review deleted successfully"}
\ No newline at end of file
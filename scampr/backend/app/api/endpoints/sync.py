@@ -0,0 +1,46 @@
+# app/api/endpoints/sync.py
+from fastapi import APIRouter, Depends
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from enum import Enum
+from ...core.auth import get_current_user
+from ...core.config import settings
+from ...models.user import User
+from ...services import sync
+from .trees import TreeCreate
+
+router = APIRouter()
+
+class SyncAction(str, Enum):
+    CREATE_TREE = sync.CREATE_TREE
+    CREATE_REVIEW = sync.CREATE_REVIEW
+    UPDATE_REVIEW = sync.UPDATE_REVIEW
+    DELETE_REVIEW = sync.DELETE_REVIEW
+
+class SyncOperationRequest(BaseModel):
+    idempotency_key: str = Field(..., min_length=1, max_length=128)
+    action: SyncAction
+    tree: Optional[TreeCreate] = None  # create_tree
+    tree_id: Optional[str] = None  # create_review
+    tree_key: Optional[str] = None  # create_review of a tree created by an earlier create_tree
+    review_id: Optional[str] = None  # update_review / delete_review
+    review_key: Optional[str] = None  # update_review / delete_review of a review created by an earlier create_review
+    rating: Optional[float] = None
+    comment: Optional[str] = None
+    version: Optional[int] = None  # update_review: the version last seen, like If-Match
+
+class SyncBatchRequest(BaseModel):
+    operations: List[SyncOperationRequest] = Field(..., min_length=1, max_length=settings.SYNC_MAX_OPERATIONS)
+
+@router.post("/batch", response_model=dict)
+async def sync_batch(batch: SyncBatchRequest, current_user: User = Depends(get_current_user)):
+    """Replay actions queued while offline, in order, each at most once
+    
+    Every operation gets its own result. Operations whose idempotency_key was
+    already applied return the stored result with "replayed": true.
+    """
+    results = await sync.run_sync_batch(
+        current_user,
+        [operation.model_dump(mode="json") for operation in batch.operations]
+    )
+    return {"results": results}
@@ -1,17 +1,38 @@
 # app/api/endpoints/trees.py
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Header, Response, File, UploadFile
 from typing import List, Optional
 from pydantic import BaseModel
+from beanie import PydanticObjectId
+from pymongo import ReturnDocument
 from ...core.auth import get_current_user
+from ...core.change_streams import publish_local
+from ...core.config import settings
+from ...core.database import find_heavy
+from ...core.geo import calculate_distance, encode_geohash, geo_regions, REGION_PRECISIONS
+from ...core.singleflight import single_flight
+from ...core.tasks import task_queue
+from ...core.versioning import etag, parse_if_match, version_filter, conflict_exception
 from ...models.user import User
 from ...models.tree import Tree, Location
 from ...models.review import Review
+from ...models.user_tree import CLIMBED, ADDED
+from ...services.facets import search_filter, tree_facets
+from ...services.search_index import fuzzy_match, suggest
+from ...services.trending import trending_trees, decayed_score
+from ...services.recommendations import similar_trees, recommended_trees, remove_tree_from_similarities
+from ...services.user_trees import add_user_tree, remove_user_tree, list_user_trees
+from .images import upload_image
+import heapq
 import math
 import re
+from datetime import datetime
 from enum import Enum
 
 router = APIRouter()
 
+# List endpoints don't return the detail read model, so don't read it
+LIST_PROJECTION = {"recent_reviews": 0, "rating_histogram": 0}
+
 class SortBy(str, Enum):
     RELEVANCE = "relevance"
     DISTANCE = "distance"
@@ -31,6 +52,10 @@ class TreeCreate(BaseModel):
     height: float
     features: List[str] = []
 
+class TreeRelation(str, Enum):
+    CLIMBED = CLIMBED
+    ADDED = ADDED
+
 class TreeUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
@@ -39,27 +64,50 @@ class TreeUpdate(BaseModel):
     height: Optional[float] = None
     features: Optional[List[str]] = None
 
-def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calculate distance between two points in kilometers using Haversine formula"""
-    R = 6371  # Earth's radius in kilometers
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    
-    a = (math.sin(dlat / 2) * math.sin(dlat / 2) +
-         math.cos(lat1_rad) * math.cos(lat2_rad) *
-         math.sin(dlon / 2) * math.sin(dlon / 2))
-    c = 2 * math.asin(math.sqrt(a))
-    
-    return R * c
+@single_flight("tree")
+async def load_tree(tree_id: str) -> Optional[Tree]:
+    """Read a tree for display; concurrent views of the same tree share one read"""
+    return await Tree.get(tree_id)
+
+def thumbnail_urls(tree: Tree) -> List[str]:
+    """A thumbnail per image_urls entry, or the image itself where none was rendered"""
+    thumbnails = {image.url: image.thumbnail_url for image in tree.images}
+    return [thumbnails.get(url, url) for url in tree.image_urls]
+
+def tree_summary(tree: Tree) -> dict:
+    """Tree fields returned by the list endpoints"""
+    return {
+        "id": str(tree.id),
+        "name": tree.name,
+        "description": tree.description,
+        "location": {
+            "latitude": tree.location.latitude,
+            "longitude": tree.location.longitude
+        },
+        "address": tree.address,
+        "user_id": tree.user_id,
+        "user_name": tree.user_name,
+        "image_urls": tree.image_urls,
+        "thumbnail_urls": thumbnail_urls(tree),
+        "difficulty": tree.difficulty,
+        "tree_type": tree.tree_type,
+        "height": tree.height,
+        "features": tree.features,
+        "created_at": tree.created_at,
+        "climb_count": tree.climb_count,
+        "average_rating": tree.average_rating
+    }
 
 def calculate_search_score(tree: dict, query: Optional[str] = None, 
                           user_lat: Optional[float] = None, user_lon: Optional[float] = None,
                           preferred_difficulty: Optional[float] = None,
-                          preferred_features: List[str] = None) -> float:
-    """Calculate innovative search score prioritizing attributes and location over name"""
+                          preferred_features: List[str] = None,
+                          text_match: float = 0.0) -> float:
+    """Calculate innovative search score prioritizing attributes and location over name
+    
+    text_match is the tree's fuzzy match score for the query from the trigram index
+    (0 to 1, typos tolerated).
+    """
     score = 0.0
     
     # 1. Location Score (40% weight) - Proximity is key for tree climbing
@@ -146,6 +194,11 @@ def calculate_search_score(tree: dict, query: Optional[str] = None,
     
     score += content_score * 0.05
     
+    # 6. Text Match (SEARCH_TEXT_MATCH_WEIGHT of the score when there is a query) - the trees
+    # the query names, misspelled or not, come first; the other scores share the rest
+    if query:
+        score = score * (1 - settings.SEARCH_TEXT_MATCH_WEIGHT) + text_match * settings.SEARCH_TEXT_MATCH_WEIGHT
+    
     return min(1.0, score)  # Cap at 1.0
 
 @router.post("/", response_model=dict)
@@ -158,17 +211,19 @@ async def create_tree(tree_data: TreeCreate, current_user: User = Depends(get_cu
         address=tree_data.address,
         user_id=str(current_user.id),
         user_name=current_user.display_name,
+        user_name_version=current_user.display_name_version,
         image_urls=tree_data.image_urls,
         difficulty=tree_data.difficulty,
         tree_type=tree_data.tree_type,
         height=tree_data.height,
-        features=tree_data.features
+        features=tree_data.features,
+        geo_regions=geo_regions(tree_data.location.latitude, tree_data.location.longitude)
     )
     await tree.insert()
+    await publish_local(Tree.Settings.name, "insert", tree.id, tree.model_dump())
     
-    # Add tree to user's added_trees list
-    current_user.added_trees.append(str(tree.id))
-    await current_user.save()
+    # Add tree to user's added trees
+    await add_user_tree(str(current_user.id), str(tree.id), ADDED)
     
     return {"id": str(tree.id), "message": "Tree created successfully"}
 
@@ -181,30 +236,11 @@ async def get_trees(
     skip: int = Query(0, ge=0)
 ):
     """Get trees with optional location filtering"""
-    trees = await Tree.find().skip(skip).limit(limit).to_list()
+    trees = await find_heavy(Tree, skip=skip, limit=limit, projection=LIST_PROJECTION)
     
     result = []
     for tree in trees:
-        tree_dict = {
-            "id": str(tree.id),
-            "name": tree.name,
-            "description": tree.description,
-            "location": {
-                "latitude": tree.location.latitude,
-                "longitude": tree.location.longitude
-            },
-            "address": tree.address,
-            "user_id": tree.user_id,
-            "user_name": tree.user_name,
-            "image_urls": tree.image_urls,
-            "difficulty": tree.difficulty,
-            "tree_type": tree.tree_type,
-            "height": tree.height,
-            "features": tree.features,
-            "created_at": tree.created_at,
-            "climb_count": tree.climb_count,
-            "average_rating": tree.average_rating
-        }
+        tree_dict = tree_summary(tree)
         
         # Add distance if coordinates provided
         if lat is not None and lon is not None:
@@ -245,31 +281,24 @@ async def search_trees(
     if features:
         preferred_features = [f.strip() for f in features.split(",")]
     
-    # Build base query
-    trees = await Tree.find().to_list(1000)  # Get more for better scoring
+    # Filter in the database so the scan covers the trees the facets count;
+    # past SEARCH_SCAN_LIMIT matches only the first ones are scored
+    query_filter = search_filter(lat, lon, radius, tree_type, difficulty_min, difficulty_max)
+    trees = await find_heavy(Tree, query_filter, limit=settings.SEARCH_SCAN_LIMIT, projection=LIST_PROJECTION)
+    
+    # Typo-tolerant matches from the trigram index; load the best ones the scan above missed
+    text_matches = fuzzy_match(query) if query else {}
+    if text_matches:
+        loaded = {str(tree.id) for tree in trees}
+        best_matches = heapq.nlargest(settings.SEARCH_FUZZY_MAX_CANDIDATES, text_matches, key=text_matches.get)
+        missing = [PydanticObjectId(tree_id) for tree_id in best_matches if tree_id not in loaded]
+        if missing:
+            # A new list: find_heavy results are shared with concurrent identical requests
+            trees = trees + await find_heavy(Tree, {"_id": {"$in": missing}}, projection=LIST_PROJECTION)
     
     result = []
     for tree in trees:
-        tree_dict = {
-            "id": str(tree.id),
-            "name": tree.name,
-            "description": tree.description,
-            "location": {
-                "latitude": tree.location.latitude,
-                "longitude": tree.location.longitude
-            },
-            "address": tree.address,
-            "user_id": tree.user_id,
-            "user_name": tree.user_name,
-            "image_urls": tree.image_urls,
-            "difficulty": tree.difficulty,
-            "tree_type": tree.tree_type,
-            "height": tree.height,
-            "features": tree.features,
-            "created_at": tree.created_at,
-            "climb_count": tree.climb_count,
-            "average_rating": tree.average_rating
-        }
+        tree_dict = tree_summary(tree)
         
         # Calculate distance if coordinates provided
         if lat is not None and lon is not None:
@@ -283,10 +312,10 @@ async def search_trees(
         # Apply filters
         if tree_type and tree.tree_type.lower() != tree_type.lower():
             continue
-            
+        
         if difficulty_min is not None and tree.difficulty < difficulty_min:
             continue
-            
+        
         if difficulty_max is not None and tree.difficulty > difficulty_max:
             continue
         
@@ -297,7 +326,8 @@ async def search_trees(
             user_lat=lat,
             user_lon=lon,
             preferred_difficulty=preferred_difficulty,
-            preferred_features=preferred_features
+            preferred_features=preferred_features,
+            text_match=text_matches.get(tree_dict["id"], 0.0)
         )
         tree_dict["search_score"] = round(search_score, 3)
         
@@ -320,16 +350,110 @@ async def search_trees(
     # Apply pagination
     return result[skip:skip + limit]
 
+@router.get("/user/my-trees", response_model=dict)
+async def get_my_trees(
+    relation: TreeRelation = Query(TreeRelation.CLIMBED, description="Which of the user's tree lists to page through"),
+    limit: int = Query(20, le=100),
+    skip: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the current user's climbed or added trees, newest first"""
+    total, entries = await list_user_trees(str(current_user.id), relation.value, skip=skip, limit=limit)
+    
+    return {
+        "total": total,
+        "trees": [
+            {
+                "tree_id": entry.tree_id,
+                "created_at": entry.created_at
+            } for entry in entries
+        ]
+    }
+
+@router.get("/facets", response_model=dict)
+async def get_tree_facets(
+    lat: Optional[float] = Query(None, description="User latitude"),
+    lon: Optional[float] = Query(None, description="User longitude"),
+    radius: Optional[float] = Query(50, description="Search radius in kilometers"),
+    tree_type: Optional[str] = Query(None, description="Filter by tree type"),
+    difficulty_min: Optional[float] = Query(None, description="Minimum difficulty"),
+    difficulty_max: Optional[float] = Query(None, description="Maximum difficulty")
+):
+    """Count trees per tree type, feature and difficulty band for the search filters
+    
+    Each facet ignores its own filter, so the UI can show the other options' counts.
+    """
+    return await tree_facets(lat, lon, radius, tree_type, difficulty_min, difficulty_max)
+
+@router.get("/suggest", response_model=List[dict])
+async def suggest_trees(
+    prefix: str = Query(..., max_length=100, description="What the user has typed so far"),
+    lat: Optional[float] = Query(None, description="Latitude to rank nearby trees higher"),
+    lon: Optional[float] = Query(None, description="Longitude to rank nearby trees higher"),
+    limit: int = Query(10, ge=1, le=25)
+):
+    """Autocomplete tree names, tree types and features from the in-memory index"""
+    return suggest(prefix, limit, lat, lon)
+
+@router.get("/trending", response_model=List[dict])
+async def get_trending_trees(
+    lat: Optional[float] = Query(None, description="Latitude to scope trending to the surrounding region"),
+    lon: Optional[float] = Query(None, description="Longitude to scope trending to the surrounding region"),
+    region_precision: int = Query(4, ge=min(REGION_PRECISIONS), le=max(REGION_PRECISIONS), description="Geohash length of the region: 3 (~156km), 4 (~39km) or 5 (~5km)"),
+    limit: int = Query(20, le=100)
+):
+    """Get trees with the most recent review activity, globally or near a location"""
+    region = None
+    if lat is not None and lon is not None:
+        region = encode_geohash(lat, lon, region_precision)
+    
+    trees = await trending_trees(region, limit)
+    
+    now = datetime.utcnow()
+    result = []
+    for tree in trees:
+        tree_dict = tree_summary(tree)
+        tree_dict["trending_score"] = round(decayed_score(tree.trending_score, now), 3)
+        result.append(tree_dict)
+    return result
+
+@router.get("/recommended", response_model=List[dict])
+async def get_recommended_trees(
+    limit: int = Query(20, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    """Get trees similar to the ones the current user has climbed"""
+    _, climbed = await list_user_trees(str(current_user.id), CLIMBED, limit=settings.RECOMMENDATION_SEED_TREES)
+    return await recommended_trees([entry.tree_id for entry in climbed], limit)
+
+@router.get("/{tree_id}/similar", response_model=List[dict])
+async def get_similar_trees(tree_id: str, limit: int = Query(10, le=50)):
+    """Get the trees most similar to a tree, from the precomputed similarity index"""
+    return await similar_trees(tree_id, limit)
+
 @router.get("/{tree_id}", response_model=dict)
-async def get_tree(tree_id: str):
-    """Get a specific tree by ID"""
-    tree = await Tree.get(tree_id)
+async def get_tree(tree_id: str, response: Response):
+    """Get a specific tree by ID, with its latest reviews and rating histogram"""
+    tree = await load_tree(tree_id)
     if not tree:
         raise HTTPException(status_code=404, detail="Tree not found")
     
-    # Get reviews for this tree
-    reviews = await Review.find(Review.tree_id == tree_id).to_list()
+    recent_reviews = [review.model_dump() for review in tree.recent_reviews]
+    if not tree.rating_histogram and tree.climb_count:
+        # Not backfilled yet: read the reviews the old way
+        reviews = await Review.find(Review.tree_id == tree_id).sort(-Review.created_at).limit(settings.TREE_RECENT_REVIEWS).to_list()
+        recent_reviews = [
+            {
+                "id": str(review.id),
+                "user_name": review.user_name,
+                "rating": review.rating,
+                "comment": review.comment,
+                "created_at": review.created_at,
+                "version": review.version
+            } for review in reviews
+        ]
     
+    response.headers["ETag"] = etag(tree.version)
     return {
         "id": str(tree.id),
         "name": tree.name,
@@ -342,6 +466,7 @@ async def get_tree(tree_id: str):
         "user_id": tree.user_id,
         "user_name": tree.user_name,
         "image_urls": tree.image_urls,
+        "thumbnail_urls": thumbnail_urls(tree),
         "difficulty": tree.difficulty,
         "tree_type": tree.tree_type,
         "height": tree.height,
@@ -349,19 +474,30 @@ async def get_tree(tree_id: str):
         "created_at": tree.created_at,
         "climb_count": tree.climb_count,
         "average_rating": tree.average_rating,
+        "version": tree.version,
+        "review_count": tree.climb_count,
+        "rating_histogram": {str(rating): tree.rating_histogram.get(str(rating), 0) for rating in range(1, 6)},
+        # The newest reviews; older ones are paged through GET /reviews/tree/{tree_id}
         "reviews": [
             {
-                "id": str(review.id),
-                "user_name": review.user_name,
-                "rating": review.rating,
-                "comment": review.comment,
-                "created_at": review.created_at
-            } for review in reviews
+                "id": review["id"],
+                "user_name": review["user_name"],
+                "rating": review["rating"],
+                "comment": review["comment"],
+                "created_at": review["created_at"],
+                "version": review["version"]
+            } for review in recent_reviews
         ]
     }
 
 @router.put("/{tree_id}", response_model=dict)
-async def update_tree(tree_id: str, tree_data: TreeUpdate, current_user: User = Depends(get_current_user)):
+async def update_tree(
+    tree_id: str,
+    tree_data: TreeUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None, description="ETag from a previous read; 409 if the tree changed since"),
+    current_user: User = Depends(get_current_user)
+):
     """Update a tree (only by the tree's creator)"""
     tree = await Tree.get(tree_id)
     if not tree:
@@ -370,12 +506,63 @@ async def update_tree(tree_id: str, tree_data: TreeUpdate, current_user: User =
     if tree.user_id != str(current_user.id):
         raise HTTPException(status_code=403, detail="Not authorized to update this tree")
     
-    # Update fields if provided
-    for field, value in tree_data.dict(exclude_unset=True).items():
-        setattr(tree, field, value)
+    expected_version = parse_if_match(if_match, tree.version)
+    
+    # Only send the fields that changed, guarded by the version we read
+    changes = tree_data.dict(exclude_unset=True)
+    if changes:
+        updated = await Tree.get_motor_collection().find_one_and_update(
+            {"_id": tree.id, **version_filter(expected_version)},
+            {"$set": changes, "$inc": {"version": 1}},
+            projection={"version": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated is None:
+            raise conflict_exception("Tree")
+        new_version = updated["version"]
+        await publish_local(Tree.Settings.name, "update", tree.id, updated_fields={**changes, "version": new_version})
+    elif expected_version != tree.version:
+        raise conflict_exception("Tree")
+    else:
+        new_version = tree.version
+    
+    response.headers["ETag"] = etag(new_version)
+    return {"message": "Tree updated successfully", "version": new_version}
+
+@router.post("/{tree_id}/images", response_model=dict, status_code=status.HTTP_201_CREATED)
+async def add_tree_image(
+    tree_id: str,
+    response: Response,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    """Upload a photo of a tree (only by the tree's creator)"""
+    tree = await Tree.get(tree_id)
+    if not tree:
+        raise HTTPException(status_code=404, detail="Tree not found")
+    
+    if tree.user_id != str(current_user.id):
+        raise HTTPException(status_code=403, detail="Not authorized to update this tree")
     
-    await tree.save()
-    return {"message": "Tree updated successfully"}
+    image = await upload_image(file, current_user)
+    variants = image["variants"]
+    updated = await Tree.get_motor_collection().find_one_and_update(
+        {"_id": tree.id, "image_urls": {"$ne": variants["full"]["url"]}},
+        {
+            # One $push, so the photo and its thumbnail pairing are added together
+            "$push": {
+                "image_urls": variants["full"]["url"],
+                "images": {"url": variants["full"]["url"], "thumbnail_url": variants["thumb"]["url"]}
+            },
+            "$inc": {"version": 1}
+        },
+        projection={"version": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    # None means the tree already had this exact photo
+    new_version = updated["version"] if updated else tree.version
+    response.headers["ETag"] = etag(new_version)
+    return {**image, "version": new_version}
 
 @router.delete("/{tree_id}")
 async def delete_tree(tree_id: str, current_user: User = Depends(get_current_user)):
@@ -388,10 +575,10 @@ async def delete_tree(tree_id: str, current_user: User = Depends(get_current_use
         raise HTTPException(status_code=403, detail="Not authorized to delete this tree")
     
     await tree.delete()
+    await publish_local(Tree.Settings.name, "delete", tree.id)
     
-    # Remove from user's added_trees list
-    if tree_id in current_user.added_trees:
-        current_user.added_trees.remove(tree_id)
-        await current_user.save()
+    # Remove from user's added trees
+    await remove_user_tree(str(current_user.id), tree_id, ADDED)
+    task_queue.enqueue(f"tree-similarities:{tree_id}", remove_tree_from_similarities, tree_id)
     
     return {"message": "Tree deleted successfully"}
\ No newline at end of file
@@ -1,9 +1,13 @@
 # app/api/routes.py
 from fastapi import APIRouter
-from .endpoints import auth, trees, reviews
+from .endpoints import auth, trees, reviews, live, admin, images, sync
 
 api_router = APIRouter()
 
 api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
 api_router.include_router(trees.router, prefix="/trees", tags=["trees"])
-api_router.include_router(reviews.router, prefix="/reviews", tags=["reviews"])
\ No newline at end of file
+api_router.include_router(reviews.router, prefix="/reviews", tags=["reviews"])
+api_router.include_router(images.router, prefix="/images", tags=["images"])
+api_router.include_router(sync.router, prefix="/sync", tags=["sync"])
+api_router.include_router(live.router, prefix="/live", tags=["live"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
\ No newline at end of file
@@ -6,11 +6,16 @@ import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from .config import settings
+from .cache import TTLCache, register_invalidator
 from ..models.user import User
 
 # JWT token security
 security = HTTPBearer()
 
+# Authenticated users by email, aliased by id so a change to their document drops them in O(1)
+user_cache = TTLCache("users", settings.USER_CACHE_TTL_SECONDS, settings.CACHE_MAX_ENTRIES)
+register_invalidator(User.Settings.name, user_cache.invalidate_alias)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plaintext password against its hash"""
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
@@ -48,7 +53,21 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except JWTError:
         raise credentials_exception
     
-    user = await User.find_one(User.email == email)
+    user = user_cache.get(email)
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        user = await User.find_one(User.email == email)
+        if user is None:
+            raise credentials_exception
+        user_cache.set(email, user, alias=str(user.id))
+    # Callers get their own copy so the cached instance is never mutated
+    return user.model_copy()
+
+async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    """Get the current user, who must be listed in ADMIN_EMAILS"""
+    admin_emails = {email.strip().lower() for email in settings.ADMIN_EMAILS.split(",") if email.strip()}
+    if current_user.email.lower() not in admin_emails:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
\ No newline at end of file
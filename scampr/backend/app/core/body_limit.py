@@ -0,0 +1,62 @@
+# app/core/body_limit.py
+import re
+from typing import Optional
+from fastapi import HTTPException, status
+from starlette.responses import JSONResponse
+
+class BodySizeLimitMiddleware:
+    """Reject request bodies over a size limit before they are buffered
+    
+    Starlette parses multipart forms, spooling files to disk, before the
+    endpoint runs, so an endpoint can only check an upload's size once it
+    has been received in full. Matching requests that declare a larger
+    Content-Length get 413 without being read; bodies without one are cut
+    off with 413 as soon as they pass the limit.
+    """
+    
+    def __init__(self, app, max_bytes: int, path_pattern: str, methods: tuple = ("POST", "PUT")):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_pattern = re.compile(path_pattern)
+        self.methods = methods
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in self.methods or not self.path_pattern.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        
+        declared = _content_length(scope)
+        if declared is not None and declared > self.max_bytes:
+            response = JSONResponse(
+                {"detail": "Request body is too large"},
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                headers={"Connection": "close"}
+            )
+            await response(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside form parsing, which lets HTTPException through to its handler
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="Request body is too large"
+                    )
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+def _content_length(scope) -> Optional[int]:
+    for key, value in scope.get("headers", []):
+        if key == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
@@ -0,0 +1,101 @@
+# app/core/cache.py
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+class TTLCache:
+    """Small per-worker LRU cache whose entries expire after a fixed TTL
+    
+    Entries are also dropped early when another worker writes the underlying
+    documents, via the invalidators registered below.
+    """
+    
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()  # key -> (expires_at, value, alias)
+        self._aliases: Dict[Any, Any] = {}  # alias -> key
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        _caches.append(self)
+    
+    def get(self, key: Any, default: Any = None) -> Any:
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING or entry[0] < time.monotonic():
+            if entry is not _MISSING:
+                self._remove(key)
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def set(self, key: Any, value: Any, alias: Any = None):
+        """Cache value under key; alias is a second key, e.g. a document id, for invalidate_alias"""
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value, alias)
+        if alias is not None:
+            self._aliases[alias] = key
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+    
+    def invalidate(self, key: Any):
+        if self._remove(key):
+            self.invalidations += 1
+    
+    def invalidate_alias(self, alias: Any):
+        """Drop the entry cached with this alias, if any"""
+        key = self._aliases.get(alias, _MISSING)
+        if key is not _MISSING:
+            self.invalidate(key)
+    
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._aliases.clear()
+    
+    def _remove(self, key: Any) -> bool:
+        entry = self._entries.pop(key, _MISSING)
+        if entry is _MISSING:
+            return False
+        if entry[2] is not None and self._aliases.get(entry[2]) == key:
+            del self._aliases[entry[2]]
+        return True
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+_caches: List[TTLCache] = []
+_invalidators: Dict[str, List[Callable[[str], None]]] = {}
+
+def register_invalidator(collection: str, callback: Callable[[str], None]):
+    """Call callback(document_id) whenever a document in the collection changes"""
+    _invalidators.setdefault(collection, []).append(callback)
+
+def invalidate(collection: str, document_id: Optional[str]):
+    """Publish a change to every cache that depends on the collection"""
+    for callback in _invalidators.get(collection, []):
+        try:
+            callback(document_id)
+        except Exception as e:
+            logger.error(f"Cache invalidation for {collection}/{document_id} failed: {e}")
+
+def clear_all():
+    """Drop every cached entry, e.g. after change events may have been missed"""
+    for cache in _caches:
+        cache.clear()
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {cache.name: cache.stats() for cache in _caches}
@@ -0,0 +1,161 @@
+# app/core/change_streams.py
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional
+from pymongo.errors import OperationFailure, PyMongoError
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+# Server error codes meaning change streams can't be used against this deployment
+_UNSUPPORTED_CODES = {
+    40573,  # $changeStream is only supported on replica sets
+    40324,  # Unrecognized pipeline stage name (very old servers)
+}
+_HISTORY_LOST_CODE = 286  # Resume token fell off the oplog
+
+ChangeHandler = Callable[[Mapping[str, Any]], Awaitable[None]]
+
+_handlers: Dict[str, List[ChangeHandler]] = {}
+_listeners: List["ChangeStreamListener"] = []
+
+def register_change_handler(collection: str, handler: ChangeHandler):
+    """Call handler(change) for every change event on the collection, from any worker"""
+    _handlers.setdefault(collection, []).append(handler)
+
+async def _run_handlers(change: Mapping[str, Any]):
+    collection = change.get("ns", {}).get("coll")
+    for handler in _handlers.get(collection, []):
+        try:
+            await handler(change)
+        except Exception as e:
+            logger.error(f"Change handler for {collection} failed: {e}")
+
+async def publish_local(
+    collection: str,
+    operation: str,
+    document_id: Any,
+    full_document: Optional[Mapping[str, Any]] = None,
+    updated_fields: Optional[Mapping[str, Any]] = None
+):
+    """Report a write made by this worker
+    
+    Caches are invalidated right away for read-your-writes. Change handlers
+    only run here when no change stream is active; otherwise the stream
+    delivers the same event to every worker, this one included. Pass the
+    $set fields of an update as updated_fields so handlers can skip changes
+    they don't depend on, as they do for change stream events.
+    """
+    cache.invalidate(collection, str(document_id))
+    if any(listener.delivers_writes for listener in _listeners):
+        return
+    change = {
+        "operationType": operation,
+        "ns": {"coll": collection},
+        "documentKey": {"_id": document_id},
+    }
+    if full_document is not None:
+        change["fullDocument"] = full_document
+    if updated_fields is not None:
+        change["updateDescription"] = {"updatedFields": dict(updated_fields)}
+    await _run_handlers(change)
+
+class ChangeStreamListener:
+    """Turns writes from any worker into cache invalidations and change handler calls
+    
+    The resume token of the last seen event is kept so a reconnect picks up
+    where it left off. When the deployment doesn't support change streams
+    (standalone mongod) the listener stops and caches rely on TTL expiry alone.
+    """
+    
+    def __init__(self, database, collections: List[str], reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        self.database = database
+        self.collections = collections
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.resume_token: Optional[Mapping[str, Any]] = None
+        self.active = False
+        self.supported = True
+        self.events = 0
+        self.reconnects = 0
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def delivers_writes(self) -> bool:
+        """Whether writes made now will reach the handlers through this stream"""
+        # While reconnecting with a resume token, missed events are replayed on resume
+        return self.active or (self.supported and self.resume_token is not None and self._task is not None)
+    
+    def start(self):
+        _listeners.append(self)
+        self._task = asyncio.create_task(self._run(), name="change-stream-listener")
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.active = False
+        if self in _listeners:
+            _listeners.remove(self)
+    
+    def stats(self):
+        return {
+            "active": self.active,
+            "supported": self.supported,
+            "events": self.events,
+            "reconnects": self.reconnects,
+        }
+    
+    async def _run(self):
+        delay = self.reconnect_delay
+        pipeline = [{"$match": {"ns.coll": {"$in": self.collections}}}]
+        while True:
+            try:
+                async with self.database.watch(pipeline, resume_after=self.resume_token) as stream:
+                    if not self.active:
+                        logger.info(f"Change stream listening on {', '.join(self.collections)}")
+                    if self.resume_token is None:
+                        # Nothing to resume from, so writes since the caches filled may have been missed
+                        cache.clear_all()
+                    self.active = True
+                    delay = self.reconnect_delay
+                    async for change in stream:
+                        self.events += 1
+                        self._dispatch(change)
+                        await _run_handlers(change)
+                        if change.get("operationType") == "invalidate":
+                            # The stream is closed and can't be resumed past this event
+                            self.resume_token = None
+                            break
+                        self.resume_token = stream.resume_token
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                self.active = False
+                if e.code in _UNSUPPORTED_CODES:
+                    self.supported = False
+                    logger.warning(f"Change streams unavailable ({e}); caches fall back to TTL-only expiry")
+                    return
+                if e.code == _HISTORY_LOST_CODE:
+                    logger.warning("Change stream resume token expired; restarting from now")
+                    self.resume_token = None
+                else:
+                    logger.error(f"Change stream failed: {e}")
+            except PyMongoError as e:
+                self.active = False
+                logger.warning(f"Change stream disconnected: {e}")
+            
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+    
+    def _dispatch(self, change: Mapping[str, Any]):
+        collection = change.get("ns", {}).get("coll")
+        operation = change.get("operationType")
+        if operation in ("drop", "rename", "dropDatabase", "invalidate"):
+            cache.clear_all()
+            return
+        document_key = change.get("documentKey") or {}
+        document_id = document_key.get("_id")
+        cache.invalidate(collection, str(document_id) if document_id is not None else None)
@@ -1,6 +1,7 @@
 # app/core/config.py
 from pydantic_settings import BaseSettings
 from typing import List
+from datetime import datetime
 import os
 
 class Settings(BaseSettings):
@@ -19,11 +20,119 @@ class Settings(BaseSettings):
     # Database Settings
     MONGODB_URL: str = os.environ.get("MONGODB_URL", "mongodb://localhost:27017")
     MONGODB_DB_NAME: str = os.environ.get("MONGODB_DB_NAME", "scampr")
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 0
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = 5000  # How long a request may wait for a pooled connection
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGODB_COMPRESSORS: str = ""  # e.g. "zstd,snappy" (needs zstandard / python-snappy installed)
+    MONGODB_MAX_TIME_MS: int = 5000  # Server-side time limit for heavy reads and aggregations
+    # Heavy read endpoints (get_trees, search_trees) may be served by secondaries
+    MONGODB_HEAVY_READ_PREFERENCE: str = "primary"  # e.g. "secondaryPreferred" or "nearest"
+    MONGODB_MAX_STALENESS_SECONDS: int = -1  # -1 for no bound, otherwise at least 90
     
     # Auth Settings
     SECRET_KEY: str = os.environ.get("SECRET_KEY", "your-secret-key-change-in-production")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    ADMIN_EMAILS: str = ""  # Comma-separated; these users may use the /admin endpoints
+    
+    # Startup and readiness probes
+    STARTUP_RETRY_DELAY_SECONDS: float = 2.0
+    STARTUP_MAX_RETRY_DELAY_SECONDS: float = 30.0
+    READINESS_PING_INTERVAL_SECONDS: float = 2.0
+    READINESS_PING_TIMEOUT_SECONDS: float = 1.0
+    
+    # Denormalized user_name fan-out
+    FANOUT_BATCH_SIZE: int = 500
+    FANOUT_BATCH_DELAY_SECONDS: float = 0.05
+    
+    # Background task queue for post-write side effects
+    TASK_QUEUE_CONCURRENCY: int = 4
+    TASK_MAX_RETRIES: int = 3
+    TASK_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    TASK_DRAIN_TIMEOUT_SECONDS: float = 10.0
+    
+    # In-process caches, invalidated across workers via MongoDB change streams
+    CHANGE_STREAMS_ENABLED: bool = True
+    CACHE_MAX_ENTRIES: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 60.0
+    
+    # Precomputed similar trees / recommendations
+    SIMILARITY_ENABLED: bool = True
+    SIMILARITY_NEIGHBORS: int = 20
+    SIMILARITY_PROXIMITY_KM: float = 10.0
+    SIMILARITY_REFRESH_INTERVAL_SECONDS: float = 900.0
+    SIMILARITY_FULL_REFRESH_HOURS: float = 24.0
+    SIMILARITY_LEASE_SECONDS: float = 600.0
+    SIMILARITY_WRITE_BATCH_SIZE: int = 500
+    RECOMMENDATION_SEED_TREES: int = 50  # Most recent climbs used to build a user's recommendations
+    
+    # Trending (exponentially time-decayed review activity)
+    TRENDING_HALF_LIFE_HOURS: float = 168.0
+    TRENDING_EPOCH: datetime = datetime(2024, 1, 1)
+    
+    # Live feed (Server-Sent Events)
+    LIVE_QUEUE_SIZE: int = 100  # Events buffered per subscriber before it counts as a slow consumer
+    LIVE_MAX_SUBSCRIBERS: int = 10000  # Per worker
+    LIVE_HEARTBEAT_SECONDS: float = 15.0
+    LIVE_RETRY_MS: int = 5000
+    LIVE_TREE_REGION_TTL_SECONDS: float = 3600.0
+    
+    # Admission control: per-client token buckets and event-loop-lag load shedding
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # Per-worker buckets
+    RATE_LIMIT_TOKENS_PER_SECOND: float = 10.0
+    RATE_LIMIT_BURST: float = 40.0
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    RATE_LIMIT_TRUST_FORWARDED_FOR: bool = False  # Enable behind a proxy that sets X-Forwarded-For
+    RATE_LIMIT_TRUSTED_PROXY_HOPS: int = 1  # Proxies in front of the app that append to X-Forwarded-For
+    LOAD_SHEDDING_ENABLED: bool = True
+    LOAD_SHED_LAG_MS: float = 200.0  # Shed reads past this smoothed loop lag
+    LOAD_SHED_CRITICAL_LAG_MS: float = 1000.0  # Shed writes too past this
+    LOAD_SHED_RETRY_AFTER_SECONDS: float = 2.0
+    LOOP_LAG_SAMPLE_INTERVAL_SECONDS: float = 0.1
+    
+    # Typo-tolerant search and autocomplete (per-worker in-memory indexes)
+    SEARCH_FUZZY_MAX_EDITS: int = 2  # Typos tolerated per query word (fewer for one- and two-letter words)
+    SEARCH_TEXT_MATCH_WEIGHT: float = 0.3  # Share of the search score from matching the query text
+    SEARCH_FUZZY_MAX_CANDIDATES: int = 200
+    SEARCH_SCAN_LIMIT: int = 1000  # Trees matching the filters that search scores
+    SUGGEST_MIN_PREFIX_LENGTH: int = 2
+    SUGGEST_LOCATION_BIAS_KM: float = 10.0  # A tree this far away ranks at half its popularity
+    
+    # Facet counts for the search filters
+    FACETS_CACHE_TTL_SECONDS: float = 600.0
+    FACETS_GRID_DEGREES: float = 0.05  # Locations are snapped to this grid (~5km) to share cached counts
+    FACETS_MAX_VALUES: int = 50  # Per facet
+    
+    # Single-flight coalescing of identical concurrent reads
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_TIMEOUT_SECONDS: float = 10.0  # How long each caller waits for the shared call
+    
+    # Tree detail read model
+    TREE_RECENT_REVIEWS: int = 10  # Reviews embedded in each tree for the detail page
+    
+    # Offline sync
+    SYNC_MAX_OPERATIONS: int = 100  # Per batch
+    SYNC_CLAIM_LEASE_SECONDS: float = 120.0  # A pending idempotency key older than this is taken over by a retry
+    
+    # Image uploads
+    IMAGE_STORAGE_BACKEND: str = "local"
+    MEDIA_ROOT: str = os.environ.get("MEDIA_ROOT", "media")
+    MEDIA_BASE_URL: str = os.environ.get("MEDIA_BASE_URL", "")  # Defaults to {API_URL}/media
+    IMAGE_MAX_UPLOAD_BYTES: int = 15 * 1024 * 1024
+    IMAGE_UPLOAD_CHUNK_BYTES: int = 64 * 1024
+    IMAGE_MAX_PIXELS: int = 50_000_000  # Larger images are rejected (from their header) as possible decompression bombs
+    IMAGE_PROCESS_WORKERS: int = 2  # Per API worker
+    
+    # Request profiling and event-loop blocking detection (opt-in)
+    PROFILING_ENABLED: bool = False
+    PROFILING_SAMPLE_RATE: float = 0.01  # Fraction of requests kept regardless of duration
+    PROFILING_SLOW_REQUEST_MS: float = 1000.0  # Requests at least this slow are always kept
+    PROFILING_SAMPLE_INTERVAL_MS: float = 5.0
+    PROFILING_BUFFER_SIZE: int = 50
+    BLOCKING_DETECTOR_ENABLED: bool = False
+    BLOCKING_THRESHOLD_MS: float = 100.0
     
     class Config:
         env_file = ".env"
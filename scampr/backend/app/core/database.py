@@ -1,17 +1,89 @@
 # app/core/database.py
-from beanie import init_beanie
+from beanie import init_beanie, Document
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+from typing import Any, Dict, List, Optional, Type, TypeVar
 from .config import settings
+from .change_streams import ChangeStreamListener
+from .db_metrics import PoolMetrics, CommandMetrics
+from .health import startup_state
+from .singleflight import single_flight
 from ..models.user import User
 from ..models.tree import Tree
 from ..models.review import Review
+from ..models.user_tree import UserTree
+from ..models.tree_similarity import TreeSimilarity
+from ..models.job_state import JobState
+from ..models.image import StoredImage
+from ..models.sync_operation import SyncOperation
 import logging
 
 logger = logging.getLogger(__name__)
 
+DocumentT = TypeVar("DocumentT", bound=Document)
+
+DOCUMENT_MODELS = [
+    User,
+    Tree,
+    Review,
+    UserTree,
+    TreeSimilarity,
+    JobState,
+    StoredImage,
+    SyncOperation,
+]
+
+_READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
 class Database:
     client: Optional[AsyncIOMotorClient] = None
+    change_stream: Optional[ChangeStreamListener] = None
+    pool_metrics: Optional[PoolMetrics] = None
+    command_metrics: Optional[CommandMetrics] = None
+
+def client_options() -> Dict[str, Any]:
+    """Motor client keyword arguments built from Settings"""
+    options: Dict[str, Any] = {
+        "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+        "waitQueueTimeoutMS": settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+    }
+    if settings.MONGODB_COMPRESSORS:
+        options["compressors"] = settings.MONGODB_COMPRESSORS
+    return options
+
+def heavy_read_preference():
+    """Read preference for heavy, staleness-tolerant read endpoints"""
+    mode = _READ_PREFERENCES.get(settings.MONGODB_HEAVY_READ_PREFERENCE)
+    if mode is None:
+        raise ValueError(f"Unknown MONGODB_HEAVY_READ_PREFERENCE: {settings.MONGODB_HEAVY_READ_PREFERENCE}")
+    if mode is Primary:
+        return Primary()
+    return mode(max_staleness=settings.MONGODB_MAX_STALENESS_SECONDS)
+
+@single_flight("find_heavy")
+async def find_heavy(
+    model: Type[DocumentT],
+    query: Optional[Dict[str, Any]] = None,
+    skip: int = 0,
+    limit: int = 0,
+    projection: Optional[Dict[str, Any]] = None
+) -> List[DocumentT]:
+    """Run a heavy read with the heavy read preference and a server-side time limit
+    
+    Writes and read-your-writes lookups keep going through Beanie on the primary.
+    Identical concurrent reads share one query, so the returned list must not be mutated.
+    """
+    collection = model.get_motor_collection().with_options(read_preference=heavy_read_preference())
+    cursor = collection.find(query or {}, projection, skip=skip, limit=limit, max_time_ms=settings.MONGODB_MAX_TIME_MS)
+    return [model.model_validate(doc) async for doc in cursor]
     
 async def init_db():
     """Initialize database connection and register models"""
@@ -19,31 +91,59 @@ async def init_db():
     connection_url = settings.MONGODB_URL
     logger.info("Initializing MongoDB connection")
     
-    client = AsyncIOMotorClient(connection_url)
+    Database.pool_metrics = PoolMetrics(settings.MONGODB_MAX_POOL_SIZE)
+    Database.command_metrics = CommandMetrics()
+    client = AsyncIOMotorClient(
+        connection_url,
+        event_listeners=[Database.pool_metrics, Database.command_metrics],
+        **client_options()
+    )
+    
+    # Store the client for later access if needed
+    Database.client = client
     
     try:
         # Test the connection
-        await client.admin.command('ping')
+        with startup_state.phase("mongodb_connect"):
+            await client.admin.command('ping')
         logger.info("Successfully connected to MongoDB")
     except Exception as e:
         logger.error(f"Failed to connect to MongoDB: {e}")
+        client.close()
+        Database.client = None
         raise
     
-    await init_beanie(
-        database=client[settings.MONGODB_DB_NAME],
-        document_models=[
-            User,
-            Tree,
-            Review,
-        ]
-    )
+    # Registers the models and builds their indexes
+    with startup_state.phase("init_beanie"):
+        await init_beanie(
+            database=client[settings.MONGODB_DB_NAME],
+            document_models=DOCUMENT_MODELS
+        )
+    startup_state.indexes_ready = True
+    startup_state.db_initialized = True
     
-    # Store the client for later access if needed
-    Database.client = client
+    # Invalidate per-worker caches on writes made by any worker
+    if settings.CHANGE_STREAMS_ENABLED:
+        Database.change_stream = ChangeStreamListener(
+            client[settings.MONGODB_DB_NAME],
+            [Tree.Settings.name, Review.Settings.name, User.Settings.name]
+        )
+        Database.change_stream.start()
     
     return client
 
+def db_stats() -> Dict[str, Any]:
+    """Pool saturation and command latency for the metrics endpoint"""
+    return {
+        "pool": Database.pool_metrics.stats() if Database.pool_metrics else None,
+        "commands": Database.command_metrics.stats() if Database.command_metrics else None,
+    }
+
 async def close_db():
     """Close database connection"""
+    if Database.change_stream:
+        await Database.change_stream.stop()
+        Database.change_stream = None
     if Database.client:
-        Database.client.close()
\ No newline at end of file
+        Database.client.close()
+        Database.client = None
\ No newline at end of file
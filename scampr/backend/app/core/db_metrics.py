@@ -0,0 +1,124 @@
+# app/core/db_metrics.py
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+from pymongo import monitoring
+
+def _percentiles(samples: Deque[float]) -> Dict[str, Optional[float]]:
+    ordered = sorted(samples)
+    
+    def percentile(p: float) -> Optional[float]:
+        if not ordered:
+            return None
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 2)
+    
+    return {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99)}
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool gauges, so pool starvation shows up separately from slow queries"""
+    
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.checkout_failures: Dict[str, int] = {}
+        self.pools_cleared = 0
+        self._checkout_wait_ms: Deque[float] = deque(maxlen=1000)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_pool_size": self.max_pool_size,
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "utilization": round(self.checked_out / self.max_pool_size, 3) if self.max_pool_size else None,
+                "checkout_failures": dict(self.checkout_failures),
+                "pools_cleared": self.pools_cleared,
+                "checkout_wait_ms": _percentiles(self._checkout_wait_ms),
+            }
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_cleared += 1
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_closed(self, event):
+        with self._lock:
+            self.open = max(0, self.open - 1)
+    
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+    
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting = max(0, self.waiting - 1)
+            reason = str(event.reason)
+            self.checkout_failures[reason] = self.checkout_failures.get(reason, 0) + 1
+    
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting = max(0, self.waiting - 1)
+            self.checked_out += 1
+            # Checkout duration is only reported by newer PyMongo releases
+            duration = getattr(event, "duration", None)
+            if duration is not None:
+                self._checkout_wait_ms.append(duration * 1000)
+    
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+class CommandMetrics(monitoring.CommandListener):
+    """Server-side command latency, the other half of telling starvation from slow queries"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.failures = 0
+        self._durations_ms: Dict[str, Deque[float]] = {}
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "failures": self.failures,
+                "duration_ms": {name: _percentiles(samples) for name, samples in self._durations_ms.items()},
+            }
+    
+    def started(self, event):
+        pass
+    
+    def succeeded(self, event):
+        self._record(event.command_name, event.duration_micros)
+    
+    def failed(self, event):
+        with self._lock:
+            self.failures += 1
+        self._record(event.command_name, event.duration_micros)
+    
+    def _record(self, command_name: str, duration_micros: int):
+        with self._lock:
+            samples = self._durations_ms.get(command_name)
+            if samples is None:
+                samples = self._durations_ms[command_name] = deque(maxlen=500)
+            samples.append(duration_micros / 1000)
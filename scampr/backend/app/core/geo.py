@@ -0,0 +1,55 @@
+# app/core/geo.py
+import math
+from typing import List
+
+def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Calculate distance between two points in kilometers using Haversine formula"""
+    R = 6371  # Earth's radius in kilometers
+    
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    
+    a = (math.sin(dlat / 2) * math.sin(dlat / 2) +
+         math.cos(lat1_rad) * math.cos(lat2_rad) *
+         math.sin(dlon / 2) * math.sin(dlon / 2))
+    c = 2 * math.asin(math.sqrt(a))
+    
+    return R * c
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Geohash lengths used for regional scoping: ~156km, ~39km and ~5km cells
+REGION_PRECISIONS = (3, 4, 5)
+
+def encode_geohash(latitude: float, longitude: float, precision: int) -> str:
+    """Encode a point as a geohash of the given length"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        # Bits alternate between longitude and latitude, starting with longitude
+        value_range, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (value_range[0] + value_range[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            value_range[0] = mid
+        else:
+            bits = bits << 1
+            value_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(geohash)
+
+def geo_regions(latitude: float, longitude: float) -> List[str]:
+    """Geohash cells containing a point, one per regional precision"""
+    geohash = encode_geohash(latitude, longitude, max(REGION_PRECISIONS))
+    return [geohash[:precision] for precision in REGION_PRECISIONS]
@@ -0,0 +1,128 @@
+# app/core/health.py
+import asyncio
+import logging
+import math
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+from starlette.responses import JSONResponse
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Served before initialization finishes: probes, metrics, API docs and static uploads
+UNGATED_PATHS = {"/livez", "/readyz", "/health", "/metrics", "/docs", "/docs/oauth2-redirect", "/redoc", "/openapi.json"}
+UNGATED_PREFIXES = ("/media/",)
+
+class StartupState:
+    """What the instance has finished initializing, and how long each phase took"""
+    
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.phases: Dict[str, float] = {}
+        self.db_initialized = False
+        self.indexes_ready = False
+        self.last_error: Optional[str] = None
+        self.ready_at: Optional[float] = None
+        self._warmups: Dict[str, Callable[[], Awaitable[None]]] = {}
+        self.warmed: Dict[str, bool] = {}
+        self._last_ping: float = 0.0
+        self._last_ping_ok = False
+    
+    @contextmanager
+    def phase(self, name: str):
+        """Time one initialization phase"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+    
+    def record(self, name: str, seconds: float):
+        self.phases[name] = round(seconds * 1000, 1)
+        logger.info(f"Startup phase {name} took {self.phases[name]}ms")
+    
+    def register_warmup(self, name: str, warmup: Callable[[], Awaitable[None]]):
+        """Register a cache or index that must be built before the instance takes traffic"""
+        self._warmups[name] = warmup
+        self.warmed[name] = False
+    
+    async def run_warmups(self):
+        """Build every registered cache not built yet concurrently, each timed as its own phase
+        
+        Raises the first failure once all of them have finished, so a retry
+        only reruns the warmups that failed.
+        """
+        async def run(name: str, warmup: Callable[[], Awaitable[None]]):
+            with self.phase(f"warmup:{name}"):
+                await warmup()
+            self.warmed[name] = True
+        
+        results = await asyncio.gather(
+            *(run(name, warmup) for name, warmup in self._warmups.items() if not self.warmed[name]),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+    
+    async def database_reachable(self, client) -> bool:
+        """Ping MongoDB, reusing a recent result so frequent probes stay cheap"""
+        if client is None:
+            return False
+        now = time.monotonic()
+        if now - self._last_ping < settings.READINESS_PING_INTERVAL_SECONDS:
+            return self._last_ping_ok
+        self._last_ping = now
+        try:
+            await asyncio.wait_for(client.admin.command("ping"), settings.READINESS_PING_TIMEOUT_SECONDS)
+            self._last_ping_ok = True
+        except Exception as e:
+            self._last_ping_ok = False
+            logger.warning(f"Readiness ping failed: {e}")
+        return self._last_ping_ok
+    
+    def mark_ready(self):
+        self.ready_at = time.monotonic()
+        self.record("total", self.ready_at - self.started_at)
+    
+    def report(self) -> Dict[str, Any]:
+        return {
+            "phases_ms": dict(self.phases),
+            "db_initialized": self.db_initialized,
+            "indexes_ready": self.indexes_ready,
+            "caches_warmed": dict(self.warmed),
+            "ready": self.ready_at is not None,
+            "last_error": self.last_error,
+        }
+
+startup_state = StartupState()
+
+class ReadinessGateMiddleware:
+    """Answer 503 with Retry-After until startup initialization has finished
+    
+    Requests arriving before init_db would otherwise reach unregistered
+    Beanie models and fail with a 500.
+    """
+    
+    def __init__(self, app, state: StartupState):
+        self.app = app
+        self.state = state
+    
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or self.state.ready_at is not None
+            or scope["path"] in UNGATED_PATHS
+            or scope["path"].startswith(UNGATED_PREFIXES)
+            or scope["method"] == "OPTIONS"
+        ):
+            await self.app(scope, receive, send)
+            return
+        
+        response = JSONResponse(
+            {"detail": "Server is starting, retry shortly"},
+            status_code=503,
+            headers={"Retry-After": str(max(1, math.ceil(settings.STARTUP_RETRY_DELAY_SECONDS)))}
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,51 @@
+# app/core/loop_monitor.py
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class LoopLagMonitor:
+    """Measures event loop lag as how late a periodic sleep wakes up"""
+    
+    def __init__(self, interval_seconds: float, smoothing: float = 0.3):
+        self.interval_seconds = interval_seconds
+        self.smoothing = smoothing
+        self.lag_seconds = 0.0  # Exponentially smoothed
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="loop-lag-monitor")
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    @property
+    def lag_ms(self) -> float:
+        return self.lag_seconds * 1000
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lag_ms": round(self.lag_ms, 2),
+            "last_lag_ms": round(self.last_lag_seconds * 1000, 2),
+            "max_lag_ms": round(self.max_lag_seconds * 1000, 2),
+        }
+    
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval_seconds)
+            lag = max(0.0, time.monotonic() - started - self.interval_seconds)
+            self.last_lag_seconds = lag
+            self.max_lag_seconds = max(self.max_lag_seconds, lag)
+            self.lag_seconds += self.smoothing * (lag - self.lag_seconds)
+
+loop_monitor = LoopLagMonitor(settings.LOOP_LAG_SAMPLE_INTERVAL_SECONDS)
@@ -0,0 +1,219 @@
+# app/core/profiling.py
+import asyncio
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Set
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_STACK_DEPTH = 64
+
+# Probes are noise, and live feed streams stay open for as long as the client listens
+UNPROFILED_PATHS = {"/livez", "/readyz", "/health", "/metrics"}
+UNPROFILED_PREFIXES = (f"{settings.API_V1_PREFIX}/live/",)
+
+def _folded_stack(frame) -> str:
+    """A stack in flamegraph "folded" form, outermost frame first"""
+    entries = []
+    while frame is not None and len(entries) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        entries.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(entries))
+
+class Recording:
+    """Stack samples of the event loop taken while one request was in flight"""
+    
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.duration_ms = 0.0
+        self.status_code: Optional[int] = None
+        self.samples: Counter = Counter()
+    
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 2),
+            "status_code": self.status_code,
+            "samples": sum(self.samples.values()),
+        }
+    
+    def folded(self) -> str:
+        """One "stack count" line per distinct stack, ready for flamegraph.pl or speedscope"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+class RequestProfiler:
+    """Statistical profiler for requests
+    
+    A background thread samples the event loop thread's stack while any
+    recording is active and adds each sample to every in-flight request,
+    since they all share the loop. Finished recordings that were slow, or
+    picked at random, are kept in a bounded ring buffer.
+    """
+    
+    def __init__(self, interval_ms: float, buffer_size: int):
+        self.interval_seconds = interval_ms / 1000
+        self.profiles: Deque[Recording] = deque(maxlen=buffer_size)
+        self._active: Set[Recording] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """Start sampling the current thread's event loop"""
+        if self._thread is None:
+            self._loop_thread_id = threading.get_ident()
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        if self._thread:
+            self._stopped.set()
+            self._wake.set()
+            self._thread.join(timeout=1)
+            self._thread = None
+    
+    def begin(self, method: str, path: str) -> Recording:
+        recording = Recording(method, path)
+        with self._lock:
+            self._active.add(recording)
+        self._wake.set()
+        return recording
+    
+    def end(self, recording: Recording, duration_ms: float):
+        with self._lock:
+            self._active.discard(recording)
+            if not self._active:
+                self._wake.clear()
+        recording.duration_ms = duration_ms
+        if duration_ms >= settings.PROFILING_SLOW_REQUEST_MS or random.random() < settings.PROFILING_SAMPLE_RATE:
+            self.profiles.append(recording)
+    
+    def get(self, recording_id: str) -> Optional[Recording]:
+        return next((recording for recording in self.profiles if recording.id == recording_id), None)
+    
+    def summaries(self) -> List[Dict[str, Any]]:
+        return [recording.summary() for recording in reversed(self.profiles)]
+    
+    def _run(self):
+        while not self._stopped.is_set():
+            # Idle until a request is being recorded
+            self._wake.wait()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                stack = _folded_stack(frame)
+                with self._lock:
+                    for recording in self._active:
+                        recording.samples[stack] += 1
+            del frame
+            time.sleep(self.interval_seconds)
+
+class BlockingDetector:
+    """Logs the stack of whatever holds the event loop longer than a threshold
+    
+    A coroutine ticks a heartbeat on the loop; a watchdog thread that sees
+    the heartbeat go stale captures the loop thread's stack while the
+    blocking call is still running.
+    """
+    
+    def __init__(self, threshold_ms: float, history_size: int = 50):
+        self.threshold_seconds = threshold_ms / 1000
+        self.tick_seconds = self.threshold_seconds / 4
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self._last_tick = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """Start watching the current thread's event loop"""
+        if self._heartbeat is None:
+            self._loop_thread_id = threading.get_ident()
+            self._last_tick = time.monotonic()
+            self._heartbeat = asyncio.create_task(self._tick(), name="blocking-detector-heartbeat")
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._watch, name="blocking-detector", daemon=True)
+            self._thread.start()
+    
+    async def stop(self):
+        if self._heartbeat:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+            self._stopped.set()
+            self._thread.join(timeout=1)
+            self._thread = None
+    
+    async def _tick(self):
+        while True:
+            self._last_tick = time.monotonic()
+            await asyncio.sleep(self.tick_seconds)
+    
+    def _watch(self):
+        reported_tick = None
+        while not self._stopped.wait(self.tick_seconds):
+            last_tick = self._last_tick
+            blocked = time.monotonic() - last_tick - self.tick_seconds
+            if blocked < self.threshold_seconds or last_tick == reported_tick:
+                continue
+            # Report each stall once, with the stack as it is now
+            reported_tick = last_tick
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            del frame
+            self.events.append({"at": datetime.utcnow(), "blocked_ms": round(blocked * 1000, 1), "stack": stack})
+            logger.warning(f"Event loop blocked for at least {blocked * 1000:.0f}ms:\n{stack}")
+
+class ProfilingMiddleware:
+    """Records an event loop profile for each request while profiling is enabled"""
+    
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+    
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not settings.PROFILING_ENABLED
+            or scope["path"] in UNPROFILED_PATHS
+            or scope["path"].startswith(UNPROFILED_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+        
+        recording = self.profiler.begin(scope["method"], scope["path"])
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                recording.status_code = message["status"]
+            await send(message)
+        
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.profiler.end(recording, (time.perf_counter() - started) * 1000)
+
+request_profiler = RequestProfiler(settings.PROFILING_SAMPLE_INTERVAL_MS, settings.PROFILING_BUFFER_SIZE)
+blocking_detector = BlockingDetector(settings.BLOCKING_THRESHOLD_MS)
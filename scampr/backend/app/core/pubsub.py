@@ -0,0 +1,96 @@
+# app/core/pubsub.py
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    """One subscriber's bounded queue of events"""
+    
+    def __init__(self, hub: "PubSubHub", topics: Set[str], queue_size: int):
+        self.hub = hub
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+        self.close_reason: Optional[str] = None
+    
+    def close(self, reason: str):
+        if self.closed:
+            return
+        self.closed = True
+        self.close_reason = reason
+        self.hub._remove(self)
+    
+    async def events(self, heartbeat_seconds: float) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield events as they arrive, or None when idle for heartbeat_seconds"""
+        try:
+            while not self.closed:
+                try:
+                    yield await asyncio.wait_for(self.queue.get(), heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self.close("unsubscribed")
+
+class PubSubHub:
+    """In-process topic fan-out to many mostly idle subscribers
+    
+    Publishing never waits: a subscriber whose queue is full is considered a
+    slow consumer and is dropped, so one stalled connection can't hold up
+    delivery to everyone else. Dropped clients simply reconnect.
+    """
+    
+    def __init__(self, queue_size: int, max_subscribers: int):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self._subscriber_count = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped_slow = 0
+    
+    def subscribe(self, topics: Iterable[str]) -> Optional[Subscription]:
+        """Subscribe to topics, or return None if this worker is at capacity"""
+        if self.at_capacity():
+            return None
+        subscription = Subscription(self, set(topics), self.queue_size)
+        for topic in subscription.topics:
+            self._topics.setdefault(topic, set()).add(subscription)
+        self._subscriber_count += 1
+        return subscription
+    
+    def at_capacity(self) -> bool:
+        return self._subscriber_count >= self.max_subscribers
+    
+    def publish(self, topics: Iterable[str], event: Dict[str, Any]):
+        """Deliver an event once to every subscriber of any of the topics"""
+        self.published += 1
+        recipients: Set[Subscription] = set()
+        for topic in topics:
+            recipients.update(self._topics.get(topic, ()))
+        for subscription in recipients:
+            try:
+                subscription.queue.put_nowait(event)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self.dropped_slow += 1
+                subscription.close("slow consumer")
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": self._subscriber_count,
+            "topics": len(self._topics),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_slow_consumers": self.dropped_slow,
+        }
+    
+    def _remove(self, subscription: Subscription):
+        for topic in subscription.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[topic]
+        self._subscriber_count -= 1
@@ -0,0 +1,172 @@
+# app/core/ratelimit.py
+import json
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from jose import JWTError, jwt
+from .config import settings
+from .loop_monitor import LoopLagMonitor
+
+logger = logging.getLogger(__name__)
+
+# Requests that must always get through, even under overload
+EXEMPT_PATHS = {"/livez", "/readyz", "/health", "/metrics"}
+EXEMPT_PREFIXES = ("/media/",)  # Static, immutable uploads; a list view loads many at once
+
+# Token cost per request; expensive routes drain a client's bucket faster
+ROUTE_COSTS = {
+    ("POST", f"{settings.API_V1_PREFIX}/auth/login"): 10,  # bcrypt
+    ("POST", f"{settings.API_V1_PREFIX}/auth/register"): 10,  # bcrypt
+    ("POST", f"{settings.API_V1_PREFIX}/auth/sync"): 3,
+    ("GET", f"{settings.API_V1_PREFIX}/trees/search"): 5,  # scores up to 1000 trees
+    ("POST", f"{settings.API_V1_PREFIX}/sync/batch"): 5,  # up to SYNC_MAX_OPERATIONS writes
+}
+
+# Load shedding: reads go first when the loop falls behind, writes only when it's badly behind
+LOW_PRIORITY = "low"
+NORMAL_PRIORITY = "normal"
+
+# Rejection counters for /metrics (the middleware instance is built lazily by Starlette)
+rejections = {"rate_limited": 0, "overloaded": 0}
+
+class BucketBackend(ABC):
+    """Storage for token buckets; swap in a shared store to limit across workers"""
+    
+    @abstractmethod
+    async def take(self, key: str, cost: float, rate: float, capacity: float) -> float:
+        """Take cost tokens from key's bucket, returning 0 or the seconds until they'd be available"""
+
+class MemoryBucketBackend(BucketBackend):
+    """Per-worker buckets in an LRU map, so idle clients don't accumulate"""
+    
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+    
+    async def take(self, key: str, cost: float, rate: float, capacity: float) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        
+        if tokens >= cost:
+            wait = 0.0
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+        
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+def create_bucket_backend() -> BucketBackend:
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        return MemoryBucketBackend(settings.RATE_LIMIT_MAX_KEYS)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {settings.RATE_LIMIT_BACKEND}")
+
+def validate_route_costs():
+    """Fail fast if a route costs more than a full bucket, which would make it unreachable"""
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    too_costly = [
+        f"{method} {path} ({cost})" for (method, path), cost in ROUTE_COSTS.items() if cost > settings.RATE_LIMIT_BURST
+    ]
+    if too_costly:
+        raise ValueError(
+            f"RATE_LIMIT_BURST={settings.RATE_LIMIT_BURST} is below the cost of {', '.join(too_costly)}; "
+            f"those routes would always be rate limited"
+        )
+
+def admission_stats() -> Dict[str, Any]:
+    return {"rejected": dict(rejections)}
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+def client_key(scope) -> str:
+    """Rate limit key: the token's user when a valid bearer token is sent, otherwise the client IP"""
+    authorization = _header(scope, b"authorization")
+    if authorization and authorization.lower().startswith("bearer "):
+        try:
+            # Signature check only (no DB lookup), so this stays cheap
+            payload = jwt.decode(authorization[7:], settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            if payload.get("sub"):
+                return f"user:{payload['sub']}"
+        except JWTError:
+            pass
+    
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded_for = _header(scope, b"x-forwarded-for")
+        if forwarded_for:
+            # Each trusted proxy appends the address it got the request from; entries left of
+            # those were sent by the client and can be anything
+            entries = [entry.strip() for entry in forwarded_for.split(",")]
+            hops = max(1, settings.RATE_LIMIT_TRUSTED_PROXY_HOPS)
+            if len(entries) >= hops:
+                return f"ip:{entries[-hops]}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+class AdmissionControlMiddleware:
+    """Per-client token buckets plus event-loop-lag load shedding
+    
+    Clients that spend their tokens get 429 with Retry-After. When the event
+    loop lags past LOAD_SHED_LAG_MS, low-priority requests (reads) are
+    rejected with 503 so the requests already admitted can finish; past
+    LOAD_SHED_CRITICAL_LAG_MS, writes are shed too.
+    """
+    
+    def __init__(self, app, backend: BucketBackend, lag_monitor: LoopLagMonitor):
+        self.app = app
+        self.backend = backend
+        self.lag_monitor = lag_monitor
+    
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"] in EXEMPT_PATHS
+            or scope["path"].startswith(EXEMPT_PREFIXES)
+            or scope["method"] == "OPTIONS"
+        ):
+            await self.app(scope, receive, send)
+            return
+        
+        if settings.LOAD_SHEDDING_ENABLED:
+            priority = LOW_PRIORITY if scope["method"] in ("GET", "HEAD") else NORMAL_PRIORITY
+            threshold = settings.LOAD_SHED_LAG_MS if priority == LOW_PRIORITY else settings.LOAD_SHED_CRITICAL_LAG_MS
+            if self.lag_monitor.lag_ms > threshold:
+                rejections["overloaded"] += 1
+                await self._reject(send, 503, "Server is overloaded, retry shortly", settings.LOAD_SHED_RETRY_AFTER_SECONDS)
+                return
+        
+        if settings.RATE_LIMIT_ENABLED:
+            cost = ROUTE_COSTS.get((scope["method"], scope["path"].rstrip("/")), 1)
+            wait = await self.backend.take(
+                client_key(scope), cost, settings.RATE_LIMIT_TOKENS_PER_SECOND, settings.RATE_LIMIT_BURST
+            )
+            if wait > 0:
+                rejections["rate_limited"] += 1
+                await self._reject(send, 429, "Too many requests", wait)
+                return
+        
+        await self.app(scope, receive, send)
+    
+    async def _reject(self, send, status_code: int, detail: str, retry_after: float):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
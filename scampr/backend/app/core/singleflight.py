@@ -0,0 +1,95 @@
+# app/core/singleflight.py
+import asyncio
+import functools
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class SingleFlightTimeout(Exception):
+    """A caller waited longer than its group's timeout for the shared call"""
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one
+    
+    The first caller for a key starts the call as its own task; callers that
+    arrive while it is running await the same task and get the same result
+    or exception. Each caller waits at most the timeout (then gets
+    SingleFlightTimeout), and a caller that gives up or is cancelled doesn't
+    cancel the call for the others. Results are shared objects, so callers
+    must not mutate them.
+    """
+    
+    def __init__(self, name: str, timeout_seconds: Optional[float] = None):
+        self.name = name
+        self.timeout_seconds = timeout_seconds
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.timeouts = 0
+        _groups.append(self)
+    
+    async def do(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        self.calls += 1
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await func(*args, **kwargs)
+        
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(func(*args, **kwargs))
+            self._in_flight[key] = task
+            task.add_done_callback(functools.partial(self._finished, key))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout_seconds)
+        except asyncio.TimeoutError:
+            if task.done():
+                # The call itself timed out, e.g. a driver timeout; that's its error to report
+                raise
+            self.timeouts += 1
+            raise SingleFlightTimeout(f"{self.name} call took longer than {self.timeout_seconds}s") from None
+    
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Retrieving the exception also keeps asyncio from warning when every caller gave up
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._in_flight),
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+        }
+
+_groups: List[SingleFlight] = []
+
+def _default_key(*args, **kwargs) -> Hashable:
+    # repr() so dict arguments (queries, projections) work as keys
+    return repr((args, sorted(kwargs.items())))
+
+def single_flight(name: str, key: Callable[..., Hashable] = _default_key):
+    """Decorate an async loader so concurrent calls with the same key share one execution"""
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        group = SingleFlight(name, settings.SINGLE_FLIGHT_TIMEOUT_SECONDS)
+        
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await group.do(key(*args, **kwargs), func, *args, **kwargs)
+        
+        wrapper.single_flight = group
+        return wrapper
+    return decorator
+
+def single_flight_stats() -> Dict[str, Dict[str, Any]]:
+    return {group.name: group.stats() for group in _groups}
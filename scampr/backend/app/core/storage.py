@@ -0,0 +1,67 @@
+# app/core/storage.py
+import asyncio
+import os
+import shutil
+from abc import ABC, abstractmethod
+from fastapi.staticfiles import StaticFiles
+from .config import settings
+
+# Stored objects are content-addressed, so their URLs never change meaning
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+class ImageStorage(ABC):
+    """Where uploaded images live; subclass for object storage"""
+    
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Whether an object is stored under key"""
+    
+    @abstractmethod
+    async def put_file(self, key: str, path: str, content_type: str):
+        """Store the local file at path under key"""
+    
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """Public URL of the object stored under key"""
+
+class LocalImageStorage(ImageStorage):
+    """Images on local disk, served by the API under /media"""
+    
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+    
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self._path(key))
+    
+    async def put_file(self, key: str, path: str, content_type: str):
+        await asyncio.to_thread(self._copy, path, self._path(key))
+    
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+    
+    @staticmethod
+    def _copy(source: str, destination: str):
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        # Copy beside the destination and rename, so readers never see a partial file
+        partial = f"{destination}.partial"
+        shutil.copyfile(source, partial)
+        os.replace(partial, destination)
+
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles whose responses may be cached forever"""
+    
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+def create_image_storage() -> ImageStorage:
+    if settings.IMAGE_STORAGE_BACKEND == "local":
+        return LocalImageStorage(settings.MEDIA_ROOT, settings.MEDIA_BASE_URL or f"{settings.API_URL}/media")
+    raise ValueError(f"Unknown IMAGE_STORAGE_BACKEND: {settings.IMAGE_STORAGE_BACKEND}")
+
+image_storage = create_image_storage()
@@ -0,0 +1,202 @@
+# app/core/tasks.py
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class _Job:
+    """A queued call, identified by a coalescing key"""
+    __slots__ = ("key", "func", "args", "attempt", "enqueued_at")
+    
+    def __init__(self, key: str, func: Callable[..., Awaitable[Any]], args: tuple):
+        self.key = key
+        self.func = func
+        self.args = args
+        self.attempt = 0
+        self.enqueued_at = time.monotonic()
+
+class TaskQueue:
+    """In-process queue for post-write side effects
+    
+    Jobs sharing a key are coalesced while they wait: enqueueing a key that is
+    already pending only refreshes its arguments, so a burst of reviews on one
+    tree triggers a single aggregate refresh. Failed jobs are retried with
+    exponential backoff.
+    """
+    
+    def __init__(self, concurrency: int, max_retries: int, retry_base_delay: float):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Dict[str, _Job] = {}
+        self._workers: List[asyncio.Task] = []
+        self._retry_handles: Dict[str, asyncio.TimerHandle] = {}
+        self._draining = False
+        self._latencies: Deque[float] = deque(maxlen=1000)
+        self._counters = {"enqueued": 0, "coalesced": 0, "completed": 0, "retried": 0, "failed": 0, "lost": 0}
+    
+    def start(self):
+        """Start the worker tasks on the running event loop"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        for job in self._pending.values():
+            self._queue.put_nowait(job)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"task-queue-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        logger.info(f"Task queue started with {self.concurrency} workers")
+    
+    async def drain(self, timeout: float):
+        """Wait for queued jobs to finish, then stop the workers
+        
+        Jobs waiting on a retry backoff, and retries of jobs failing during
+        the drain, run right away instead of after their delay. Jobs still
+        not run when the timeout expires are logged as lost.
+        """
+        if not self._workers:
+            return
+        self._draining = True
+        for handle in self._retry_handles.values():
+            handle.cancel()
+        for job in list(self._retry_jobs()):
+            self._queue.put_nowait(job)
+        self._retry_handles.clear()
+        
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Task queue drain timed out with {self._queue.qsize()} jobs left")
+        
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._draining = False
+        
+        if self._pending:
+            self._counters["lost"] += len(self._pending)
+            logger.error(f"Task queue stopped with {len(self._pending)} jobs not run: {', '.join(sorted(self._pending))}")
+            self._pending.clear()
+    
+    def enqueue(self, key: str, func: Callable[..., Awaitable[Any]], *args) -> bool:
+        """Queue func(*args), returning False if it coalesced into a pending job"""
+        pending = self._pending.get(key)
+        if pending is not None:
+            # Latest arguments win, e.g. the newest display name for a fan-out
+            pending.func = func
+            pending.args = args
+            self._counters["coalesced"] += 1
+            return False
+        
+        job = _Job(key, func, args)
+        self._pending[key] = job
+        self._counters["enqueued"] += 1
+        if self._queue is not None:
+            self._queue.put_nowait(job)
+        return True
+    
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, job counters and enqueue-to-completion latency"""
+        latencies = sorted(self._latencies)
+        
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+        
+        return {
+            "depth": self._queue.qsize() if self._queue is not None else len(self._pending),
+            "pending": len(self._pending),
+            "waiting_retry": len(self._retry_handles),
+            "workers": len(self._workers),
+            **self._counters,
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99)},
+        }
+    
+    def _retry_jobs(self):
+        return (job for job in self._pending.values() if job.key in self._retry_handles)
+    
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+    
+    async def _run(self, job: _Job):
+        # Once started, a new enqueue of the same key must run again after us
+        if self._pending.get(job.key) is job:
+            del self._pending[job.key]
+        job.attempt += 1
+        try:
+            await job.func(*job.args)
+        except asyncio.CancelledError:
+            self._counters["lost"] += 1
+            logger.error(f"Job {job.key} was cancelled before it finished")
+            raise
+        except Exception as e:
+            if job.attempt > self.max_retries:
+                self._counters["failed"] += 1
+                logger.error(f"Job {job.key} failed after {job.attempt} attempts: {e}")
+                return
+            self._schedule_retry(job, e)
+            return
+        self._counters["completed"] += 1
+        self._latencies.append(time.monotonic() - job.enqueued_at)
+    
+    def _schedule_retry(self, job: _Job, error: Exception):
+        if job.key in self._pending:
+            # A newer job for the same key is already queued and will redo the work
+            self._counters["coalesced"] += 1
+            return
+        self._counters["retried"] += 1
+        self._pending[job.key] = job
+        if self._draining:
+            # No time left for a backoff; queued before this job's task_done so the drain waits for it
+            logger.warning(f"Job {job.key} failed (attempt {job.attempt}) while draining, retrying now: {error}")
+            self._queue.put_nowait(job)
+            return
+        delay = self.retry_base_delay * (2 ** (job.attempt - 1))
+        logger.warning(f"Job {job.key} failed (attempt {job.attempt}), retrying in {delay:.1f}s: {error}")
+        self._retry_handles[job.key] = asyncio.get_running_loop().call_later(delay, self._requeue, job)
+    
+    def _requeue(self, job: _Job):
+        self._retry_handles.pop(job.key, None)
+        if self._queue is not None:
+            self._queue.put_nowait(job)
+
+def run_periodically(
+    name: str,
+    interval_seconds: float,
+    func: Callable[[], Awaitable[Any]],
+    run_at_start: bool = False
+) -> asyncio.Task:
+    """Start a task calling func every interval_seconds until cancelled, first right away if run_at_start"""
+    async def loop():
+        first = True
+        while True:
+            if not (first and run_at_start):
+                await asyncio.sleep(interval_seconds)
+            first = False
+            try:
+                await func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Periodic job {name} failed: {e}")
+    
+    return asyncio.create_task(loop(), name=f"periodic-{name}")
+
+task_queue = TaskQueue(
+    concurrency=settings.TASK_QUEUE_CONCURRENCY,
+    max_retries=settings.TASK_MAX_RETRIES,
+    retry_base_delay=settings.TASK_RETRY_BASE_DELAY_SECONDS,
+)
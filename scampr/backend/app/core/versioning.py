@@ -0,0 +1,45 @@
+# app/core/versioning.py
+from typing import Any, Dict, Optional
+from fastapi import HTTPException, status
+
+def etag(version: int) -> str:
+    """Format a document version as a strong ETag"""
+    return f'"{version}"'
+
+def parse_if_match(if_match: Optional[str], current_version: int) -> int:
+    """The version an update must still find, given the If-Match header and the version just read
+    
+    Without the header, or with "*", the version read by the request itself
+    is used. With a list of ETags the update goes ahead if the current
+    version is one of them; otherwise it is guarded by the first, so it
+    conflicts unless the document changed back to that version.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return current_version
+    versions = []
+    for tag in if_match.split(","):
+        value = tag.strip()
+        if value.startswith("W/"):
+            value = value[2:]
+        try:
+            versions.append(int(value.strip('"')))
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="If-Match must be ETags returned by this API or *"
+            )
+    return current_version if current_version in versions else versions[0]
+
+def version_filter(version: int) -> Dict[str, Any]:
+    """Query fragment matching documents still at the given version"""
+    if version == 0:
+        # Documents written before versioning have no version field yet
+        return {"version": {"$in": [0, None]}}
+    return {"version": version}
+
+def conflict_exception(kind: str) -> HTTPException:
+    """409 raised when a versioned update lost the race"""
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"{kind} was modified by another request; reload it and retry"
+    )
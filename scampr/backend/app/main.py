@@ -1,10 +1,32 @@
 # app/main.py
+import time
+_import_started = time.perf_counter()
+
+import asyncio
 import logging
-from fastapi import FastAPI, Request
+import os
+from typing import List
+from fastapi import FastAPI, Request, Response, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from .core.config import settings
-from .core.database import init_db, close_db
+from .core.body_limit import BodySizeLimitMiddleware
+from .core.cache import cache_stats
+from .core.database import Database, init_db, close_db, db_stats
+from .core.health import ReadinessGateMiddleware, startup_state
+from .core.singleflight import SingleFlightTimeout, single_flight_stats
+from .core.loop_monitor import loop_monitor
+from .core.profiling import ProfilingMiddleware, request_profiler, blocking_detector
+from .core.storage import ImmutableStaticFiles
+from .core.ratelimit import AdmissionControlMiddleware, admission_stats, create_bucket_backend, validate_route_costs
+from .core.tasks import task_queue, run_periodically
 from .api.routes import api_router
+from .services.images import MULTIPART_OVERHEAD_BYTES, UPLOAD_PATH_PATTERN, shutdown_image_pool
+from .services.live_feed import hub as live_hub
+from .services.recommendations import refresh_similar_trees
+from .services.tree_stats import backfill_tree_details
+from .services.trending import backfill_geo_regions, validate_trending_settings
+from .services.user_trees import migrate_legacy_user_tree_lists
 
 # Configure logging
 logging.basicConfig(
@@ -12,6 +34,11 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
 )
 logger = logging.getLogger(__name__)
+startup_state.record("import", time.perf_counter() - _import_started)
+
+# Fail fast on settings that would only break at request time
+validate_trending_settings()
+validate_route_costs()
 
 # Create FastAPI app
 app = FastAPI(
@@ -20,6 +47,22 @@ app = FastAPI(
     redirect_slashes=True
 )
 
+# Add request profiling (innermost, so rejected requests aren't recorded)
+app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+
+# Cap upload bodies before Starlette spools them to disk
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=settings.IMAGE_MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    path_pattern=UPLOAD_PATH_PATTERN
+)
+
+# Add admission control (added before CORS so rejections still carry CORS headers)
+app.add_middleware(AdmissionControlMiddleware, backend=create_bucket_backend(), lag_monitor=loop_monitor)
+
+# Hold off requests until the database is initialized and caches are warm
+app.add_middleware(ReadinessGateMiddleware, state=startup_state)
+
 # Add CORS middleware
 cors_origins = settings.CORS_ORIGINS.split(",") if settings.CORS_ORIGINS != "*" else ["*"]
 app.add_middleware(
@@ -42,30 +85,131 @@ async def log_requests(request: Request, call_next):
     logger.info(f"Response status: {response.status_code}")
     return response
 
+# Reads that waited out SINGLE_FLIGHT_TIMEOUT_SECONDS on a shared call are worth retrying
+@app.exception_handler(SingleFlightTimeout)
+async def single_flight_timeout_handler(request: Request, exc: SingleFlightTimeout):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Timed out, retry shortly"},
+        headers={"Retry-After": "1"}
+    )
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_PREFIX)
 
+# Serve locally stored uploads; their URLs are content-addressed, so they're cached forever
+if settings.IMAGE_STORAGE_BACKEND == "local":
+    os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+    app.mount("/media", ImmutableStaticFiles(directory=settings.MEDIA_ROOT), name="media")
+
+# Long-running periodic jobs, cancelled on shutdown
+periodic_jobs: List[asyncio.Task] = []
+
+async def initialize():
+    """Connect to MongoDB and warm caches, retrying until both succeed"""
+    delay = settings.STARTUP_RETRY_DELAY_SECONDS
+    while True:
+        try:
+            if not startup_state.db_initialized:
+                with startup_state.phase("init_db"):
+                    await init_db()
+                logger.info("Database initialized")
+            # Only the warmups that haven't succeeded yet run again
+            await startup_state.run_warmups()
+            break
+        except Exception as e:
+            startup_state.last_error = str(e)
+            logger.error(f"Initialization failed, retrying in {delay:.0f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.STARTUP_MAX_RETRY_DELAY_SECONDS)
+    
+    startup_state.last_error = None
+    startup_state.mark_ready()
+    logger.info("Scampr API ready")
+    
+    # One-off migrations of older documents, run in the background so startup isn't held up
+    task_queue.enqueue("migrate-user-tree-lists", migrate_legacy_user_tree_lists)
+    task_queue.enqueue("backfill-geo-regions", backfill_geo_regions)
+    task_queue.enqueue("backfill-tree-details", backfill_tree_details)
+    
+    if settings.SIMILARITY_ENABLED:
+        # Leased in MongoDB, so only one worker per deployment does the work each interval.
+        # Runs at startup too, so a fresh deployment doesn't serve empty lists for an interval
+        periodic_jobs.append(run_periodically(
+            "similar-trees", settings.SIMILARITY_REFRESH_INTERVAL_SECONDS, refresh_similar_trees, run_at_start=True
+        ))
+
 # Event handlers
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database connection on startup"""
+    """Start serving immediately and initialize in the background"""
     logger.info("Starting Scampr API")
-    await init_db()
-    logger.info("Database initialized")
+    task_queue.start()
+    loop_monitor.start()
+    if settings.PROFILING_ENABLED:
+        request_profiler.start()
+    if settings.BLOCKING_DETECTOR_ENABLED:
+        blocking_detector.start()
+    # /readyz reports 503 until this finishes, so traffic only arrives once the instance is warm
+    app.state.initialization = asyncio.create_task(initialize())
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Close database connection on shutdown"""
     logger.info("Shutting down Scampr API")
+    for task in [app.state.initialization, *periodic_jobs]:
+        task.cancel()
+    await asyncio.gather(app.state.initialization, *periodic_jobs, return_exceptions=True)
+    await task_queue.drain(settings.TASK_DRAIN_TIMEOUT_SECONDS)
+    logger.info("Task queue drained")
+    await loop_monitor.stop()
+    await blocking_detector.stop()
+    request_profiler.stop()
+    shutdown_image_pool()
     await close_db()
     logger.info("Database connection closed")
 
-# Health check endpoint
+# Liveness probe: the process is up and the event loop is responsive
+@app.get("/livez")
+async def liveness_check():
+    """Liveness probe endpoint"""
+    return {"status": "alive", "version": "1.0.0"}
+
+# Readiness probe: only send traffic once the database and caches are ready
+@app.get("/readyz")
+async def readiness_check(response: Response):
+    """Readiness probe endpoint"""
+    checks = {
+        "database": await startup_state.database_reachable(Database.client),
+        "indexes": startup_state.indexes_ready,
+        "caches": all(startup_state.warmed.values()),
+    }
+    ready = all(checks.values()) and startup_state.ready_at is not None
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"status": "ready" if ready else "not_ready", "checks": checks, "startup": startup_state.report()}
+
+# Health check endpoint (kept for existing monitors; same as /livez)
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "version": "1.0.0"}
 
+# Metrics endpoint
+@app.get("/metrics")
+async def metrics():
+    """Runtime metrics for background subsystems"""
+    return {
+        "task_queue": task_queue.stats(),
+        "caches": cache_stats(),
+        "single_flight": single_flight_stats(),
+        "change_stream": Database.change_stream.stats() if Database.change_stream else None,
+        "mongodb": db_stats(),
+        "startup": startup_state.report(),
+        "live_feed": live_hub.stats(),
+        "admission": {**admission_stats(), "event_loop": loop_monitor.stats()}
+    }
+
 # Root endpoint for testing
 @app.get("/")
 async def root():
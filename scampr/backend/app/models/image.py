@@ -0,0 +1,42 @@
+# app/models/image.py
+from beanie import Document
+from pydantic import BaseModel, Field
+from pymongo import IndexModel
+from typing import Dict
+from datetime import datetime
+
+class ImageVariant(BaseModel):
+    """One resized rendition of an uploaded image"""
+    url: str
+    width: int
+    height: int
+
+class StoredImage(Document):
+    """An uploaded image, stored once per distinct content"""
+    content_hash: str  # SHA-256 of the uploaded bytes; also the storage prefix
+    variants: Dict[str, ImageVariant] = {}  # e.g. "thumb", "medium", "full"
+    size_bytes: int
+    uploaded_by: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    class Settings:
+        name = "images"
+        indexes = [
+            IndexModel("content_hash", unique=True),
+        ]
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "content_hash": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08",
+                "variants": {
+                    "thumb": {
+                        "url": "https://api.example.com/media/images/9f/9f86d0.../thumb.jpg",
+                        "width": 320,
+                        "height": 240
+                    }
+                },
+                "size_bytes": 2480133,
+                "uploaded_by": "user_id_123"
+            }
+        }
@@ -0,0 +1,20 @@
+# app/models/job_state.py
+from beanie import Document
+from pymongo import IndexModel
+from typing import List, Optional
+from datetime import datetime
+
+class JobState(Document):
+    """Progress and lease for a periodic job shared by all workers"""
+    name: str
+    last_run_at: Optional[datetime] = None  # Start of the last successful run, used as a watermark
+    last_full_run_at: Optional[datetime] = None
+    lease_owner: Optional[str] = None
+    lease_until: Optional[datetime] = None
+    # Deleted reviews the next run must account for, see services/recommendations.py
+    removed_reviewers: List[str] = []
+    stale_trees: List[str] = []
+    
+    class Settings:
+        name = "job_state"
+        indexes = [IndexModel("name", unique=True)]
@@ -1,6 +1,7 @@
 # app/models/review.py
 from beanie import Document
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from pymongo import IndexModel, ASCENDING, DESCENDING
 from datetime import datetime
 
 class Review(Document):
@@ -8,12 +9,19 @@ class Review(Document):
     tree_id: str
     user_id: str
     user_name: str
+    user_name_version: int = 0  # display_name_version the user_name copy was taken from
     rating: float  # 1.0 to 5.0
     comment: str
-    created_at: datetime = datetime.utcnow()
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    version: int = 0  # Optimistic concurrency token, exposed as the ETag
     
     class Settings:
         name = "reviews"
+        indexes = [
+            "user_id",
+            # Serves lookups by tree and its newest-first pages
+            IndexModel([("tree_id", ASCENDING), ("created_at", DESCENDING)]),
+        ]
         
     class Config:
         json_schema_extra = {
@@ -0,0 +1,27 @@
+# app/models/sync_operation.py
+from beanie import Document
+from pydantic import Field
+from pymongo import IndexModel, ASCENDING
+from typing import Any, Dict, Optional
+from datetime import datetime
+
+PENDING = "pending"
+DONE = "done"
+
+class SyncOperation(Document):
+    """Outcome of one queued offline action, so a replayed batch doesn't apply it twice"""
+    user_id: str
+    idempotency_key: str  # Chosen by the client, unique per user
+    status: str = PENDING  # "pending" while a batch is applying it, then "done"
+    result: Optional[Dict[str, Any]] = None
+    claim_id: Optional[str] = None  # The batch holding the pending claim
+    claimed_at: Optional[datetime] = None  # Another batch may take over a pending claim once its lease runs out
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    class Settings:
+        name = "sync_operations"
+        indexes = [
+            IndexModel([("user_id", ASCENDING), ("idempotency_key", ASCENDING)], unique=True),
+            # Clients don't replay actions older than a week
+            IndexModel("created_at", expireAfterSeconds=7 * 24 * 3600),
+        ]
@@ -1,7 +1,8 @@
 # app/models/tree.py
 from beanie import Document
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from typing import Dict, List
 from datetime import datetime
 
 class Location(BaseModel):
@@ -9,6 +10,22 @@ class Location(BaseModel):
     latitude: float
     longitude: float
 
+class TreeImage(BaseModel):
+    """An uploaded photo of a tree, pairing its full-size URL with its thumbnail"""
+    url: str  # Also listed in image_urls
+    thumbnail_url: str
+
+class RecentReview(BaseModel):
+    """Copy of one of a tree's latest reviews, kept on the tree for the detail page"""
+    id: str
+    user_id: str
+    user_name: str
+    user_name_version: int = 0
+    rating: float
+    comment: str
+    created_at: datetime
+    version: int = 0
+
 class Tree(Document):
     """Tree model for climbing locations"""
     name: str
@@ -17,17 +34,32 @@ class Tree(Document):
     address: str
     user_id: str
     user_name: str
+    user_name_version: int = 0  # display_name_version the user_name copy was taken from
     image_urls: List[str] = []
+    images: List[TreeImage] = []  # Uploaded photos, for their thumbnails; older image_urls have none
     difficulty: float  # 1.0 to 5.0
     tree_type: str
     height: float  # in meters
     features: List[str] = []  # e.g., ["thick_branches", "good_handholds", "scenic_view"]
-    created_at: datetime = datetime.utcnow()
+    created_at: datetime = Field(default_factory=datetime.utcnow)
     climb_count: int = 0
     average_rating: float = 0.0
+    version: int = 0  # Optimistic concurrency token, exposed as the ETag
+    trending_score: float = 0.0  # Forward-decayed review activity, see services/trending.py
+    geo_regions: List[str] = []  # Geohash prefixes of the location, for regional top-K reads
+    # Detail read model, maintained by services/tree_stats.py on every review write
+    recent_reviews: List[RecentReview] = []  # Newest first, at most TREE_RECENT_REVIEWS
+    rating_histogram: Dict[str, int] = {}  # Review count per rounded rating, "1" to "5"
     
     class Settings:
         name = "trees"
+        indexes = [
+            "user_id",
+            IndexModel([("trending_score", DESCENDING)]),
+            IndexModel([("geo_regions", ASCENDING), ("trending_score", DESCENDING)]),
+            # Latitude bands, for the similarity job's neighbourhood loads and facet geo filters
+            IndexModel([("location.latitude", ASCENDING), ("location.longitude", ASCENDING)]),
+        ]
         
     class Config:
         json_schema_extra = {
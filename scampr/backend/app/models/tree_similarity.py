@@ -0,0 +1,44 @@
+# app/models/tree_similarity.py
+from beanie import Document
+from pydantic import BaseModel, Field
+from pymongo import IndexModel
+from typing import List
+from datetime import datetime
+
+class SimilarTree(BaseModel):
+    """A precomputed neighbour, with enough of the tree to render it"""
+    tree_id: str
+    score: float
+    name: str
+    tree_type: str
+    average_rating: float = 0.0
+
+class TreeSimilarity(Document):
+    """Top-N most similar trees for one tree, rebuilt by the recommendation job"""
+    tree_id: str
+    neighbors: List[SimilarTree] = []  # Sorted by score, highest first
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    class Settings:
+        name = "tree_similarities"
+        indexes = [
+            IndexModel("tree_id", unique=True),
+            "neighbors.tree_id",
+        ]
+        
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "tree_id": "tree_id_123",
+                "neighbors": [
+                    {
+                        "tree_id": "tree_id_456",
+                        "score": 0.82,
+                        "name": "The Twin Oaks",
+                        "tree_type": "Oak",
+                        "average_rating": 4.4
+                    }
+                ],
+                "updated_at": "2023-12-06T10:00:00Z"
+            }
+        }
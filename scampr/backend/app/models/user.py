@@ -1,19 +1,18 @@
 # app/models/user.py
 from beanie import Document
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field
+from typing import Optional
 from datetime import datetime
 
 class User(Document):
     """User model for Scampr app"""
     email: EmailStr
     display_name: str
+    display_name_version: int = 0  # Bumped on every rename, used by the user_name fan-out
     password_hash: str
     firebase_uid: Optional[str] = None  # Firebase Auth UID
     profile_image_url: Optional[str] = None
-    climbed_trees: List[str] = []
-    added_trees: List[str] = []
-    joined_date: datetime = datetime.utcnow()
+    joined_date: datetime = Field(default_factory=datetime.utcnow)
     total_climbs: int = 0
     is_active: bool = True
     
@@ -26,8 +25,6 @@ class User(Document):
                 "email": "user@example.com",
                 "display_name": "John Doe",
                 "profile_image_url": "https://example.com/avatar.jpg",
-                "climbed_trees": ["tree_id_1", "tree_id_2"],
-                "added_trees": ["tree_id_3"],
                 "total_climbs": 5
             }
         }
\ No newline at end of file
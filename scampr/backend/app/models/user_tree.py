@@ -0,0 +1,35 @@
+# app/models/user_tree.py
+from beanie import Document
+from pydantic import Field
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from datetime import datetime
+
+CLIMBED = "climbed"
+ADDED = "added"
+
+class UserTree(Document):
+    """A tree in one of a user's lists (climbed or added)"""
+    user_id: str
+    tree_id: str
+    relation: str  # "climbed" or "added"
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    class Settings:
+        name = "user_trees"
+        indexes = [
+            IndexModel(
+                [("user_id", ASCENDING), ("relation", ASCENDING), ("tree_id", ASCENDING)],
+                unique=True
+            ),
+            IndexModel([("user_id", ASCENDING), ("relation", ASCENDING), ("created_at", DESCENDING)]),
+        ]
+        
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "user_id": "user_id_456",
+                "tree_id": "tree_id_123",
+                "relation": "climbed",
+                "created_at": "2023-12-06T10:00:00Z"
+            }
+        }
@@ -0,0 +1,182 @@
+# app/services/facets.py
+import math
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from ..core.cache import TTLCache
+from ..core.change_streams import register_change_handler
+from ..core.config import settings
+from ..core.database import heavy_read_preference
+from ..core.singleflight import single_flight
+from ..models.tree import Tree
+
+EARTH_RADIUS_KM = 6371.0
+
+# Difficulty runs from 1.0 to 5.0; the last band includes 5.0
+DIFFICULTY_BOUNDARIES = [1.0, 2.0, 3.0, 4.0, 5.0 + 1e-9]
+
+# Tree fields the facet counts depend on
+FACET_FIELDS = ("tree_type", "features", "difficulty", "location")
+
+# Facet counts per quantized region and filter combination
+facet_cache = TTLCache("tree_facets", settings.FACETS_CACHE_TTL_SECONDS, settings.CACHE_MAX_ENTRIES)
+
+def _quantize(value: float) -> float:
+    step = settings.FACETS_GRID_DEGREES
+    return round(round(value / step) * step, 6)
+
+def _within_radius(lat: float, lon: float, radius_km: float) -> Dict[str, Any]:
+    """Match trees within radius_km of a point, by comparing the cosine of the central angle"""
+    lat_radians = math.radians(lat)
+    tree_lat = {"$degreesToRadians": "$location.latitude"}
+    cos_angle = {"$add": [
+        {"$multiply": [math.sin(lat_radians), {"$sin": tree_lat}]},
+        {"$multiply": [
+            math.cos(lat_radians),
+            {"$cos": tree_lat},
+            {"$cos": {"$degreesToRadians": {"$subtract": ["$location.longitude", lon]}}}
+        ]}
+    ]}
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    return {
+        # Cheap latitude band first, then the exact great-circle test
+        "location.latitude": {"$gte": lat - lat_delta, "$lte": lat + lat_delta},
+        "$expr": {"$gte": [cos_angle, math.cos(min(math.pi, radius_km / EARTH_RADIUS_KM))]},
+    }
+
+def _filters(
+    lat: Optional[float],
+    lon: Optional[float],
+    radius: Optional[float],
+    tree_type: Optional[str],
+    difficulty_min: Optional[float],
+    difficulty_max: Optional[float]
+) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """Location, tree type and difficulty filters, kept apart so facets can drop their own"""
+    base: Dict[str, Any] = {}
+    if lat is not None and lon is not None and radius is not None:
+        base = _within_radius(lat, lon, radius)
+    
+    type_filter: Dict[str, Any] = {}
+    if tree_type:
+        type_filter = {"$expr": {"$eq": [{"$toLower": "$tree_type"}, tree_type.lower()]}}
+    difficulty_filter: Dict[str, Any] = {}
+    if difficulty_min is not None or difficulty_max is not None:
+        difficulty_filter = {"difficulty": {}}
+        if difficulty_min is not None:
+            difficulty_filter["difficulty"]["$gte"] = difficulty_min
+        if difficulty_max is not None:
+            difficulty_filter["difficulty"]["$lte"] = difficulty_max
+    return base, type_filter, difficulty_filter
+
+def search_filter(
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    radius: Optional[float] = None,
+    tree_type: Optional[str] = None,
+    difficulty_min: Optional[float] = None,
+    difficulty_max: Optional[float] = None
+) -> Dict[str, Any]:
+    """Query for the trees /trees/search scores, the same set the facet total counts"""
+    clauses = [clause for clause in _filters(lat, lon, radius, tree_type, difficulty_min, difficulty_max) if clause]
+    return {"$and": clauses} if clauses else {}
+
+def _pipeline(
+    lat: Optional[float],
+    lon: Optional[float],
+    radius: Optional[float],
+    tree_type: Optional[str],
+    difficulty_min: Optional[float],
+    difficulty_max: Optional[float]
+) -> List[Dict[str, Any]]:
+    """One $facet aggregation; each facet applies every filter except its own"""
+    base, type_filter, difficulty_filter = _filters(lat, lon, radius, tree_type, difficulty_min, difficulty_max)
+    
+    return [
+        {"$match": base},
+        {"$project": {"tree_type": 1, "features": 1, "difficulty": 1}},
+        {"$facet": {
+            "total": [
+                {"$match": {**type_filter, **difficulty_filter}},
+                {"$count": "count"},
+            ],
+            "tree_types": [
+                {"$match": difficulty_filter},
+                {"$group": {"_id": {"$toLower": "$tree_type"}, "value": {"$first": "$tree_type"}, "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+                {"$limit": settings.FACETS_MAX_VALUES},
+            ],
+            "features": [
+                {"$match": {**type_filter, **difficulty_filter}},
+                {"$unwind": "$features"},
+                {"$group": {"_id": "$features", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+                {"$limit": settings.FACETS_MAX_VALUES},
+            ],
+            "difficulty": [
+                {"$match": type_filter},
+                {"$bucket": {
+                    "groupBy": "$difficulty",
+                    "boundaries": DIFFICULTY_BOUNDARIES,
+                    "default": "other",
+                    "output": {"count": {"$sum": 1}}
+                }},
+            ],
+        }},
+    ]
+
+async def tree_facets(
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    radius: Optional[float] = None,
+    tree_type: Optional[str] = None,
+    difficulty_min: Optional[float] = None,
+    difficulty_max: Optional[float] = None
+) -> Dict[str, Any]:
+    """Counts per tree type, feature and difficulty band for trees matching the search filters
+    
+    Locations are snapped to a FACETS_GRID_DEGREES grid so nearby users share
+    cached results. Concurrent requests for the same cell and filters on a
+    cache miss share one aggregation.
+    """
+    if lat is not None and lon is not None:
+        lat, lon = _quantize(lat), _quantize(lon)
+    else:
+        lat = lon = radius = None
+    key = (lat, lon, radius, tree_type.lower() if tree_type else None, difficulty_min, difficulty_max)
+    cached = facet_cache.get(key)
+    if cached is not None:
+        return cached
+    return await _load_facets(key)
+
+@single_flight("tree_facets", key=lambda key: key)
+async def _load_facets(key: Tuple) -> Dict[str, Any]:
+    """Run the facet aggregation for a quantized cache key and cache the result"""
+    lat, lon, radius, tree_type, difficulty_min, difficulty_max = key
+    collection = Tree.get_motor_collection().with_options(read_preference=heavy_read_preference())
+    cursor = collection.aggregate(
+        _pipeline(lat, lon, radius, tree_type, difficulty_min, difficulty_max),
+        maxTimeMS=settings.MONGODB_MAX_TIME_MS
+    )
+    facets = (await cursor.to_list(1))[0]
+    
+    bands = {bucket["_id"]: bucket["count"] for bucket in facets["difficulty"]}
+    result = {
+        "total": facets["total"][0]["count"] if facets["total"] else 0,
+        "tree_types": [{"value": group["value"], "count": group["count"]} for group in facets["tree_types"]],
+        "features": [{"value": group["_id"], "count": group["count"]} for group in facets["features"]],
+        "difficulty": [
+            {"min": low, "max": min(high, 5.0), "count": bands.get(low, 0)}
+            for low, high in zip(DIFFICULTY_BOUNDARIES, DIFFICULTY_BOUNDARIES[1:])
+        ],
+        "region": {"lat": lat, "lon": lon, "radius": radius},
+    }
+    facet_cache.set(key, result)
+    return result
+
+async def on_tree_change(change: Mapping[str, Any]):
+    """Drop cached counts when trees are added, removed or change a faceted field"""
+    updated_fields = (change.get("updateDescription") or {}).get("updatedFields")
+    if updated_fields is not None and not any(key.split(".")[0] in FACET_FIELDS for key in updated_fields):
+        return
+    facet_cache.clear()
+
+register_change_handler(Tree.Settings.name, on_tree_change)
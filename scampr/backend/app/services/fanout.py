@@ -0,0 +1,93 @@
+# app/services/fanout.py
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+from pymongo import ReturnDocument
+from ..core.config import settings
+from ..core.cache import invalidate
+from ..core.tasks import task_queue
+from ..models.user import User
+from ..models.tree import Tree
+from ..models.review import Review
+
+logger = logging.getLogger(__name__)
+
+def _stale_copies(user_id: str, version: int) -> Dict[str, Any]:
+    """Filter for user_name copies older than the given rename version"""
+    # $not/$gte also matches documents written before user_name_version existed
+    return {"user_id": user_id, "user_name_version": {"$not": {"$gte": version}}}
+
+async def _fan_out_collection(collection, user_id: str, user_name: str, version: int) -> int:
+    """Rewrite stale user_name copies in one collection, one chunk at a time"""
+    updated = 0
+    while True:
+        cursor = collection.find(_stale_copies(user_id, version), {"_id": 1}).limit(settings.FANOUT_BATCH_SIZE)
+        ids = [doc["_id"] async for doc in cursor]
+        if not ids:
+            return updated
+        
+        # Re-check the version in the write so a newer rename that raced us wins
+        query = _stale_copies(user_id, version)
+        query["_id"] = {"$in": ids}
+        result = await collection.update_many(
+            query,
+            {"$set": {"user_name": user_name, "user_name_version": version}}
+        )
+        updated += result.modified_count
+        
+        if len(ids) < settings.FANOUT_BATCH_SIZE:
+            return updated
+        # Throttle between chunks so a prolific user doesn't saturate the primary
+        await asyncio.sleep(settings.FANOUT_BATCH_DELAY_SECONDS)
+
+async def _fan_out_recent_reviews(user_id: str, user_name: str, version: int) -> int:
+    """Rewrite stale user_name copies in the reviews embedded in trees"""
+    stale = {"user_id": user_id, "user_name_version": {"$not": {"$gte": version}}}
+    result = await Tree.get_motor_collection().update_many(
+        {"recent_reviews": {"$elemMatch": stale}},
+        {"$set": {
+            "recent_reviews.$[review].user_name": user_name,
+            "recent_reviews.$[review].user_name_version": version
+        }},
+        array_filters=[{f"review.{field}": condition for field, condition in stale.items()}]
+    )
+    return result.modified_count
+
+async def fan_out_user_name(user_id: str, user_name: str, version: int):
+    """Propagate a display name change to the trees and reviews that copy it"""
+    for model in (Tree, Review):
+        updated = await _fan_out_collection(model.get_motor_collection(), user_id, user_name, version)
+        logger.info(f"user_name fan-out for user {user_id} (v{version}) updated {updated} {model.Settings.name}")
+    updated = await _fan_out_recent_reviews(user_id, user_name, version)
+    logger.info(f"user_name fan-out for user {user_id} (v{version}) updated recent reviews of {updated} trees")
+
+def schedule_user_name_fan_out(user: User):
+    """Queue a background fan-out of the user's current display name"""
+    # Coalesced per user: a rename while one is queued just updates the queued name
+    task_queue.enqueue(
+        f"user-name-fan-out:{user.id}",
+        fan_out_user_name,
+        str(user.id), user.display_name, user.display_name_version
+    )
+
+async def rename_user(user: User, display_name: str, **extra_fields) -> Optional[User]:
+    """Atomically change a user's display name and fan it out to denormalized copies
+    
+    Returns None if the user was deleted in the meantime.
+    """
+    updated = await User.get_motor_collection().find_one_and_update(
+        {"_id": user.id},
+        {"$set": {"display_name": display_name, **extra_fields}, "$inc": {"display_name_version": 1}},
+        projection={"display_name_version": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated is None:
+        return None
+    user.display_name = display_name
+    user.display_name_version = updated["display_name_version"]
+    for field, value in extra_fields.items():
+        setattr(user, field, value)
+    invalidate(User.Settings.name, str(user.id))
+    
+    schedule_user_name_fan_out(user)
+    return user
@@ -0,0 +1,41 @@
+# app/services/image_variants.py
+# Runs in worker processes: keep imports to the standard library and Pillow
+import os
+from typing import Dict, Tuple
+from PIL import Image, ImageOps
+
+# Longest edge of each rendition, in pixels
+VARIANT_SIZES = {
+    "thumb": 320,
+    "medium": 1024,
+    "full": 2048,
+}
+JPEG_QUALITY = 85
+
+def render_variants(source_path: str, output_dir: str, max_pixels: int) -> Dict[str, Tuple[str, int, int]]:
+    """Decode an upload and write a JPEG per variant, returning variant -> (path, width, height)
+    
+    Raises ValueError if the file isn't an image Pillow can decode or has
+    more than max_pixels pixels.
+    """
+    # Pillow only raises DecompressionBombError past twice this, so the size is also checked below
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        with Image.open(source_path) as image:
+            # Image.open only reads the header; reject before decoding the pixel data
+            if image.width * image.height > max_pixels:
+                raise ValueError(f"Image is {image.width}x{image.height}, more than {max_pixels} pixels")
+            image.load()
+            # Apply the camera's rotation so thumbnails aren't sideways
+            image = ImageOps.exif_transpose(image).convert("RGB")
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Not a supported image: {e}")
+    
+    variants = {}
+    for name, longest_edge in VARIANT_SIZES.items():
+        variant = image.copy()
+        variant.thumbnail((longest_edge, longest_edge), Image.LANCZOS)
+        path = os.path.join(output_dir, f"{name}.jpg")
+        variant.save(path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        variants[name] = (path, variant.width, variant.height)
+    return variants
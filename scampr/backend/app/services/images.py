@@ -0,0 +1,104 @@
+# app/services/images.py
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+from fastapi import UploadFile
+from pymongo.errors import DuplicateKeyError
+from ..core.config import settings
+from ..core.storage import image_storage
+from ..models.image import StoredImage, ImageVariant
+from .image_variants import render_variants
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_CONTENT_TYPES = {"image/jpeg", "image/png", "image/webp"}
+
+# Upload endpoints, whose bodies are capped by BodySizeLimitMiddleware before they are read
+UPLOAD_PATH_PATTERN = rf"^{re.escape(settings.API_V1_PREFIX)}/(images|trees/[^/]+/images)/?$"
+MULTIPART_OVERHEAD_BYTES = 16 * 1024  # Boundaries and part headers around the file itself
+
+class UploadTooLarge(Exception):
+    pass
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def _process_pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Spawned rather than forked: the parent has a running event loop and driver threads
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+def shutdown_image_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def _spool_upload(upload: UploadFile, directory: str) -> Tuple[str, str, int]:
+    """Copy an upload to disk chunk by chunk, hashing as it goes
+    
+    Returns (path, sha256 hex digest, size). Only one chunk is held in memory.
+    The request body was already capped by BodySizeLimitMiddleware; this
+    enforces the exact limit on the file itself.
+    """
+    path = os.path.join(directory, "upload")
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "wb") as out:
+        while chunk := await upload.read(settings.IMAGE_UPLOAD_CHUNK_BYTES):
+            size += len(chunk)
+            if size > settings.IMAGE_MAX_UPLOAD_BYTES:
+                raise UploadTooLarge()
+            digest.update(chunk)
+            await asyncio.to_thread(out.write, chunk)
+    return path, digest.hexdigest(), size
+
+async def store_image(upload: UploadFile, user_id: str) -> StoredImage:
+    """Store an uploaded image and its resized variants, reusing an identical earlier upload
+    
+    Raises UploadTooLarge, or ValueError for content that isn't a supported image.
+    """
+    if upload.content_type not in ALLOWED_CONTENT_TYPES:
+        raise ValueError(f"Unsupported content type {upload.content_type}")
+    
+    directory = await asyncio.to_thread(tempfile.mkdtemp, prefix="scampr-upload-")
+    try:
+        path, content_hash, size = await _spool_upload(upload, directory)
+        
+        existing = await StoredImage.find_one(StoredImage.content_hash == content_hash)
+        if existing is not None:
+            return existing
+        
+        # Decoding and resizing are CPU-bound; run them in another process
+        loop = asyncio.get_running_loop()
+        rendered = await loop.run_in_executor(
+            _process_pool(), render_variants, path, directory, settings.IMAGE_MAX_PIXELS
+        )
+        
+        variants = {}
+        for name, (variant_path, width, height) in rendered.items():
+            key = f"images/{content_hash[:2]}/{content_hash}/{name}.jpg"
+            await image_storage.put_file(key, variant_path, "image/jpeg")
+            variants[name] = ImageVariant(url=image_storage.url(key), width=width, height=height)
+        
+        image = StoredImage(content_hash=content_hash, variants=variants, size_bytes=size, uploaded_by=user_id)
+        try:
+            await image.insert()
+        except DuplicateKeyError:
+            # The same image was uploaded concurrently; both wrote identical files
+            image = await StoredImage.find_one(StoredImage.content_hash == content_hash)
+        logger.info(f"Stored image {content_hash} ({size} bytes)")
+        return image
+    finally:
+        await asyncio.to_thread(shutil.rmtree, directory, True)
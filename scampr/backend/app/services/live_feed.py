@@ -0,0 +1,78 @@
+# app/services/live_feed.py
+from typing import Any, Dict, List, Mapping
+from beanie import PydanticObjectId
+from ..core.cache import TTLCache
+from ..core.change_streams import register_change_handler
+from ..core.config import settings
+from ..core.pubsub import PubSubHub
+from ..models.tree import Tree
+from ..models.review import Review
+
+# Subscribers of this worker; every worker gets every event through the change stream
+hub = PubSubHub(queue_size=settings.LIVE_QUEUE_SIZE, max_subscribers=settings.LIVE_MAX_SUBSCRIBERS)
+
+# A tree's geo_regions never change, so region lookups for review events cache well
+_tree_regions = TTLCache("live_tree_regions", settings.LIVE_TREE_REGION_TTL_SECONDS, settings.CACHE_MAX_ENTRIES)
+
+def tree_topic(tree_id: str) -> str:
+    return f"tree:{tree_id}"
+
+def area_topic(region: str) -> str:
+    return f"area:{region}"
+
+async def _regions_of_tree(tree_id: str) -> List[str]:
+    regions = _tree_regions.get(tree_id)
+    if regions is None:
+        doc = await Tree.get_motor_collection().find_one({"_id": PydanticObjectId(tree_id)}, {"geo_regions": 1})
+        regions = (doc or {}).get("geo_regions", [])
+        _tree_regions.set(tree_id, regions)
+    return regions
+
+async def on_tree_change(change: Mapping[str, Any]):
+    """Announce new trees to subscribers of the areas they are in"""
+    if change["operationType"] != "insert":
+        return
+    tree = change["fullDocument"]
+    tree_id = str(change["documentKey"]["_id"])
+    regions = tree.get("geo_regions", [])
+    _tree_regions.set(tree_id, regions)
+    
+    event: Dict[str, Any] = {
+        "type": "tree_created",
+        "tree": {
+            "id": tree_id,
+            "name": tree.get("name"),
+            "tree_type": tree.get("tree_type"),
+            "difficulty": tree.get("difficulty"),
+            "location": tree.get("location"),
+            "user_name": tree.get("user_name"),
+            "created_at": tree.get("created_at"),
+        }
+    }
+    hub.publish([area_topic(region) for region in regions], event)
+
+async def on_review_change(change: Mapping[str, Any]):
+    """Announce new reviews to subscribers of the tree and of its areas"""
+    if change["operationType"] != "insert":
+        return
+    review = change["fullDocument"]
+    tree_id = review["tree_id"]
+    topics = [tree_topic(tree_id)]
+    topics.extend(area_topic(region) for region in await _regions_of_tree(tree_id))
+    
+    event: Dict[str, Any] = {
+        "type": "review_created",
+        "review": {
+            "id": str(change["documentKey"]["_id"]),
+            "tree_id": tree_id,
+            "user_id": review.get("user_id"),
+            "user_name": review.get("user_name"),
+            "rating": review.get("rating"),
+            "comment": review.get("comment"),
+            "created_at": review.get("created_at"),
+        }
+    }
+    hub.publish(topics, event)
+
+register_change_handler(Tree.Settings.name, on_tree_change)
+register_change_handler(Review.Settings.name, on_review_change)
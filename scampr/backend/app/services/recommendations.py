@@ -0,0 +1,344 @@
+# app/services/recommendations.py
+import asyncio
+import heapq
+import logging
+import math
+import os
+import socket
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from ..core.config import settings
+from ..core.geo import calculate_distance
+from ..models.tree import Tree
+from ..models.review import Review
+from ..models.job_state import JobState
+from ..models.tree_similarity import TreeSimilarity
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "similar-trees"
+
+# How much each signal contributes to the similarity of two trees
+CO_REVIEW_WEIGHT = 0.6
+FEATURE_WEIGHT = 0.25
+PROXIMITY_WEIGHT = 0.15
+
+_LEASE_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+TREE_FIELDS = {"name": 1, "tree_type": 1, "features": 1, "location": 1, "average_rating": 1, "climb_count": 1}
+BOXES_PER_QUERY = 100  # Cell ranges per $or when loading the trees around a set of locations
+
+GridCell = Tuple[int, int]
+
+def _grid_cell(location: Dict[str, float]) -> GridCell:
+    """Bucket a location into a square cell about SIMILARITY_PROXIMITY_KM across"""
+    cell_degrees = settings.SIMILARITY_PROXIMITY_KM / 111.0
+    return (math.floor(location["latitude"] / cell_degrees), math.floor(location["longitude"] / cell_degrees))
+
+def _build_grid(trees: Dict[str, dict]) -> Dict[GridCell, List[str]]:
+    grid: Dict[GridCell, List[str]] = defaultdict(list)
+    for tree_id, tree in trees.items():
+        grid[_grid_cell(tree["location"])].append(tree_id)
+    return grid
+
+def _nearby(grid: Dict[GridCell, List[str]], location: Dict[str, float]) -> Iterable[str]:
+    """Trees in the cell containing the location and the eight around it"""
+    row, col = _grid_cell(location)
+    for d_row in (-1, 0, 1):
+        for d_col in (-1, 0, 1):
+            yield from grid.get((row + d_row, col + d_col), ())
+
+def _feature_similarity(tree: dict, other: dict) -> float:
+    """Jaccard overlap of the feature tags, with a bonus for the same tree type"""
+    features = set(tree.get("features") or [])
+    other_features = set(other.get("features") or [])
+    union = features | other_features
+    jaccard = len(features & other_features) / len(union) if union else 0.0
+    same_type = tree.get("tree_type", "").lower() == other.get("tree_type", "").lower()
+    return 0.7 * jaccard + (0.3 if same_type else 0.0)
+
+def _proximity(tree: dict, other: dict) -> float:
+    distance = calculate_distance(
+        tree["location"]["latitude"], tree["location"]["longitude"],
+        other["location"]["latitude"], other["location"]["longitude"]
+    )
+    return math.exp(-distance / settings.SIMILARITY_PROXIMITY_KM)
+
+def compute_neighbors(
+    tree_ids: Iterable[str],
+    trees: Dict[str, dict],
+    trees_by_user: Dict[str, Set[str]],
+    users_by_tree: Dict[str, Set[str]],
+    limit: int
+) -> Dict[str, List[dict]]:
+    """Score co-reviewed and nearby candidates for each tree and keep the top N
+    
+    users_by_tree must hold every reviewer of each tree in tree_ids, and
+    trees_by_user every tree those reviewers reviewed.
+    """
+    grid = _build_grid(trees)
+    result = {}
+    for tree_id in tree_ids:
+        tree = trees.get(tree_id)
+        if tree is None:
+            continue
+        reviewers = users_by_tree.get(tree_id, set())
+        
+        co_reviews: Counter = Counter()
+        for user_id in reviewers:
+            for other_id in trees_by_user.get(user_id, ()):
+                if other_id != tree_id:
+                    co_reviews[other_id] += 1
+        
+        candidates = set(co_reviews)
+        candidates.update(_nearby(grid, tree["location"]))
+        candidates.discard(tree_id)
+        
+        scored = []
+        for other_id in candidates:
+            other = trees.get(other_id)
+            if other is None:
+                continue
+            co_review_score = 0.0
+            if co_reviews[other_id]:
+                # Cosine similarity of the two trees' reviewer sets
+                other_reviewers = max(other.get("climb_count", 0), co_reviews[other_id])
+                co_review_score = co_reviews[other_id] / math.sqrt(len(reviewers) * other_reviewers)
+            score = (
+                CO_REVIEW_WEIGHT * co_review_score
+                + FEATURE_WEIGHT * _feature_similarity(tree, other)
+                + PROXIMITY_WEIGHT * _proximity(tree, other)
+            )
+            scored.append((score, other_id))
+        
+        result[tree_id] = [
+            {
+                "tree_id": other_id,
+                "score": round(score, 4),
+                "name": trees[other_id].get("name", ""),
+                "tree_type": trees[other_id].get("tree_type", ""),
+                "average_rating": trees[other_id].get("average_rating", 0.0),
+            }
+            for score, other_id in heapq.nlargest(limit, scored)
+        ]
+    return result
+
+def _cell_ranges(cells: Iterable[GridCell]) -> List[Dict[str, Any]]:
+    """Latitude/longitude range filters covering the cells, one per run of adjacent cells in a row"""
+    cell_degrees = settings.SIMILARITY_PROXIMITY_KM / 111.0
+    columns_by_row: Dict[int, List[int]] = defaultdict(list)
+    for row, col in cells:
+        columns_by_row[row].append(col)
+    
+    ranges = []
+    for row, columns in columns_by_row.items():
+        columns.sort()
+        start = end = columns[0]
+        for col in columns[1:] + [None]:
+            if col == end + 1:
+                end = col
+                continue
+            ranges.append({
+                "location.latitude": {"$gte": row * cell_degrees, "$lt": (row + 1) * cell_degrees},
+                "location.longitude": {"$gte": start * cell_degrees, "$lt": (end + 1) * cell_degrees},
+            })
+            if col is not None:
+                start = end = col
+    return ranges
+
+def _object_ids(tree_ids: Iterable[str]) -> List[ObjectId]:
+    return [ObjectId(tree_id) for tree_id in tree_ids if ObjectId.is_valid(tree_id)]
+
+async def _load_trees(query: Optional[Dict[str, Any]] = None) -> Dict[str, dict]:
+    cursor = Tree.get_motor_collection().find(query or {}, TREE_FIELDS)
+    return {str(doc["_id"]): doc async for doc in cursor}
+
+async def _load_trees_near(locations: Iterable[Mapping[str, float]]) -> Dict[str, dict]:
+    """Trees in the grid cells around the locations, i.e. everything _nearby can return for them"""
+    cells = set()
+    for location in locations:
+        row, col = _grid_cell(location)
+        cells.update((row + d_row, col + d_col) for d_row in (-1, 0, 1) for d_col in (-1, 0, 1))
+    ranges = _cell_ranges(cells)
+    
+    trees: Dict[str, dict] = {}
+    for i in range(0, len(ranges), BOXES_PER_QUERY):
+        trees.update(await _load_trees({"$or": ranges[i:i + BOXES_PER_QUERY]}))
+    return trees
+
+async def _load_candidates(tree_ids: Set[str], trees_by_user: Dict[str, Set[str]]) -> Dict[str, dict]:
+    """The given trees plus every tree compute_neighbors can score them against"""
+    trees = await _load_trees({"_id": {"$in": _object_ids(tree_ids)}})
+    trees.update(await _load_trees_near([tree["location"] for tree in trees.values()]))
+    co_reviewed = set().union(*trees_by_user.values()) - set(trees)
+    if co_reviewed:
+        trees.update(await _load_trees({"_id": {"$in": _object_ids(co_reviewed)}}))
+    return trees
+
+async def _trees_by_user(user_ids: Optional[Iterable[str]] = None) -> Dict[str, Set[str]]:
+    pipeline: List[Dict[str, Any]] = []
+    if user_ids is not None:
+        pipeline.append({"$match": {"user_id": {"$in": list(user_ids)}}})
+    pipeline.append({"$group": {"_id": "$user_id", "trees": {"$addToSet": "$tree_id"}}})
+    cursor = Review.get_motor_collection().aggregate(pipeline, allowDiskUse=True)
+    return {doc["_id"]: set(doc["trees"]) async for doc in cursor}
+
+def _invert(trees_by_user: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+    users_by_tree: Dict[str, Set[str]] = defaultdict(set)
+    for user_id, tree_ids in trees_by_user.items():
+        for tree_id in tree_ids:
+            users_by_tree[tree_id].add(user_id)
+    return users_by_tree
+
+async def _affected_since(since: datetime, state: Mapping[str, Any]) -> Set[str]:
+    """Trees whose neighbour lists may have changed since the last run"""
+    reviews = Review.get_motor_collection()
+    # A review changes co-review counts between every pair of trees its author reviewed,
+    # both when it is written and when it is deleted (see record_reviews_removed)
+    reviewers = set(await reviews.distinct("user_id", {"created_at": {"$gt": since}}))
+    reviewers.update(state.get("removed_reviewers") or [])
+    affected: Set[str] = set(state.get("stale_trees") or [])
+    for tree_ids in (await _trees_by_user(reviewers)).values():
+        affected.update(tree_ids)
+    
+    # New trees can become the nearest neighbour of the trees around them
+    new_trees = await _load_trees({"created_at": {"$gt": since}})
+    affected.update(new_trees)
+    affected.update(await _load_trees_near([tree["location"] for tree in new_trees.values()]))
+    return affected
+
+async def _acquire_lease() -> Optional[dict]:
+    """Claim the job for this worker so only one worker per deployment runs it"""
+    now = datetime.utcnow()
+    try:
+        return await JobState.get_motor_collection().find_one_and_update(
+            {"name": JOB_NAME, "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+            {"$set": {
+                "lease_owner": _LEASE_OWNER,
+                "lease_until": now + timedelta(seconds=settings.SIMILARITY_LEASE_SECONDS)
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The job document exists and another worker holds an unexpired lease
+        return None
+
+async def refresh_similar_trees(full: bool = False) -> int:
+    """Rebuild neighbour lists, incrementally unless full or a full rebuild is due
+    
+    Returns the number of trees whose lists were rewritten.
+    """
+    state = await _acquire_lease()
+    if state is None:
+        return 0
+    
+    started_at = datetime.utcnow()
+    last_run_at = state.get("last_run_at")
+    last_full_run_at = state.get("last_full_run_at")
+    full = (
+        full
+        or last_run_at is None
+        or last_full_run_at is None
+        or started_at - last_full_run_at > timedelta(hours=settings.SIMILARITY_FULL_REFRESH_HOURS)
+    )
+    
+    finished: Dict[str, Any] = {}
+    # Removals recorded before this run are handled by it; ones recorded meanwhile wait for the next
+    handled = {
+        "removed_reviewers": list(state.get("removed_reviewers") or []),
+        "stale_trees": list(state.get("stale_trees") or []),
+    }
+    try:
+        if full:
+            trees = await _load_trees()
+            affected = set(trees)
+            trees_by_user = await _trees_by_user()
+        else:
+            # Only the affected trees and their candidates are loaded
+            affected = await _affected_since(last_run_at, state)
+            reviewers = await Review.get_motor_collection().distinct("user_id", {"tree_id": {"$in": list(affected)}})
+            trees_by_user = await _trees_by_user(reviewers)
+            trees = await _load_candidates(affected, trees_by_user)
+        
+        # Scoring is plain Python; keep it off the event loop
+        neighbors = await asyncio.to_thread(
+            compute_neighbors, affected, trees, trees_by_user, _invert(trees_by_user), settings.SIMILARITY_NEIGHBORS
+        )
+        
+        similarities = TreeSimilarity.get_motor_collection()
+        operations = [
+            UpdateOne({"tree_id": tree_id}, {"$set": {"neighbors": tree_neighbors, "updated_at": started_at}}, upsert=True)
+            for tree_id, tree_neighbors in neighbors.items()
+        ]
+        for i in range(0, len(operations), settings.SIMILARITY_WRITE_BATCH_SIZE):
+            await similarities.bulk_write(operations[i:i + settings.SIMILARITY_WRITE_BATCH_SIZE], ordered=False)
+        if full:
+            # Drop lists for trees that no longer exist
+            await similarities.delete_many({"updated_at": {"$lt": started_at}})
+        
+        finished["last_run_at"] = started_at
+        if full:
+            finished["last_full_run_at"] = started_at
+        logger.info(f"Similar-trees refresh ({'full' if full else 'incremental'}) rewrote {len(operations)} trees")
+        return len(operations)
+    finally:
+        # Release the lease; the watermark only moves forward, and removals are only cleared, if the run succeeded
+        update: Dict[str, Any] = {"$set": {"lease_owner": None, "lease_until": None, **finished}}
+        if finished:
+            update["$pullAll"] = handled
+        await JobState.get_motor_collection().update_one({"name": JOB_NAME, "lease_owner": _LEASE_OWNER}, update)
+
+async def record_reviews_removed(user_id: str, tree_ids: List[str]):
+    """Have the next refresh rescore trees whose co-review counts dropped
+    
+    Incremental runs find new reviews by created_at, which can't see
+    deletions, so they are recorded on the job state instead.
+    """
+    if not settings.SIMILARITY_ENABLED or not tree_ids:
+        return
+    await JobState.get_motor_collection().update_one(
+        {"name": JOB_NAME},
+        {"$addToSet": {"removed_reviewers": user_id, "stale_trees": {"$each": list(tree_ids)}}},
+        upsert=True
+    )
+
+async def remove_tree_from_similarities(tree_id: str):
+    """Forget a deleted tree, both its own list and its place in other lists"""
+    similarities = TreeSimilarity.get_motor_collection()
+    await similarities.delete_one({"tree_id": tree_id})
+    await similarities.update_many(
+        {"neighbors.tree_id": tree_id},
+        {"$pull": {"neighbors": {"tree_id": tree_id}}}
+    )
+
+async def similar_trees(tree_id: str, limit: int) -> List[dict]:
+    """Precomputed neighbours of a tree, in one indexed read"""
+    similarity = await TreeSimilarity.find_one(TreeSimilarity.tree_id == tree_id)
+    if similarity is None:
+        return []
+    return [neighbor.model_dump() for neighbor in similarity.neighbors[:limit]]
+
+async def recommended_trees(climbed_tree_ids: List[str], limit: int) -> List[dict]:
+    """Blend the neighbour lists of the trees a user climbed, skipping ones already climbed"""
+    if not climbed_tree_ids:
+        return []
+    similarities = await TreeSimilarity.find({"tree_id": {"$in": climbed_tree_ids}}).to_list()
+    
+    climbed = set(climbed_tree_ids)
+    scores: Dict[str, float] = defaultdict(float)
+    details: Dict[str, dict] = {}
+    for similarity in similarities:
+        for neighbor in similarity.neighbors:
+            if neighbor.tree_id in climbed:
+                continue
+            # Summing rewards trees that are close to several of the user's climbs
+            scores[neighbor.tree_id] += neighbor.score
+            details[neighbor.tree_id] = neighbor.model_dump()
+    
+    top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+    return [{**details[tree_id], "score": round(score, 4)} for tree_id, score in top]
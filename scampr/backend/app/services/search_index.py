@@ -0,0 +1,321 @@
+# app/services/search_index.py
+import heapq
+import logging
+import re
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+from beanie import PydanticObjectId
+from sortedcontainers import SortedList
+from ..core.change_streams import register_change_handler
+from ..core.config import settings
+from ..core.geo import calculate_distance
+from ..core.health import startup_state
+from ..models.tree import Tree
+
+logger = logging.getLogger(__name__)
+
+# Tree fields whose words are searchable
+INDEXED_FIELDS = ("name", "tree_type", "features")
+# Fields that change suggestion ranking as well
+SUGGESTION_FIELDS = INDEXED_FIELDS + ("climb_count", "average_rating", "location")
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+def words(text: str) -> List[str]:
+    """Lowercase alphanumeric words; feature tags like "thick_branches" split into two"""
+    return [word for word in _NON_WORD.split(text.lower()) if word]
+
+def trigrams(word: str) -> Set[str]:
+    """Trigrams of a word padded like pg_trgm, so short words and word starts still match"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def tree_words(tree: Mapping[str, Any]) -> Set[str]:
+    result = set(words(tree.get("name") or ""))
+    result.update(words(tree.get("tree_type") or ""))
+    for feature in tree.get("features") or []:
+        result.update(words(feature))
+    return result
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Edits (insert, delete, substitute, swap adjacent letters) turning a into b, or limit + 1 past limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+def allowed_edits(word: str, max_edits: int) -> int:
+    """Typos tolerated in a query word: up to max_edits, fewer for one- and two-letter words"""
+    return min(max_edits, len(word) * 2 // 3)
+
+class TrigramIndex:
+    """Fuzzy word matching at index-lookup cost
+    
+    Every distinct word of the indexed trees is posted under its trigrams.
+    A query word's candidates are the words sharing a trigram with it (with
+    the padding, usually the same first letter), and a candidate matches if
+    it is within a few edits, so a typo costs a few set lookups and short
+    edit distances instead of one per tree. Trigram similarity alone can't
+    tell "oke" is "oak": three-letter words share too few trigrams.
+    """
+    
+    def __init__(self):
+        self._postings: Dict[str, Set[str]] = defaultdict(set)  # trigram -> words
+        self._word_trigrams: Dict[str, Set[str]] = {}
+        self._trees_by_word: Dict[str, Set[str]] = defaultdict(set)
+        self._words_by_tree: Dict[str, Set[str]] = {}
+    
+    def __len__(self) -> int:
+        return len(self._words_by_tree)
+    
+    def add(self, tree_id: str, tree_words: Iterable[str]):
+        """Index a tree's words, replacing what was indexed for it before"""
+        self.remove(tree_id)
+        tree_words = set(tree_words)
+        self._words_by_tree[tree_id] = tree_words
+        for word in tree_words:
+            if word not in self._word_trigrams:
+                self._word_trigrams[word] = trigrams(word)
+                for trigram in self._word_trigrams[word]:
+                    self._postings[trigram].add(word)
+            self._trees_by_word[word].add(tree_id)
+    
+    def remove(self, tree_id: str):
+        for word in self._words_by_tree.pop(tree_id, ()):
+            trees = self._trees_by_word[word]
+            trees.discard(tree_id)
+            if not trees:
+                # Last tree using the word: drop it from the vocabulary
+                del self._trees_by_word[word]
+                for trigram in self._word_trigrams.pop(word):
+                    self._postings[trigram].discard(word)
+                    if not self._postings[trigram]:
+                        del self._postings[trigram]
+    
+    def similar_words(self, word: str, max_edits: int) -> Dict[str, float]:
+        """Indexed words within the word's allowed edits, scored 1 for an exact match down towards 0"""
+        limit = allowed_edits(word, max_edits)
+        candidates: Set[str] = set()
+        for trigram in trigrams(word):
+            candidates.update(self._postings.get(trigram, ()))
+        result = {}
+        for candidate in candidates:
+            distance = edit_distance(word, candidate, limit)
+            if distance <= limit:
+                result[candidate] = 1.0 - distance / max(len(word), len(candidate))
+        return result
+    
+    def search(self, query: str, max_edits: int) -> Dict[str, float]:
+        """Trees matching the query, scored 0-1 by the average best match of each query word"""
+        query_words = words(query)
+        if not query_words:
+            return {}
+        scores: Dict[str, float] = defaultdict(float)
+        for word in query_words:
+            best: Dict[str, float] = {}
+            for candidate, similarity in self.similar_words(word, max_edits).items():
+                for tree_id in self._trees_by_word[candidate]:
+                    if similarity > best.get(tree_id, 0.0):
+                        best[tree_id] = similarity
+            for tree_id, similarity in best.items():
+                scores[tree_id] += similarity / len(query_words)
+        return dict(scores)
+
+_SUGGESTION_RESPONSE_FIELDS = ("text", "kind", "tree_id", "count")
+
+def popularity(tree: Mapping[str, Any]) -> float:
+    """Ranking weight of a tree's suggestions: climbs, nudged up by rating"""
+    return (1 + tree.get("climb_count", 0)) * (1 + tree.get("average_rating", 0.0) / 5)
+
+class SuggestionIndex:
+    """Prefix completions over tree names, tree types and feature tags
+    
+    Completion keys live in one sorted list, so a prefix is a contiguous
+    range and adding or removing a key is O(log n). Names are keyed from
+    every word, letting "oak" complete "The Old Oak". Types and features
+    are aggregated over trees and weighted by the summed popularity of the
+    trees using them. Every review changes a tree's popularity, so when
+    only ranking fields changed the weights are updated in place.
+    """
+    
+    def __init__(self):
+        self._keys: SortedList = SortedList()  # (normalized text, entry id)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._trees: Dict[str, Tuple[List[str], float]] = {}  # tree_id -> (aggregate entry ids, weight)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _insert_keys(self, entry_id: str, text: str):
+        tokens = words(text)
+        for i in range(len(tokens)):
+            self._keys.add((" ".join(tokens[i:]), entry_id))
+    
+    def _remove_keys(self, entry_id: str, text: str):
+        tokens = words(text)
+        for i in range(len(tokens)):
+            self._keys.discard((" ".join(tokens[i:]), entry_id))
+    
+    @staticmethod
+    def _labels(tree: Mapping[str, Any]) -> Dict[str, Tuple[str, str]]:
+        """Aggregate entry id -> (kind, label) for a tree's type and features"""
+        labels = [("tree_type", tree.get("tree_type") or "")]
+        labels.extend(("feature", feature) for feature in tree.get("features") or [])
+        result = {}
+        for kind, label in labels:
+            normalized = " ".join(words(label))
+            if normalized:
+                result.setdefault(f"{kind}:{normalized}", (kind, label))
+        return result
+    
+    def add(self, tree_id: str, tree: Mapping[str, Any]):
+        """Index a tree's name, type and features, replacing what was indexed for it before"""
+        name = tree.get("name") or ""
+        location = tree.get("location") or {}
+        weight = popularity(tree)
+        labels = self._labels(tree)
+        
+        indexed = self._trees.get(tree_id)
+        if indexed is not None and self._entries[f"tree:{tree_id}"]["text"] == name and set(indexed[0]) == set(labels):
+            self._reweight(tree_id, weight, location)
+            return
+        
+        self.remove(tree_id)
+        self._entries[f"tree:{tree_id}"] = {
+            "text": name,
+            "kind": "tree",
+            "tree_id": tree_id,
+            "weight": weight,
+            "location": (location.get("latitude"), location.get("longitude")) if location else None,
+        }
+        self._insert_keys(f"tree:{tree_id}", name)
+        
+        for entry_id, (kind, label) in labels.items():
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                entry = self._entries[entry_id] = {"text": label, "kind": kind, "weight": 0.0, "count": 0}
+                self._insert_keys(entry_id, label)
+            entry["weight"] += weight
+            entry["count"] += 1
+        self._trees[tree_id] = (list(labels), weight)
+    
+    def _reweight(self, tree_id: str, weight: float, location: Mapping[str, Any]):
+        """Apply a new popularity and location to an indexed tree without touching its keys"""
+        aggregates, old_weight = self._trees[tree_id]
+        entry = self._entries[f"tree:{tree_id}"]
+        entry["weight"] = weight
+        entry["location"] = (location.get("latitude"), location.get("longitude")) if location else None
+        for entry_id in aggregates:
+            self._entries[entry_id]["weight"] += weight - old_weight
+        self._trees[tree_id] = (aggregates, weight)
+    
+    def remove(self, tree_id: str):
+        indexed = self._trees.pop(tree_id, None)
+        if indexed is None:
+            return
+        aggregates, weight = indexed
+        entry = self._entries.pop(f"tree:{tree_id}")
+        self._remove_keys(f"tree:{tree_id}", entry["text"])
+        for entry_id in aggregates:
+            entry = self._entries[entry_id]
+            entry["weight"] -= weight
+            entry["count"] -= 1
+            if entry["count"] == 0:
+                del self._entries[entry_id]
+                self._remove_keys(entry_id, entry["text"])
+    
+    def suggest(
+        self,
+        prefix: str,
+        limit: int,
+        lat: Optional[float] = None,
+        lon: Optional[float] = None,
+        bias_km: float = 10.0
+    ) -> List[Dict[str, Any]]:
+        """Top completions of prefix by weight; with lat/lon, trees nearby rank higher"""
+        normalized = " ".join(words(prefix))
+        if not normalized:
+            return []
+        scored = {}
+        for _, entry_id in self._keys.irange((normalized,), (normalized + "\uffff",), inclusive=(True, False)):
+            if entry_id in scored:
+                continue
+            entry = self._entries[entry_id]
+            score = entry["weight"]
+            if lat is not None and lon is not None and entry.get("location"):
+                distance = calculate_distance(lat, lon, *entry["location"])
+                score /= 1 + distance / bias_km
+            scored[entry_id] = score
+        
+        return [
+            {field: value for field, value in self._entries[entry_id].items() if field in _SUGGESTION_RESPONSE_FIELDS}
+            for entry_id, _ in heapq.nlargest(limit, scored.items(), key=lambda item: item[1])
+        ]
+
+# This worker's indexes, kept in step with the trees collection by change events
+trigram_index = TrigramIndex()
+suggestion_index = SuggestionIndex()
+
+_PROJECTION = {field: 1 for field in SUGGESTION_FIELDS}
+
+def fuzzy_match(query: str) -> Dict[str, float]:
+    """Tree ids matching the query despite typos, with scores"""
+    return trigram_index.search(query, settings.SEARCH_FUZZY_MAX_EDITS)
+
+def suggest(prefix: str, limit: int, lat: Optional[float] = None, lon: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Autocomplete suggestions for a search box prefix"""
+    if len(prefix.strip()) < settings.SUGGEST_MIN_PREFIX_LENGTH:
+        # One letter matches a large slice of the index; wait for another keystroke
+        return []
+    return suggestion_index.suggest(prefix, limit, lat, lon, settings.SUGGEST_LOCATION_BIAS_KM)
+
+def _index_tree(tree_id: str, doc: Mapping[str, Any]):
+    trigram_index.add(tree_id, tree_words(doc))
+    suggestion_index.add(tree_id, doc)
+
+def _remove_tree(tree_id: str):
+    trigram_index.remove(tree_id)
+    suggestion_index.remove(tree_id)
+
+async def build_search_index():
+    """Index every tree; runs as a startup warmup"""
+    async for doc in Tree.get_motor_collection().find({}, _PROJECTION):
+        _index_tree(str(doc["_id"]), doc)
+    logger.info(f"Search indexes built over {len(trigram_index)} trees")
+
+async def on_tree_change(change: Mapping[str, Any]):
+    """Re-index trees whose searchable or ranking fields changed"""
+    operation = change["operationType"]
+    tree_id = change["documentKey"]["_id"]
+    if operation == "delete":
+        _remove_tree(str(tree_id))
+        return
+    if operation not in ("insert", "update", "replace"):
+        return
+    
+    updated_fields = (change.get("updateDescription") or {}).get("updatedFields")
+    if updated_fields is not None and not any(key.split(".")[0] in SUGGESTION_FIELDS for key in updated_fields):
+        # Versions, trending scores and denormalized names don't affect search
+        return
+    
+    doc = change.get("fullDocument")
+    if doc is None:
+        doc = await Tree.get_motor_collection().find_one({"_id": PydanticObjectId(tree_id)}, _PROJECTION)
+    if doc is None:
+        _remove_tree(str(tree_id))
+    else:
+        _index_tree(str(tree_id), doc)
+
+startup_state.register_warmup("search_index", build_search_index)
+register_change_handler(Tree.Settings.name, on_tree_change)
@@ -0,0 +1,391 @@
+# app/services/sync.py
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from beanie import PydanticObjectId
+from bson.errors import InvalidId
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from ..core.change_streams import publish_local
+from ..core.config import settings
+from ..core.geo import geo_regions
+from ..core.tasks import task_queue
+from ..core.versioning import version_filter
+from ..models.user import User
+from ..models.tree import Tree
+from ..models.review import Review
+from ..models.sync_operation import SyncOperation, PENDING, DONE
+from ..models.user_tree import ADDED
+from .recommendations import record_reviews_removed
+from .tree_stats import refresh_tree_stats, record_review_created, record_review_updated, record_review_deleted
+from .trending import activity_weight, apply_trending_weights
+from .user_trees import add_user_tree, sync_climbed_tree
+
+logger = logging.getLogger(__name__)
+
+CREATE_TREE = "create_tree"
+CREATE_REVIEW = "create_review"
+UPDATE_REVIEW = "update_review"
+DELETE_REVIEW = "delete_review"
+
+def _ok(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {"status": "ok", "result": result}
+
+def _error(status_code: int, detail: str) -> Dict[str, Any]:
+    return {"status": "error", "error": {"status_code": status_code, "detail": detail}}
+
+def _object_id(value: Optional[str]) -> Optional[PydanticObjectId]:
+    try:
+        return PydanticObjectId(value) if value else None
+    except (InvalidId, TypeError):
+        return None
+
+async def _claim(user_id: str, keys: List[str], claim_id: str) -> Tuple[Set[str], Dict[str, dict]]:
+    """Claim idempotency keys for this batch
+    
+    Returns the keys claimed and the existing records for keys that were
+    already claimed, by an earlier batch or one running concurrently.
+    Pending claims whose lease ran out belong to a batch that died and are
+    taken over.
+    """
+    collection = SyncOperation.get_motor_collection()
+    now = datetime.utcnow()
+    claimed = set(keys)
+    try:
+        await collection.insert_many(
+            [
+                {"user_id": user_id, "idempotency_key": key, "status": PENDING, "claim_id": claim_id, "claimed_at": now, "created_at": now}
+                for key in keys
+            ],
+            ordered=False
+        )
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            if error.get("code") != 11000:
+                raise
+            claimed.discard(keys[error["index"]])
+    
+    existing = {}
+    taken = [key for key in keys if key not in claimed]
+    if taken:
+        lease_expired = now - timedelta(seconds=settings.SYNC_CLAIM_LEASE_SECONDS)
+        await collection.update_many(
+            {
+                "user_id": user_id,
+                "idempotency_key": {"$in": taken},
+                "status": PENDING,
+                "$or": [
+                    {"claimed_at": {"$lt": lease_expired}},
+                    {"claimed_at": {"$exists": False}, "created_at": {"$lt": lease_expired}},
+                ],
+            },
+            {"$set": {"claim_id": claim_id, "claimed_at": now}}
+        )
+        async for doc in collection.find({"user_id": user_id, "idempotency_key": {"$in": taken}}):
+            if doc.get("status") == PENDING and doc.get("claim_id") == claim_id:
+                claimed.add(doc["idempotency_key"])
+            else:
+                existing[doc["idempotency_key"]] = doc
+    return claimed, existing
+
+async def _settle(user_id: str, claim_id: str, outcomes: Dict[str, Dict[str, Any]], released: Set[str]):
+    """Record final outcomes, and release claims of operations that never ran so a retry can
+    
+    Only claims this batch still holds are touched; one taken over after
+    its lease ran out belongs to the batch that took it.
+    """
+    claim = {"user_id": user_id, "status": PENDING, "claim_id": claim_id}
+    operations = [
+        UpdateOne({**claim, "idempotency_key": key}, {"$set": {"status": DONE, "result": outcome}})
+        for key, outcome in outcomes.items()
+    ]
+    operations.extend(DeleteOne({**claim, "idempotency_key": key}) for key in released)
+    if operations:
+        await SyncOperation.get_motor_collection().bulk_write(operations, ordered=False)
+
+def _created_id(record: Optional[dict]) -> Optional[str]:
+    """Id of the document created by an earlier operation, if it succeeded"""
+    if record and record.get("status") == DONE and (record.get("result") or {}).get("status") == "ok":
+        return record["result"]["result"].get("id")
+    return None
+
+async def run_sync_batch(user: User, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Apply a batch of queued offline actions in order, once each
+    
+    Trees and reviews are written with one bulk_write per collection, and
+    the follow-up aggregate updates are coalesced per affected tree. Each
+    operation gets its own result; an operation whose idempotency key was
+    seen before returns the stored result instead of running again.
+    """
+    user_id = str(user.id)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(operations)
+    
+    # Later duplicates of a key within the batch are rejected
+    first_index: Dict[str, int] = {}
+    for i, operation in enumerate(operations):
+        key = operation["idempotency_key"]
+        if key in first_index:
+            results[i] = _error(400, "Duplicate idempotency_key in batch")
+        else:
+            first_index[key] = i
+    
+    claim_id = uuid.uuid4().hex
+    claimed, existing = await _claim(user_id, list(first_index), claim_id)
+    writes_started = False
+    try:
+        for key, i in first_index.items():
+            if key in claimed:
+                continue
+            record = existing.get(key)
+            if record is not None and record.get("status") == DONE:
+                results[i] = {**record["result"], "replayed": True}
+            else:
+                # Held by a running batch, or released by one since our claim attempt
+                results[i] = {"status": "in_progress"}
+        
+        # Documents created by earlier batches can be referenced by idempotency key
+        created_ids = {key: _created_id(record) for key, record in existing.items()}
+        
+        # Look up everything referenced by id in one query per collection
+        pending = [operations[i] for i in range(len(operations)) if results[i] is None]
+        tree_ids = {_object_id(op.get("tree_id") or created_ids.get(op.get("tree_key"))) for op in pending}
+        review_ids = {_object_id(op.get("review_id") or created_ids.get(op.get("review_key"))) for op in pending}
+        tree_ids.discard(None)
+        review_ids.discard(None)
+        known_trees = set()
+        if tree_ids:
+            cursor = Tree.get_motor_collection().find({"_id": {"$in": list(tree_ids)}}, {"_id": 1})
+            known_trees = {str(doc["_id"]) async for doc in cursor}
+        reviews: Dict[str, dict] = {}
+        if review_ids:
+            # Whole documents: the tree detail updates after the writes need every field
+            cursor = Review.get_motor_collection().find({"_id": {"$in": list(review_ids)}})
+            reviews = {str(doc["_id"]): {**doc, "version": doc.get("version") or 0} async for doc in cursor}
+        reviewed_trees = set(await Review.get_motor_collection().distinct(
+            "tree_id", {"user_id": user_id, "tree_id": {"$in": [str(tree_id) for tree_id in tree_ids]}}
+        )) if tree_ids else set()
+        
+        # Plan the writes in order, tracking documents created earlier in the batch
+        tree_writes: List[Tuple[int, InsertOne, dict]] = []
+        review_writes: List[Tuple[int, Any, str]] = []  # (operation index, write, review id)
+        updated_content: Dict[str, Tuple[Any, str]] = {}  # (rating, comment) of each review's last update
+        now = datetime.utcnow()
+        
+        for i, operation in enumerate(operations):
+            if results[i] is not None:
+                continue
+            action = operation["action"]
+            key = operation["idempotency_key"]
+            
+            if action == CREATE_TREE:
+                data = operation.get("tree")
+                if not data:
+                    results[i] = _error(422, "create_tree requires tree")
+                    continue
+                tree = Tree(
+                    **data,
+                    user_id=user_id,
+                    user_name=user.display_name,
+                    user_name_version=user.display_name_version,
+                    geo_regions=geo_regions(data["location"]["latitude"], data["location"]["longitude"])
+                )
+                tree.id = PydanticObjectId()
+                document = {"_id": tree.id, **tree.model_dump(exclude={"id", "revision_id"})}
+                tree_writes.append((i, InsertOne(document), document))
+                created_ids[key] = str(tree.id)
+                known_trees.add(str(tree.id))
+                results[i] = _ok({"id": str(tree.id)})
+            
+            elif action in (CREATE_REVIEW, UPDATE_REVIEW) and operation.get("rating") is None:
+                results[i] = _error(422, f"{action} requires rating")
+            
+            elif action == CREATE_REVIEW:
+                tree_id = operation.get("tree_id") or created_ids.get(operation.get("tree_key"))
+                if tree_id not in known_trees:
+                    results[i] = _error(404, "Tree not found")
+                    continue
+                if tree_id in reviewed_trees:
+                    results[i] = _error(400, "You have already reviewed this tree")
+                    continue
+                review_id = PydanticObjectId()
+                document = {
+                    "_id": review_id,
+                    "tree_id": tree_id,
+                    "user_id": user_id,
+                    "user_name": user.display_name,
+                    "user_name_version": user.display_name_version,
+                    "rating": operation.get("rating"),
+                    "comment": operation.get("comment") or "",
+                    "created_at": now,
+                    "version": 0,
+                }
+                review_writes.append((i, InsertOne(document), str(review_id)))
+                # A copy, so later operations in the batch don't alter the document being inserted
+                reviews[str(review_id)] = dict(document)
+                reviewed_trees.add(tree_id)
+                created_ids[key] = str(review_id)
+                results[i] = _ok({"id": str(review_id), "tree_id": tree_id})
+            
+            elif action in (UPDATE_REVIEW, DELETE_REVIEW):
+                review_id = operation.get("review_id") or created_ids.get(operation.get("review_key"))
+                review = reviews.get(review_id)
+                if review is None or review.get("deleted"):
+                    results[i] = _error(404, "Review not found")
+                    continue
+                if review["user_id"] != user_id:
+                    results[i] = _error(403, f"Not authorized to {action.split('_')[0]} this review")
+                    continue
+                
+                if action == DELETE_REVIEW:
+                    review_writes.append((i, DeleteOne({"_id": review["_id"], "user_id": user_id}), review_id))
+                    review["deleted"] = True
+                    reviewed_trees.discard(review["tree_id"])
+                    results[i] = _ok({"id": review_id})
+                    continue
+                
+                expected_version = operation.get("version")
+                if expected_version is None:
+                    expected_version = review["version"]
+                elif expected_version != review["version"]:
+                    results[i] = _error(409, "Review was modified by another request; reload it and retry")
+                    continue
+                content = (operation.get("rating"), operation.get("comment") or "")
+                review_writes.append((i, UpdateOne(
+                    {"_id": review["_id"], **version_filter(expected_version)},
+                    {"$set": {"rating": content[0], "comment": content[1]}, "$inc": {"version": 1}}
+                ), review_id))
+                review["version"] = expected_version + 1
+                updated_content[review_id] = content
+                results[i] = _ok({"id": review_id, "version": review["version"]})
+            
+            else:
+                results[i] = _error(400, f"Unknown action {action}")
+        
+        # Trees first, so reviews of trees created in this batch find them
+        writes_started = True
+        failed_trees = await _bulk_write(Tree, tree_writes, results)
+        for i, _, review_id in review_writes:
+            if reviews[review_id].get("tree_id") in failed_trees and results[i]["status"] == "ok":
+                results[i] = {"status": "not_executed"}
+        review_writes = [write for write in review_writes if results[write[0]]["status"] == "ok"]
+        await _bulk_write(Review, review_writes, results)
+        
+        # Versioned updates that matched nothing lost a race with another writer. The version
+        # alone can't tell: a concurrent update may have reached the version this batch expected.
+        updated = [review_id for review_id in updated_content if not reviews[review_id].get("deleted")]
+        if updated:
+            cursor = Review.get_motor_collection().find(
+                {"_id": {"$in": [PydanticObjectId(r) for r in updated]}}, {"version": 1, "rating": 1, "comment": 1}
+            )
+            stored = {str(doc["_id"]): (doc.get("version") or 0, doc.get("rating"), doc.get("comment")) async for doc in cursor}
+            for i, write, review_id in review_writes:
+                if isinstance(write, UpdateOne) and stored.get(review_id) != (reviews[review_id]["version"], *updated_content[review_id]):
+                    results[i] = _error(409, "Review was modified by another request; reload it and retry")
+        
+        await _after_writes(user_id, operations, results, tree_writes, review_writes, reviews)
+    finally:
+        if writes_started:
+            # Results stand once writes were sent; releasing could apply them twice
+            outcomes, released = _outcomes(operations, results, claimed, first_index)
+        else:
+            # Nothing was written: let a retry run every operation
+            outcomes, released = {}, claimed
+        await _settle(user_id, claim_id, outcomes, released)
+    
+    return [{"idempotency_key": operation["idempotency_key"], **result} for operation, result in zip(operations, results)]
+
+def _outcomes(
+    operations: List[Dict[str, Any]],
+    results: List[Dict[str, Any]],
+    claimed: Set[str],
+    first_index: Dict[str, int]
+) -> Tuple[Dict[str, Dict[str, Any]], Set[str]]:
+    """Split this batch's claims into final results to store and keys to release"""
+    outcomes = {}
+    released = set()
+    for i, operation in enumerate(operations):
+        key = operation["idempotency_key"]
+        if key not in claimed or first_index.get(key) != i:
+            continue
+        if results[i]["status"] in ("ok", "error"):
+            outcomes[key] = results[i]
+        else:
+            released.add(key)
+    return outcomes, released
+
+async def _bulk_write(model, writes: List[Tuple[int, Any, Any]], results: List[Dict[str, Any]]) -> Set[str]:
+    """Run one ordered bulk_write; on failure mark the failing and unexecuted operations
+    
+    Returns the ids of documents whose writes didn't happen.
+    """
+    if not writes:
+        return set()
+    try:
+        await model.get_motor_collection().bulk_write([write for _, write, _ in writes], ordered=True)
+        return set()
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        failed_at = errors[0]["index"] if errors else 0
+        logger.warning(f"Sync batch {model.Settings.name} write failed at {failed_at}: {errors[:1]}")
+    
+    failed = set()
+    for position, (i, _, document) in enumerate(writes[failed_at:]):
+        results[i] = _error(500, "Write failed") if position == 0 else {"status": "not_executed"}
+        failed.add(str(document["_id"]) if isinstance(document, dict) else document)
+    del writes[failed_at:]
+    return failed
+
+async def _after_writes(
+    user_id: str,
+    operations: List[Dict[str, Any]],
+    results: List[Dict[str, Any]],
+    tree_writes: List[Tuple[int, InsertOne, dict]],
+    review_writes: List[Tuple[int, Any, str]],
+    reviews: Dict[str, dict]
+):
+    """Publish the writes and queue one aggregate refresh per affected tree"""
+    for i, _, document in tree_writes:
+        if results[i]["status"] == "ok":
+            await publish_local(Tree.Settings.name, "insert", document["_id"], document)
+            await add_user_tree(user_id, str(document["_id"]), ADDED)
+    
+    affected_trees: Set[str] = set()
+    removed_from: List[str] = []
+    trending: Dict[str, float] = defaultdict(float)
+    ratings: Dict[str, float] = {}  # Each review's rating as of the write being published
+    for i, write, review_id in review_writes:
+        if results[i]["status"] != "ok":
+            continue
+        review = reviews[review_id]
+        rating = ratings.get(review_id, review["rating"])
+        affected_trees.add(review["tree_id"])
+        if isinstance(write, InsertOne):
+            document = {**review, "version": 0}
+            await publish_local(Review.Settings.name, "insert", review["_id"], document)
+            await record_review_created(Review.model_validate(document))
+            trending[review["tree_id"]] += activity_weight(review["created_at"])
+        elif isinstance(write, DeleteOne):
+            await publish_local(Review.Settings.name, "delete", review["_id"])
+            await record_review_deleted(Review.model_validate({**review, "rating": rating}))
+            trending[review["tree_id"]] -= activity_weight(review["created_at"])
+            removed_from.append(review["tree_id"])
+        else:
+            operation = operations[i]
+            await publish_local(Review.Settings.name, "update", review["_id"])
+            await record_review_updated(Review.model_validate({
+                **review,
+                "rating": operation["rating"],
+                "comment": operation.get("comment") or "",
+                "version": results[i]["result"]["version"],
+            }), rating)
+            ratings[review_id] = operation["rating"]
+    
+    for tree_id in affected_trees:
+        task_queue.enqueue(f"tree-stats:{tree_id}", refresh_tree_stats, tree_id)
+        task_queue.enqueue(f"climbed-tree:{user_id}:{tree_id}", sync_climbed_tree, user_id, tree_id)
+    if trending:
+        task_queue.enqueue(f"trending-batch:{uuid.uuid4().hex}", apply_trending_weights, dict(trending))
+    if removed_from:
+        task_queue.enqueue(f"similarities-removed:{uuid.uuid4().hex}", record_reviews_removed, user_id, removed_from)
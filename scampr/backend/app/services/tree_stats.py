@@ -0,0 +1,122 @@
+# app/services/tree_stats.py
+import logging
+import math
+from typing import Any, Dict, Mapping
+from beanie import PydanticObjectId
+from ..core.change_streams import publish_local
+from ..core.config import settings
+from ..models.tree import Tree
+from ..models.review import Review
+
+logger = logging.getLogger(__name__)
+
+# Fields of a review copied into its tree's recent_reviews
+RECENT_REVIEW_FIELDS = ("user_id", "user_name", "user_name_version", "rating", "comment", "created_at", "version")
+
+def rating_bucket(rating: float) -> str:
+    """Histogram bucket ("1" to "5") of a rating, rounding halves up"""
+    return str(min(5, max(1, math.floor(rating + 0.5))))
+
+# Counters reviews written before they existed lack, with the model's default
+RECENT_REVIEW_DEFAULTS = {"user_name_version": 0, "version": 0}
+
+def recent_review(review: Mapping[str, Any]) -> Dict[str, Any]:
+    """The copy of a review document kept in its tree's recent_reviews"""
+    copy = {"id": str(review["_id"]), **{field: review.get(field) for field in RECENT_REVIEW_FIELDS}}
+    for field, default in RECENT_REVIEW_DEFAULTS.items():
+        if copy[field] is None:
+            copy[field] = default
+    return copy
+
+async def refresh_tree_stats(tree_id: str):
+    """Recompute a tree's rating aggregates, histogram and recent reviews from its reviews
+    
+    This is the full recompute behind the incremental updates below, so any
+    drift they accumulate is corrected after the next review write.
+    """
+    bucket = {"$toString": {"$min": [5, {"$max": [1, {"$floor": {"$add": ["$rating", 0.5]}}]}]}}
+    pipeline = [
+        {"$match": {"tree_id": tree_id}},
+        {"$facet": {
+            "stats": [
+                {"$group": {"_id": None, "average_rating": {"$avg": "$rating"}, "climb_count": {"$sum": 1}}},
+            ],
+            "histogram": [
+                {"$group": {"_id": bucket, "count": {"$sum": 1}}},
+            ],
+            "recent": [
+                {"$sort": {"created_at": -1}},
+                {"$limit": settings.TREE_RECENT_REVIEWS},
+                {"$project": {field: 1 for field in RECENT_REVIEW_FIELDS}},
+            ],
+        }},
+    ]
+    result = (await Review.get_motor_collection().aggregate(pipeline, maxTimeMS=settings.MONGODB_MAX_TIME_MS).to_list(1))[0]
+    if result["stats"]:
+        average_rating = round(result["stats"][0]["average_rating"], 2)
+        climb_count = result["stats"][0]["climb_count"]
+    else:
+        average_rating = 0.0
+        climb_count = 0
+    
+    # Only touch the aggregate fields so concurrent edits to the tree aren't overwritten
+    stats = {
+        "average_rating": average_rating,
+        "climb_count": climb_count,
+        "rating_histogram": {group["_id"]: group["count"] for group in result["histogram"]},
+        "recent_reviews": [recent_review(review) for review in result["recent"]],
+    }
+    await Tree.get_motor_collection().update_one({"_id": PydanticObjectId(tree_id)}, {"$set": stats})
+    await publish_local(Tree.Settings.name, "update", PydanticObjectId(tree_id), updated_fields=stats)
+
+async def record_review_created(review: Review):
+    """Add a new review to its tree's detail right away, ahead of the full recompute"""
+    document = {"_id": review.id, **review.model_dump(include=set(RECENT_REVIEW_FIELDS))}
+    await Tree.get_motor_collection().update_one(
+        {"_id": PydanticObjectId(review.tree_id)},
+        {
+            "$push": {"recent_reviews": {
+                "$each": [recent_review(document)],
+                "$sort": {"created_at": -1},
+                "$slice": settings.TREE_RECENT_REVIEWS
+            }},
+            "$inc": {f"rating_histogram.{rating_bucket(review.rating)}": 1, "climb_count": 1}
+        }
+    )
+
+async def record_review_updated(review: Review, old_rating: float):
+    """Move an edited review to its new histogram bucket and refresh its recent copy"""
+    update: Dict[str, Any] = {"$set": {
+        "recent_reviews.$[review].rating": review.rating,
+        "recent_reviews.$[review].comment": review.comment,
+        "recent_reviews.$[review].version": review.version,
+    }}
+    old_bucket, new_bucket = rating_bucket(old_rating), rating_bucket(review.rating)
+    if old_bucket != new_bucket:
+        update["$inc"] = {f"rating_histogram.{old_bucket}": -1, f"rating_histogram.{new_bucket}": 1}
+    # Trees without the read model yet get it from the recompute; array updates need the field
+    await Tree.get_motor_collection().update_one(
+        {"_id": PydanticObjectId(review.tree_id), "recent_reviews": {"$exists": True}},
+        update,
+        array_filters=[{"review.id": str(review.id)}]
+    )
+
+async def record_review_deleted(review: Review):
+    """Take a deleted review out of its tree's detail; the recompute refills recent_reviews"""
+    await Tree.get_motor_collection().update_one(
+        {"_id": PydanticObjectId(review.tree_id)},
+        {
+            "$pull": {"recent_reviews": {"id": str(review.id)}},
+            "$inc": {f"rating_histogram.{rating_bucket(review.rating)}": -1, "climb_count": -1}
+        }
+    )
+
+async def backfill_tree_details():
+    """Build the detail read model for trees created before it existed"""
+    cursor = Tree.get_motor_collection().find({"rating_histogram": {"$exists": False}}, {"_id": 1})
+    backfilled = 0
+    async for doc in cursor:
+        await refresh_tree_stats(str(doc["_id"]))
+        backfilled += 1
+    if backfilled:
+        logger.info(f"Backfilled detail read model for {backfilled} trees")
\ No newline at end of file
@@ -0,0 +1,93 @@
+# app/services/trending.py
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from beanie import PydanticObjectId
+from pymongo import UpdateOne
+from ..core.config import settings
+from ..core.geo import geo_regions
+from ..models.tree import Tree
+
+logger = logging.getLogger(__name__)
+
+# Trending uses forward decay: each review adds exp(rate * (t - epoch)) to the
+# stored score. Every score would be multiplied by the same exp(-rate * (now -
+# epoch)) to get its decayed value, so the stored scores already rank trees by
+# decayed popularity and a plain index on trending_score serves the top K.
+# Weights grow with time; TRENDING_EPOCH should be moved forward (and stored
+# scores rescaled) well before they approach float range, which at the
+# default one-week half-life is decades away but at a one-day half-life
+# under three years. validate_trending_settings() checks this at startup.
+
+# exp() overflows past ~709.8; stay short of it so sums of many weights are finite too
+MAX_WEIGHT_EXPONENT = 650.0
+TRENDING_HEADROOM_DAYS = 365  # How long the settings must stay valid from startup
+
+def _decay_rate() -> float:
+    return math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+
+def _seconds_since_epoch(at: datetime) -> float:
+    return (at - settings.TRENDING_EPOCH).total_seconds()
+
+def validate_trending_settings():
+    """Fail fast if the half-life and epoch would overflow trending weights within TRENDING_HEADROOM_DAYS"""
+    if settings.TRENDING_HALF_LIFE_HOURS <= 0:
+        raise ValueError("TRENDING_HALF_LIFE_HOURS must be positive")
+    horizon = datetime.utcnow() + timedelta(days=TRENDING_HEADROOM_DAYS)
+    if _decay_rate() * _seconds_since_epoch(horizon) > MAX_WEIGHT_EXPONENT:
+        overflow_at = settings.TRENDING_EPOCH + timedelta(seconds=MAX_WEIGHT_EXPONENT / _decay_rate())
+        raise ValueError(
+            f"TRENDING_HALF_LIFE_HOURS={settings.TRENDING_HALF_LIFE_HOURS} with TRENDING_EPOCH="
+            f"{settings.TRENDING_EPOCH:%Y-%m-%d} overflows trending weights around {overflow_at:%Y-%m-%d}; "
+            f"move TRENDING_EPOCH forward and rescale stored trending_score values"
+        )
+
+def activity_weight(at: datetime) -> float:
+    """Stored-score contribution of one review written at the given time"""
+    # Clamped so a process outliving the validated horizon stops ranking newer
+    # activity higher instead of failing every review write with OverflowError
+    return math.exp(min(_decay_rate() * _seconds_since_epoch(at), MAX_WEIGHT_EXPONENT))
+
+def decayed_score(stored_score: float, now: Optional[datetime] = None) -> float:
+    """Convert a stored score into the activity it represents as of now"""
+    now = now or datetime.utcnow()
+    return stored_score * math.exp(-_decay_rate() * _seconds_since_epoch(now))
+
+async def record_review_activity(tree_id: str, created_at: datetime, removed: bool = False):
+    """Add (or take back, when the review was deleted) one review's trending weight"""
+    weight = activity_weight(created_at)
+    await Tree.get_motor_collection().update_one(
+        {"_id": PydanticObjectId(tree_id)},
+        {"$inc": {"trending_score": -weight if removed else weight}}
+    )
+
+async def apply_trending_weights(weights: Dict[str, float]):
+    """Add net trending weight to several trees in one round trip"""
+    operations = [
+        UpdateOne({"_id": PydanticObjectId(tree_id)}, {"$inc": {"trending_score": weight}})
+        for tree_id, weight in weights.items()
+        if weight
+    ]
+    if operations:
+        await Tree.get_motor_collection().bulk_write(operations, ordered=False)
+
+async def trending_trees(region: Optional[str], limit: int) -> List[Tree]:
+    """Top trees by trending score, optionally within one geohash region"""
+    query = Tree.find({"geo_regions": region}) if region else Tree.find()
+    return await query.sort(-Tree.trending_score).limit(limit).to_list()
+
+async def backfill_geo_regions():
+    """Fill geo_regions for trees created before regional trending existed"""
+    trees = Tree.get_motor_collection()
+    cursor = trees.find({"geo_regions.0": {"$exists": False}}, {"location": 1})
+    operations = [
+        UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {"geo_regions": geo_regions(doc["location"]["latitude"], doc["location"]["longitude"])}}
+        )
+        async for doc in cursor
+    ]
+    if operations:
+        await trees.bulk_write(operations, ordered=False)
+        logger.info(f"Backfilled geo_regions for {len(operations)} trees")
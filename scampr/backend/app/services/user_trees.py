@@ -0,0 +1,80 @@
+# app/services/user_trees.py
+import logging
+from datetime import datetime
+from typing import List, Tuple
+from beanie import PydanticObjectId
+from ..core.cache import invalidate
+from ..models.user import User
+from ..models.review import Review
+from ..models.user_tree import UserTree, CLIMBED, ADDED
+
+logger = logging.getLogger(__name__)
+
+async def add_user_tree(user_id: str, tree_id: str, relation: str) -> bool:
+    """Add a tree to one of the user's lists, returning True if it wasn't there yet"""
+    # Upsert on the unique (user_id, relation, tree_id) index replaces the O(n) list scan
+    result = await UserTree.get_motor_collection().update_one(
+        {"user_id": user_id, "relation": relation, "tree_id": tree_id},
+        {"$setOnInsert": {"created_at": datetime.utcnow()}},
+        upsert=True
+    )
+    added = result.upserted_id is not None
+    if added and relation == CLIMBED:
+        await User.get_motor_collection().update_one(
+            {"_id": PydanticObjectId(user_id)},
+            {"$inc": {"total_climbs": 1}}
+        )
+        invalidate(User.Settings.name, user_id)
+    return added
+
+async def remove_user_tree(user_id: str, tree_id: str, relation: str) -> bool:
+    """Remove a tree from one of the user's lists, returning True if it was there"""
+    result = await UserTree.get_motor_collection().delete_one(
+        {"user_id": user_id, "relation": relation, "tree_id": tree_id}
+    )
+    removed = result.deleted_count == 1
+    if removed and relation == CLIMBED:
+        await User.get_motor_collection().update_one(
+            {"_id": PydanticObjectId(user_id), "total_climbs": {"$gt": 0}},
+            {"$inc": {"total_climbs": -1}}
+        )
+        invalidate(User.Settings.name, user_id)
+    return removed
+
+async def sync_climbed_tree(user_id: str, tree_id: str):
+    """Bring the user's climbed list in line with whether they have reviewed the tree"""
+    reviewed = await Review.find(Review.user_id == user_id, Review.tree_id == tree_id).count()
+    if reviewed:
+        await add_user_tree(user_id, tree_id, CLIMBED)
+    else:
+        await remove_user_tree(user_id, tree_id, CLIMBED)
+
+async def list_user_trees(user_id: str, relation: str, skip: int = 0, limit: int = 20) -> Tuple[int, List[UserTree]]:
+    """Page through one of the user's lists, newest first, with the total count"""
+    query = UserTree.find(UserTree.user_id == user_id, UserTree.relation == relation)
+    total = await query.count()
+    entries = await query.sort(-UserTree.created_at).skip(skip).limit(limit).to_list()
+    return total, entries
+
+async def migrate_legacy_user_tree_lists():
+    """Move climbed_trees/added_trees arrays off user documents into user_trees"""
+    users = User.get_motor_collection()
+    cursor = users.find(
+        {"$or": [{"climbed_trees": {"$exists": True}}, {"added_trees": {"$exists": True}}]},
+        {"climbed_trees": 1, "added_trees": 1}
+    )
+    migrated = 0
+    async for doc in cursor:
+        user_id = str(doc["_id"])
+        for relation, field in ((CLIMBED, "climbed_trees"), (ADDED, "added_trees")):
+            for tree_id in doc.get(field) or []:
+                await UserTree.get_motor_collection().update_one(
+                    {"user_id": user_id, "relation": relation, "tree_id": tree_id},
+                    {"$setOnInsert": {"created_at": datetime.utcnow()}},
+                    upsert=True
+                )
+        # total_climbs is already correct for migrated users, so only the arrays go
+        await users.update_one({"_id": doc["_id"]}, {"$unset": {"climbed_trees": "", "added_trees": ""}})
+        migrated += 1
+    if migrated:
+        logger.info(f"Migrated tree lists for {migrated} users into user_trees")
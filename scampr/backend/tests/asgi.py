@@ -0,0 +1,51 @@
+# tests/asgi.py
+from typing import Dict, List, Tuple
+from fastapi import FastAPI
+from app.api.routes import api_router
+from app.core.auth import get_current_user
+
+async def asgi_request(
+    app,
+    method: str,
+    path: str,
+    headers: List[Tuple[bytes, bytes]] = (),
+    body_chunks: List[bytes] = (b"",)
+) -> Tuple[int, Dict[bytes, bytes], bytes]:
+    """Run one request through an ASGI app, returning its status, headers and body"""
+    chunks = list(body_chunks)
+    sent = []
+    
+    async def receive():
+        if chunks:
+            chunk = chunks.pop(0)
+            return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+        return {"type": "http.disconnect"}
+    
+    async def send(message):
+        sent.append(message)
+    
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": list(headers),
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+    await app(scope, receive, send)
+    start = next(message for message in sent if message["type"] == "http.response.start")
+    body = b"".join(message.get("body", b"") for message in sent if message["type"] == "http.response.body")
+    return start["status"], dict(start["headers"]), body
+
+def api_as(user) -> FastAPI:
+    """The API routes without middlewares, authenticated as user"""
+    app = FastAPI()
+    app.include_router(api_router)
+    app.dependency_overrides[get_current_user] = lambda: user
+    return app
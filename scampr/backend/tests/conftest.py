@@ -0,0 +1,34 @@
+# tests/conftest.py
+import os
+import uuid
+from typing import Optional
+import pytest
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+from app.core.database import DOCUMENT_MODELS
+
+TEST_MONGODB_URL = os.getenv("TEST_MONGODB_URL", "mongodb://localhost:27017")
+
+_mongo_reachable: Optional[bool] = None  # Checked once, so a missing server costs one timeout
+
+@pytest.fixture
+async def mongo():
+    """A throwaway database with every model registered; skips the test without a MongoDB server"""
+    global _mongo_reachable
+    client = AsyncIOMotorClient(TEST_MONGODB_URL, serverSelectionTimeoutMS=1000)
+    if _mongo_reachable is None:
+        try:
+            await client.admin.command("ping")
+            _mongo_reachable = True
+        except PyMongoError:
+            _mongo_reachable = False
+    if not _mongo_reachable:
+        client.close()
+        pytest.skip(f"MongoDB not reachable at {TEST_MONGODB_URL}")
+    
+    database = client[f"scampr_test_{uuid.uuid4().hex}"]
+    await init_beanie(database=database, document_models=DOCUMENT_MODELS)
+    yield database
+    await client.drop_database(database.name)
+    client.close()
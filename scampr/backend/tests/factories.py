@@ -0,0 +1,20 @@
+# tests/factories.py
+from app.models.user import User
+from app.models.tree import Tree, Location
+
+def make_user(**fields) -> User:
+    fields.setdefault("email", "climber@example.com")
+    fields.setdefault("display_name", "Old Name")
+    fields.setdefault("password_hash", "")
+    return User(**fields)
+
+def make_tree(user_id: str = "user-1", **fields) -> Tree:
+    fields.setdefault("name", "The Old Oak")
+    fields.setdefault("description", "")
+    fields.setdefault("location", Location(latitude=40.0, longitude=-74.0))
+    fields.setdefault("address", "")
+    fields.setdefault("user_name", "Old Name")
+    fields.setdefault("tree_type", "Oak")
+    fields.setdefault("difficulty", 3.0)
+    fields.setdefault("height", 10.0)
+    return Tree(user_id=user_id, **fields)
@@ -0,0 +1,68 @@
+# tests/test_account.py
+import pytest
+from app.core.change_streams import publish_local
+from app.core.tasks import task_queue
+from app.models.job_state import JobState
+from app.models.review import Review
+from app.models.tree import Tree
+from app.services.recommendations import JOB_NAME
+from app.services.trending import activity_weight
+from app.services.search_index import fuzzy_match
+from asgi import api_as, asgi_request
+from factories import make_tree, make_user
+
+async def delete_account(user):
+    return await asgi_request(api_as(user), "DELETE", f"/auth/delete-account/{user.id}")
+
+async def run_queued(prefix: str):
+    """Run the queued jobs whose key starts with prefix, as the queue's workers would"""
+    for key in [key for key in task_queue._pending if key.startswith(prefix)]:
+        job = task_queue._pending.pop(key)
+        await job.func(*job.args)
+
+def review(tree, user_id: str, created_at=None) -> Review:
+    fields = {"created_at": created_at} if created_at else {}
+    return Review(tree_id=str(tree.id), user_id=user_id, user_name="Climber", rating=4.0, comment="", **fields)
+
+async def test_deleted_trees_leave_the_search_index(mongo):
+    user = make_user()
+    await user.insert()
+    tree = make_tree(str(user.id), name="Zelkova Giant")
+    await tree.insert()
+    await publish_local(Tree.Settings.name, "insert", tree.id, tree.model_dump())
+    assert str(tree.id) in fuzzy_match("zelkova")
+    
+    assert (await delete_account(user))[0] == 200
+    
+    assert str(tree.id) not in fuzzy_match("zelkova")
+
+async def test_reviews_of_deleted_trees_are_removed_from_similarities(mongo):
+    user = make_user()
+    await user.insert()
+    tree = make_tree(str(user.id))
+    await tree.insert()
+    await review(tree, "user-2").insert()
+    
+    assert (await delete_account(user))[0] == 200
+    
+    assert await Review.find(Review.tree_id == str(tree.id)).count() == 0
+    await run_queued("similarities-removed:user-2:")
+    state = await JobState.find_one(JobState.name == JOB_NAME)
+    assert "user-2" in state.removed_reviewers
+    assert str(tree.id) in state.stale_trees
+
+async def test_deleted_reviews_take_back_trending_weight(mongo):
+    user = make_user()
+    await user.insert()
+    tree = make_tree("user-2")
+    await tree.insert()
+    created = review(tree, str(user.id))
+    await created.insert()
+    # Stored times are truncated to milliseconds; the weight is taken back from the stored one
+    weight = activity_weight((await Review.get(created.id)).created_at)
+    await Tree.get_motor_collection().update_one({"_id": tree.id}, {"$set": {"trending_score": weight}})
+    
+    assert (await delete_account(user))[0] == 200
+    await run_queued(f"trending-removed-user:{user.id}")
+    
+    assert (await Tree.get(tree.id)).trending_score == pytest.approx(0.0)
@@ -0,0 +1,31 @@
+# tests/test_cache.py
+from app.core.cache import TTLCache
+
+def test_invalidate_alias_drops_entry():
+    cache = TTLCache("test-alias", ttl_seconds=60, max_entries=10)
+    cache.set("climber@example.com", "user", alias="user-1")
+    
+    cache.invalidate_alias("user-1")
+    
+    assert cache.get("climber@example.com") is None
+    assert cache.invalidations == 1
+    cache.invalidate_alias("user-1")
+    assert cache.invalidations == 1
+
+def test_alias_follows_replaced_and_evicted_entries():
+    cache = TTLCache("test-alias-evict", ttl_seconds=60, max_entries=1)
+    cache.set("old@example.com", "user", alias="user-1")
+    # Re-keyed under a new email: the alias now points at the new entry
+    cache.set("new@example.com", "user", alias="user-1")
+    assert cache.get("old@example.com") is None
+    
+    cache.invalidate_alias("user-1")
+    assert cache.get("new@example.com") is None
+    assert cache._aliases == {}
+
+def test_expired_entries_release_their_alias():
+    cache = TTLCache("test-alias-ttl", ttl_seconds=-1, max_entries=10)
+    cache.set("climber@example.com", "user", alias="user-1")
+    
+    assert cache.get("climber@example.com") is None
+    assert cache._aliases == {}
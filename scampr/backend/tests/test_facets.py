@@ -0,0 +1,65 @@
+# tests/test_facets.py
+from app.core import change_streams
+from app.core.change_streams import publish_local
+from app.models.tree import Location
+from app.services.facets import _pipeline, _quantize, facet_cache, on_tree_change, search_filter, tree_facets
+from factories import make_tree
+
+def test_quantize_snaps_to_grid():
+    assert _quantize(40.012) == _quantize(39.99) == 40.0
+
+def test_each_facet_drops_its_own_filter():
+    pipeline = _pipeline(40.0, -74.0, 10.0, "Oak", 2.0, 4.0)
+    
+    facets = pipeline[-1]["$facet"]
+    assert "location.latitude" in pipeline[0]["$match"]
+    assert "difficulty" in facets["tree_types"][0]["$match"]
+    assert "$expr" not in facets["tree_types"][0]["$match"]
+    assert "difficulty" not in facets["difficulty"][0]["$match"]
+    assert "$expr" in facets["features"][0]["$match"] and "difficulty" in facets["features"][0]["$match"]
+
+def test_search_filter_combines_every_filter():
+    assert search_filter() == {}
+    # Radius without a location isn't a filter
+    assert search_filter(radius=50.0) == {}
+    
+    clauses = search_filter(40.0, -74.0, 10.0, "Oak", 2.0, None)["$and"]
+    
+    assert len(clauses) == 3
+    assert {"difficulty": {"$gte": 2.0}} in clauses
+
+async def test_unrelated_updates_keep_cached_counts():
+    facet_cache.set("key", {"total": 1})
+    
+    await on_tree_change({"operationType": "update", "updateDescription": {"updatedFields": {"climb_count": 3}}})
+    assert facet_cache.get("key") == {"total": 1}
+    
+    await on_tree_change({"operationType": "update", "updateDescription": {"updatedFields": {"location.latitude": 1.0}}})
+    assert facet_cache.get("key") is None
+
+async def test_publish_local_reports_updated_fields(monkeypatch):
+    changes = []
+    async def record(change):
+        changes.append(change)
+    monkeypatch.setattr(change_streams, "_run_handlers", record)
+    
+    await publish_local("trees", "update", "tree-1", updated_fields={"climb_count": 3})
+    await publish_local("trees", "update", "tree-1")
+    
+    assert changes[0]["updateDescription"] == {"updatedFields": {"climb_count": 3}}
+    assert "updateDescription" not in changes[1]
+
+async def test_facet_counts_match_search_filter(mongo):
+    facet_cache.clear()
+    await make_tree(tree_type="Oak", difficulty=2.0, features=["rope"]).insert()
+    await make_tree(tree_type="oak", difficulty=4.5).insert()
+    await make_tree(tree_type="Pine", difficulty=2.5, features=["rope"]).insert()
+    await make_tree(tree_type="Oak", location=Location(latitude=45.0, longitude=-74.0)).insert()
+    
+    facets = await tree_facets(40.0, -74.0, 10.0, "Oak", None, 3.0)
+    
+    assert facets["total"] == await mongo["trees"].count_documents(search_filter(40.0, -74.0, 10.0, "Oak", None, 3.0)) == 1
+    # The tree type facet ignores the tree type filter; the difficulty facet ignores difficulty
+    assert {group["value"].lower(): group["count"] for group in facets["tree_types"]} == {"oak": 1, "pine": 1}
+    assert [band["count"] for band in facets["difficulty"]] == [0, 1, 0, 1]
+    assert facets["features"] == [{"value": "rope", "count": 1}]
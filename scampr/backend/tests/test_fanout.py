@@ -0,0 +1,42 @@
+# tests/test_fanout.py
+from app.models.user import User
+from app.models.tree import Tree
+from app.models.review import Review
+from app.services.fanout import fan_out_user_name, rename_user
+from factories import make_user, make_tree
+
+async def test_rename_user_bumps_version(mongo):
+    user = make_user()
+    await user.insert()
+    
+    renamed = await rename_user(user, "New Name")
+    
+    assert renamed.display_name == "New Name"
+    assert renamed.display_name_version == 1
+    assert (await User.get(user.id)).display_name_version == 1
+
+async def test_rename_user_deleted_concurrently(mongo):
+    user = make_user()
+    await user.insert()
+    await User.get_motor_collection().delete_one({"_id": user.id})
+    
+    assert await rename_user(user, "New Name") is None
+
+async def test_fan_out_skips_newer_copies(mongo):
+    user = make_user()
+    await user.insert()
+    user_id = str(user.id)
+    stale = make_tree(user_id)
+    newer = make_tree(user_id, user_name="Newest Name", user_name_version=3)
+    await stale.insert()
+    await newer.insert()
+    review = Review(tree_id=str(stale.id), user_id=user_id, user_name="Old Name", rating=4.0, comment="")
+    await review.insert()
+    # Written before user_name_version existed
+    await Review.get_motor_collection().update_one({"_id": review.id}, {"$unset": {"user_name_version": ""}})
+    
+    await fan_out_user_name(user_id, "Renamed", 2)
+    
+    assert (await Tree.get(stale.id)).user_name == "Renamed"
+    assert (await Tree.get(newer.id)).user_name == "Newest Name"
+    assert (await Review.get(review.id)).user_name_version == 2
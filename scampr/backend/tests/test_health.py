@@ -0,0 +1,44 @@
+# tests/test_health.py
+import pytest
+from app.core.health import ReadinessGateMiddleware, StartupState
+from asgi import asgi_request
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+async def test_gate_rejects_requests_until_ready():
+    state = StartupState()
+    gate = ReadinessGateMiddleware(ok_app, state=state)
+    
+    status, headers, _ = await asgi_request(gate, "GET", "/api/v1/trees")
+    assert status == 503
+    assert b"retry-after" in headers
+    # Probes answer while starting
+    assert (await asgi_request(gate, "GET", "/readyz"))[0] == 200
+    
+    state.mark_ready()
+    assert (await asgi_request(gate, "GET", "/api/v1/trees"))[0] == 200
+
+async def test_failed_warmups_rerun_alone():
+    state = StartupState()
+    calls = {"index": 0, "cache": 0}
+    
+    async def index():
+        calls["index"] += 1
+        if calls["index"] == 1:
+            raise ConnectionError("transient")
+    
+    async def cache():
+        calls["cache"] += 1
+    
+    state.register_warmup("index", index)
+    state.register_warmup("cache", cache)
+    with pytest.raises(ConnectionError):
+        await state.run_warmups()
+    assert state.warmed == {"index": False, "cache": True}
+    
+    await state.run_warmups()
+    
+    assert state.warmed == {"index": True, "cache": True}
+    assert calls == {"index": 2, "cache": 1}
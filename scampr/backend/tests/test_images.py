@@ -0,0 +1,87 @@
+# tests/test_images.py
+import re
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from PIL import Image
+from app.api.endpoints.trees import thumbnail_urls
+from app.core.body_limit import BodySizeLimitMiddleware
+from app.models.tree import Tree, TreeImage
+from app.services.image_variants import render_variants
+from app.services.images import UPLOAD_PATH_PATTERN
+from asgi import asgi_request
+
+BOUNDARY = b"scampr-test-boundary"
+
+def multipart(payload: bytes) -> bytes:
+    return (
+        b"--" + BOUNDARY + b"\r\n"
+        b'Content-Disposition: form-data; name="file"; filename="tree.jpg"\r\n'
+        b"Content-Type: image/jpeg\r\n\r\n" + payload + b"\r\n"
+        b"--" + BOUNDARY + b"--\r\n"
+    )
+
+def upload_app(max_bytes: int):
+    app = FastAPI()
+    
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+    
+    return BodySizeLimitMiddleware(app, max_bytes=max_bytes, path_pattern="^/upload$")
+
+CONTENT_TYPE = (b"content-type", b"multipart/form-data; boundary=" + BOUNDARY)
+
+def test_upload_pattern_matches_both_upload_routes():
+    assert re.match(UPLOAD_PATH_PATTERN, "/api/v1/images/")
+    assert re.match(UPLOAD_PATH_PATTERN, "/api/v1/trees/abc123/images")
+    assert not re.match(UPLOAD_PATH_PATTERN, "/api/v1/trees/abc123")
+
+async def test_declared_oversized_body_is_rejected_unread():
+    body = multipart(b"x" * 5000)
+    chunks = [body]
+    
+    status, _, _ = await asgi_request(
+        upload_app(1000), "POST", "/upload",
+        headers=[CONTENT_TYPE, (b"content-length", str(len(body)).encode())],
+        body_chunks=chunks
+    )
+    
+    assert status == 413
+    assert chunks == [body]
+
+async def test_streamed_oversized_body_is_cut_off():
+    body = multipart(b"x" * 5000)
+    chunks = [body[i:i + 500] for i in range(0, len(body), 500)]
+    
+    status, _, _ = await asgi_request(upload_app(1000), "POST", "/upload", headers=[CONTENT_TYPE], body_chunks=chunks)
+    
+    assert status == 413
+    # Stopped reading soon after the limit
+    assert len(chunks) > 5
+
+async def test_small_upload_passes():
+    status, _, body = await asgi_request(
+        upload_app(1000), "POST", "/upload", headers=[CONTENT_TYPE], body_chunks=[multipart(b"x" * 100)]
+    )
+    
+    assert status == 200
+    assert body == b'{"size":100}'
+
+def test_render_variants_checks_pixel_count(tmp_path):
+    source = tmp_path / "source.png"
+    Image.new("RGB", (100, 80)).save(source)
+    
+    with pytest.raises(ValueError, match="pixels"):
+        render_variants(str(source), str(tmp_path), max_pixels=5000)
+    variants = render_variants(str(source), str(tmp_path), max_pixels=8000)
+    
+    assert variants["thumb"][1:] == (100, 80)
+
+def test_thumbnails_stay_aligned_with_image_urls():
+    # Built without validation, which needs an initialized collection
+    tree = Tree.model_construct(
+        image_urls=["https://example.com/old.jpg", "/media/full.jpg"],
+        images=[TreeImage(url="/media/full.jpg", thumbnail_url="/media/thumb.jpg")]
+    )
+    
+    assert thumbnail_urls(tree) == ["https://example.com/old.jpg", "/media/thumb.jpg"]
@@ -0,0 +1,47 @@
+# tests/test_ratelimit.py
+import pytest
+from app.core.config import settings
+from app.core.ratelimit import MemoryBucketBackend, client_key, validate_route_costs
+
+async def test_bucket_allows_a_burst_then_reports_the_wait():
+    backend = MemoryBucketBackend(max_keys=10)
+    
+    for _ in range(4):
+        assert await backend.take("ip:1", 10, rate=10, capacity=40) == 0
+    wait = await backend.take("ip:1", 10, rate=10, capacity=40)
+    
+    assert wait == pytest.approx(1.0, abs=0.05)
+    # Other clients have their own bucket
+    assert await backend.take("ip:2", 10, rate=10, capacity=40) == 0
+
+async def test_idle_keys_are_evicted():
+    backend = MemoryBucketBackend(max_keys=1)
+    await backend.take("ip:1", 40, rate=10, capacity=40)
+    await backend.take("ip:2", 1, rate=10, capacity=40)
+    
+    assert await backend.take("ip:1", 40, rate=10, capacity=40) == 0
+
+def test_forwarded_for_ignored_unless_trusted():
+    scope = {"headers": [(b"x-forwarded-for", b"203.0.113.9, 10.0.0.1")], "client": ("10.0.0.1", 1234)}
+    
+    assert client_key(scope) == "ip:10.0.0.1"
+
+def test_forwarded_for_uses_the_entry_the_proxy_appended(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_TRUST_FORWARDED_FOR", True)
+    def key(forwarded_for: bytes) -> str:
+        return client_key({"headers": [(b"x-forwarded-for", forwarded_for)], "client": ("10.0.0.1", 1234)})
+    
+    # A client spoofing the header still lands in its own bucket
+    assert key(b"198.51.100.1, 203.0.113.9") == key(b"198.51.100.2, 203.0.113.9") == "ip:203.0.113.9"
+    
+    monkeypatch.setattr(settings, "RATE_LIMIT_TRUSTED_PROXY_HOPS", 2)
+    assert key(b"198.51.100.1, 203.0.113.9, 10.0.0.2") == "ip:203.0.113.9"
+    # Fewer entries than trusted proxies: the header can't be trusted
+    assert key(b"203.0.113.9") == "ip:10.0.0.1"
+
+def test_route_costs_must_fit_in_the_bucket(monkeypatch):
+    validate_route_costs()
+    monkeypatch.setattr(settings, "RATE_LIMIT_BURST", 5.0)
+    
+    with pytest.raises(ValueError, match="auth/login"):
+        validate_route_costs()
@@ -0,0 +1,63 @@
+# tests/test_recommendations.py
+from app.core.config import settings
+from app.models.review import Review
+from app.models.tree import Location
+from app.services.recommendations import (
+    _cell_ranges, _load_trees_near, compute_neighbors, record_reviews_removed, refresh_similar_trees, similar_trees
+)
+from factories import make_tree
+
+def test_cell_ranges_merge_adjacent_columns():
+    cell_degrees = settings.SIMILARITY_PROXIMITY_KM / 111.0
+    
+    ranges = _cell_ranges({(0, 0), (0, 1), (0, 2), (0, 5), (3, 1)})
+    
+    longitudes = sorted(
+        (round(r["location.longitude"]["$gte"] / cell_degrees), round(r["location.longitude"]["$lt"] / cell_degrees))
+        for r in ranges
+    )
+    assert longitudes == [(0, 3), (1, 2), (5, 6)]
+
+def test_co_reviews_outweigh_distance():
+    trees = {
+        "a": {"location": {"latitude": 0.0, "longitude": 0.0}, "tree_type": "Oak", "climb_count": 1},
+        "b": {"location": {"latitude": 10.0, "longitude": 10.0}, "tree_type": "Pine", "climb_count": 1},
+        "c": {"location": {"latitude": 0.01, "longitude": 0.0}, "tree_type": "Pine", "climb_count": 0},
+    }
+    trees_by_user = {"u": {"a", "b"}}
+    users_by_tree = {"a": {"u"}, "b": {"u"}}
+    
+    neighbors = compute_neighbors(["a"], trees, trees_by_user, users_by_tree, limit=5)
+    
+    assert [n["tree_id"] for n in neighbors["a"]] == ["b", "c"]
+
+async def test_load_trees_near_skips_far_trees(mongo):
+    near = make_tree(location=Location(latitude=40.01, longitude=-74.0))
+    far = make_tree(location=Location(latitude=45.0, longitude=-74.0))
+    await near.insert()
+    await far.insert()
+    
+    trees = await _load_trees_near([{"latitude": 40.0, "longitude": -74.0}])
+    
+    assert set(trees) == {str(near.id)}
+
+async def test_deleted_review_drops_co_review_neighbor(mongo):
+    # Far apart, so co-reviews are the only link between them
+    here = make_tree(location=Location(latitude=40.0, longitude=-74.0))
+    there = make_tree(location=Location(latitude=10.0, longitude=20.0))
+    await here.insert()
+    await there.insert()
+    reviews = [
+        Review(tree_id=str(tree.id), user_id="user-1", user_name="Climber", rating=5.0, comment="")
+        for tree in (here, there)
+    ]
+    for review in reviews:
+        await review.insert()
+    await refresh_similar_trees(full=True)
+    assert [n["tree_id"] for n in await similar_trees(str(here.id), 10)] == [str(there.id)]
+    
+    await reviews[1].delete()
+    await record_reviews_removed("user-1", [str(there.id)])
+    await refresh_similar_trees()
+    
+    assert await similar_trees(str(here.id), 10) == []
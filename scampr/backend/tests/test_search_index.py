@@ -0,0 +1,115 @@
+# tests/test_search_index.py
+import pytest
+from app.api.endpoints.trees import calculate_search_score
+from app.services.search_index import (
+    SuggestionIndex, TrigramIndex, edit_distance, popularity, tree_words, trigrams, words
+)
+
+def test_words_split_feature_tags():
+    assert words("Thick_Branches, scenic-view!") == ["thick", "branches", "scenic", "view"]
+    assert tree_words({"name": "Old Oak", "tree_type": "Oak", "features": ["good_handholds"]}) == {
+        "old", "oak", "good", "handholds"
+    }
+
+def test_trigrams_are_padded():
+    assert trigrams("oak") == {"  o", " oa", "oak", "ak "}
+
+def test_search_tolerates_typos():
+    index = TrigramIndex()
+    index.add("1", {"magnolia", "tree"})
+    index.add("2", {"maple", "tree"})
+    
+    matches = index.search("magnolai", max_edits=2)
+    
+    assert set(matches) == {"1"}
+    assert 0.5 <= matches["1"] < 1.0
+    assert index.search("magnolia", max_edits=2)["1"] == 1.0
+
+def test_short_words_tolerate_typos():
+    index = TrigramIndex()
+    index.add("oak", {"oak", "tree"})
+    index.add("maple", {"maple", "tree"})
+    index.add("ash", {"ash"})
+    
+    assert set(index.search("oke", max_edits=2)) == {"oak"}
+    assert set(index.search("mapel", max_edits=2)) == {"maple"}
+    matches = index.search("oke tree", max_edits=2)
+    assert max(matches, key=matches.get) == "oak"
+    # Two letters allow one edit
+    assert index.search("as", max_edits=2) == {"ash": pytest.approx(2 / 3)}
+
+def test_edit_distance_counts_swaps_and_stops_at_limit():
+    assert edit_distance("mapel", "maple", 2) == 1
+    assert edit_distance("oke", "oak", 2) == 2
+    assert edit_distance("sycamore", "willow", 2) == 3
+
+def test_search_averages_over_query_words():
+    index = TrigramIndex()
+    index.add("1", {"old", "sycamore"})
+    index.add("2", {"sycamore"})
+    
+    matches = index.search("old sycamore", max_edits=2)
+    
+    assert matches["1"] == 1.0
+    assert matches["2"] == 0.5
+
+def test_readding_and_removing_a_tree_drops_unused_words():
+    index = TrigramIndex()
+    index.add("1", {"sycamore"})
+    index.add("1", {"willow"})
+    assert index.search("sycamore", max_edits=2) == {}
+    
+    index.remove("1")
+    
+    assert len(index) == 0
+    assert index._postings == {}
+    assert index._word_trigrams == {}
+
+def oak(**fields):
+    tree = {"name": "The Old Oak", "tree_type": "Oak", "features": ["thick_branches"], "climb_count": 0}
+    tree.update(fields)
+    return tree
+
+def test_suggestions_complete_any_word_and_rank_by_popularity():
+    index = SuggestionIndex()
+    index.add("1", oak())
+    index.add("2", oak(name="Oakley's Maple", tree_type="Maple", climb_count=9))
+    
+    suggestions = index.suggest("oak", limit=5)
+    
+    assert [(s["kind"], s["text"]) for s in suggestions] == [
+        ("tree", "Oakley's Maple"), ("tree", "The Old Oak"), ("tree_type", "Oak")
+    ]
+    assert index.suggest("thick br", limit=5)[0]["count"] == 2
+
+def test_ranking_changes_reweight_without_rekeying():
+    index = SuggestionIndex()
+    index.add("1", oak())
+    index.add("2", oak(name="Oak Hollow"))
+    keys = list(index._keys)
+    
+    index.add("1", oak(climb_count=20, average_rating=5.0))
+    
+    assert list(index._keys) == keys
+    assert [s["tree_id"] for s in index.suggest("oak", limit=5) if s["kind"] == "tree"] == ["1", "2"]
+    assert index._entries["tree_type:oak"]["weight"] == popularity(oak(climb_count=20, average_rating=5.0)) + 1
+
+def test_renaming_and_removing_update_keys():
+    index = SuggestionIndex()
+    index.add("1", oak())
+    index.add("1", oak(name="Big Sycamore", tree_type="Sycamore", features=[]))
+    
+    assert index.suggest("old", limit=5) == []
+    assert index.suggest("syc", limit=5)[0]["text"] == "Big Sycamore"
+    
+    index.remove("1")
+    assert len(index) == 0
+    assert len(index._keys) == 0
+
+def test_text_match_outranks_popularity():
+    matching = {"name": "Old Maple", "tree_type": "Maple", "features": [], "average_rating": 0.0, "climb_count": 0}
+    popular = {"name": "Big Pine", "tree_type": "Pine", "features": [], "average_rating": 5.0, "climb_count": 20}
+    
+    misspelled = calculate_search_score(matching, query="mapel", text_match=0.8)
+    
+    assert misspelled > calculate_search_score(popular, query="mapel", text_match=0.0)
@@ -0,0 +1,70 @@
+# tests/test_singleflight.py
+import asyncio
+import pytest
+from app.core.singleflight import SingleFlight, SingleFlightTimeout
+
+async def test_concurrent_calls_share_one_execution():
+    group = SingleFlight("test-coalesce")
+    calls = []
+    async def load(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return {"value": value}
+    
+    first, second = await asyncio.gather(group.do("key", load, 1), group.do("key", load, 2))
+    
+    assert first is second
+    assert calls == [1]
+    assert group.stats()["coalesced"] == 1
+
+async def test_error_reaches_every_caller_and_clears_key():
+    group = SingleFlight("test-errors")
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+    
+    results = await asyncio.gather(group.do("key", fail), group.do("key", fail), return_exceptions=True)
+    
+    assert all(isinstance(result, ValueError) for result in results)
+    assert group.stats()["errors"] == 1
+    assert group.stats()["in_flight"] == 0
+
+async def test_waiter_timeout_leaves_call_running():
+    group = SingleFlight("test-timeout", timeout_seconds=0.01)
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+    
+    with pytest.raises(SingleFlightTimeout):
+        await group.do("key", slow)
+    assert group.stats()["timeouts"] == 1
+    
+    # Still in flight: a patient caller gets its result without a second execution
+    group.timeout_seconds = 1
+    assert await group.do("key", slow) == "done"
+    assert group.stats()["executions"] == 1
+
+async def test_call_timing_out_itself_is_not_a_waiter_timeout():
+    group = SingleFlight("test-inner-timeout", timeout_seconds=1)
+    async def driver_timeout():
+        raise asyncio.TimeoutError()
+    
+    with pytest.raises(asyncio.TimeoutError) as e:
+        await group.do("key", driver_timeout)
+    assert not isinstance(e.value, SingleFlightTimeout)
+    assert group.stats()["timeouts"] == 0
+
+async def test_cancelled_leader_doesnt_cancel_followers():
+    group = SingleFlight("test-cancel")
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "done"
+    
+    leader = asyncio.create_task(group.do("key", slow))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(group.do("key", slow))
+    await asyncio.sleep(0)
+    leader.cancel()
+    
+    assert await follower == "done"
+    assert leader.cancelled()
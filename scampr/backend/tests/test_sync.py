@@ -0,0 +1,162 @@
+# tests/test_sync.py
+from datetime import datetime, timedelta
+import pytest
+from app.models.review import Review
+from app.models.sync_operation import SyncOperation, PENDING
+from app.models.tree import Tree
+from app.services import sync
+from app.services.sync import run_sync_batch
+from factories import make_tree, make_user
+
+def create_tree(key: str) -> dict:
+    tree = {
+        "name": "The Old Oak",
+        "description": "",
+        "location": {"latitude": 40.0, "longitude": -74.0},
+        "address": "",
+        "tree_type": "Oak",
+        "difficulty": 3.0,
+        "height": 10.0,
+    }
+    return {"action": sync.CREATE_TREE, "idempotency_key": key, "tree": tree}
+
+async def test_replayed_key_returns_stored_result(mongo):
+    user = make_user()
+    await user.insert()
+    
+    first = await run_sync_batch(user, [create_tree("k1")])
+    replay = await run_sync_batch(user, [create_tree("k1")])
+    
+    assert replay[0]["replayed"] is True
+    assert replay[0]["result"] == first[0]["result"]
+    assert await Tree.count() == 1
+
+async def test_duplicate_key_in_batch_runs_once(mongo):
+    user = make_user()
+    await user.insert()
+    
+    results = await run_sync_batch(user, [create_tree("k1"), create_tree("k1")])
+    
+    assert results[0]["status"] == "ok"
+    assert results[1]["error"]["status_code"] == 400
+    assert await Tree.count() == 1
+
+async def test_failed_batch_releases_its_claims(mongo, monkeypatch):
+    user = make_user()
+    await user.insert()
+    def fail(*args):
+        raise RuntimeError("geohash failed")
+    monkeypatch.setattr(sync, "geo_regions", fail)
+    
+    with pytest.raises(RuntimeError):
+        await run_sync_batch(user, [create_tree("k1")])
+    assert await SyncOperation.count() == 0
+    
+    monkeypatch.undo()
+    results = await run_sync_batch(user, [create_tree("k1")])
+    assert results[0]["status"] == "ok"
+
+async def test_expired_claim_is_taken_over(mongo):
+    user = make_user()
+    await user.insert()
+    now = datetime.utcnow()
+    await SyncOperation(user_id=str(user.id), idempotency_key="stale", claim_id="dead", claimed_at=now - timedelta(days=1)).insert()
+    await SyncOperation(user_id=str(user.id), idempotency_key="running", claim_id="live", claimed_at=now).insert()
+    
+    results = await run_sync_batch(user, [create_tree("stale"), create_tree("running")])
+    
+    assert results[0]["status"] == "ok"
+    assert results[1]["status"] == "in_progress"
+    running = await SyncOperation.find_one(SyncOperation.idempotency_key == "running")
+    assert running.status == PENDING and running.claim_id == "live"
+
+def create_review(key: str, rating: float = 4.0, **target) -> dict:
+    return {"action": sync.CREATE_REVIEW, "idempotency_key": key, "rating": rating, "comment": "", **target}
+
+async def user_and_tree():
+    user = make_user()
+    await user.insert()
+    tree = make_tree("user-2")
+    await tree.insert()
+    return user, tree
+
+async def test_stale_update_conflicts_before_writing(mongo):
+    user, tree = await user_and_tree()
+    created = (await run_sync_batch(user, [create_review("k1", tree_id=str(tree.id))]))[0]["result"]
+    
+    results = await run_sync_batch(user, [
+        {"action": sync.UPDATE_REVIEW, "idempotency_key": "k2", "review_id": created["id"], "version": 3, "rating": 1.0},
+    ])
+    
+    assert results[0]["error"]["status_code"] == 409
+    assert (await Review.get(created["id"])).rating == 4.0
+
+async def test_update_losing_a_race_reports_conflict(mongo, monkeypatch):
+    user, tree = await user_and_tree()
+    created = (await run_sync_batch(user, [create_review("k1", tree_id=str(tree.id))]))[0]["result"]
+    bulk_write = sync._bulk_write
+    async def concurrent_edit_first(model, writes, results):
+        if model is Review:
+            # Another writer bumps the version between the batch's read and its write
+            await Review.get_motor_collection().update_one({"_id": writes[0][1]._filter["_id"]}, {"$inc": {"version": 1}})
+        return await bulk_write(model, writes, results)
+    monkeypatch.setattr(sync, "_bulk_write", concurrent_edit_first)
+    
+    results = await run_sync_batch(user, [
+        {"action": sync.UPDATE_REVIEW, "idempotency_key": "k2", "review_id": created["id"], "rating": 1.0},
+    ])
+    
+    assert results[0]["error"]["status_code"] == 409
+    assert (await Review.get(created["id"])).rating == 4.0
+
+async def test_delete_review_created_earlier_in_batch(mongo):
+    user, tree = await user_and_tree()
+    
+    results = await run_sync_batch(user, [
+        create_review("k1", tree_id=str(tree.id)),
+        {"action": sync.DELETE_REVIEW, "idempotency_key": "k2", "review_key": "k1"},
+        {"action": sync.DELETE_REVIEW, "idempotency_key": "k3", "review_key": "k1"},
+    ])
+    
+    assert [result["status"] for result in results[:2]] == ["ok", "ok"]
+    assert results[2]["error"]["status_code"] == 404
+    assert await Review.count() == 0
+
+async def test_review_of_failed_tree_is_not_executed(mongo, monkeypatch):
+    user = make_user()
+    await user.insert()
+    bulk_write = sync._bulk_write
+    async def tree_id_taken(model, writes, results):
+        if model is Tree:
+            await Tree.get_motor_collection().insert_one({"_id": writes[0][2]["_id"]})
+        return await bulk_write(model, writes, results)
+    monkeypatch.setattr(sync, "_bulk_write", tree_id_taken)
+    
+    results = await run_sync_batch(user, [create_tree("k1"), create_review("k2", tree_key="k1")])
+    
+    assert results[0]["error"]["status_code"] == 500
+    assert results[1]["status"] == "not_executed"
+    assert await Review.count() == 0
+    # The review's key is released for a retry; the failed tree keeps its result
+    assert [op.idempotency_key for op in await SyncOperation.find_all().to_list()] == ["k1"]
+
+async def test_follow_ups_are_queued_once_per_tree(mongo, monkeypatch):
+    user, tree = await user_and_tree()
+    other = make_tree("user-2")
+    await other.insert()
+    queued = []
+    monkeypatch.setattr(sync.task_queue, "enqueue", lambda key, func, *args: queued.append((key, args)))
+    
+    results = await run_sync_batch(user, [
+        create_review("k1", tree_id=str(tree.id)),
+        {"action": sync.UPDATE_REVIEW, "idempotency_key": "k2", "review_key": "k1", "rating": 5.0},
+        {"action": sync.UPDATE_REVIEW, "idempotency_key": "k3", "review_key": "k1", "rating": 2.0},
+        create_review("k4", tree_id=str(other.id)),
+    ])
+    
+    assert all(result["status"] == "ok" for result in results)
+    assert sorted(key for key, _ in queued if key.startswith("tree-stats:")) == sorted(
+        [f"tree-stats:{tree.id}", f"tree-stats:{other.id}"]
+    )
+    trending = [args[0] for key, args in queued if key.startswith("trending-batch:")]
+    assert len(trending) == 1 and set(trending[0]) == {str(tree.id), str(other.id)}
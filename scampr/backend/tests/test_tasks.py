@@ -0,0 +1,89 @@
+# tests/test_tasks.py
+import asyncio
+from app.core.tasks import TaskQueue, run_periodically
+
+def flaky(failures: int, calls: list):
+    """A job that fails its first few attempts"""
+    async def job(value):
+        calls.append(value)
+        if len(calls) <= failures:
+            raise RuntimeError("transient")
+    return job
+
+async def test_enqueue_coalesces_pending_jobs():
+    queue = TaskQueue(concurrency=1, max_retries=0, retry_base_delay=0.01)
+    calls = []
+    job = flaky(0, calls)
+    assert queue.enqueue("key", job, 1)
+    assert not queue.enqueue("key", job, 2)
+    
+    queue.start()
+    await queue.drain(timeout=1)
+    
+    # Latest arguments win
+    assert calls == [2]
+    assert queue.stats()["coalesced"] == 1
+
+async def test_failed_job_is_retried():
+    queue = TaskQueue(concurrency=1, max_retries=3, retry_base_delay=0.01)
+    calls = []
+    queue.start()
+    queue.enqueue("key", flaky(2, calls), "x")
+    await asyncio.sleep(0.2)
+    await queue.drain(timeout=1)
+    
+    assert len(calls) == 3
+    assert queue.stats()["completed"] == 1
+
+async def test_drain_runs_retries_instead_of_waiting_out_the_backoff():
+    queue = TaskQueue(concurrency=1, max_retries=3, retry_base_delay=60)
+    calls = []
+    queue.start()
+    queue.enqueue("waiting", flaky(1, calls), "x")
+    await asyncio.sleep(0.05)
+    assert queue.stats()["waiting_retry"] == 1
+    
+    await queue.drain(timeout=1)
+    
+    assert len(calls) == 2
+    assert queue.stats()["completed"] == 1
+    assert queue.stats()["lost"] == 0
+
+async def test_drain_retries_jobs_failing_during_the_drain():
+    queue = TaskQueue(concurrency=1, max_retries=3, retry_base_delay=60)
+    calls = []
+    queue.start()
+    queue.enqueue("key", flaky(2, calls), "x")
+    
+    await queue.drain(timeout=1)
+    
+    assert len(calls) == 3
+    assert queue.stats()["completed"] == 1
+
+async def test_drain_timeout_reports_lost_jobs():
+    queue = TaskQueue(concurrency=1, max_retries=0, retry_base_delay=0.01)
+    
+    async def slow():
+        await asyncio.sleep(10)
+    
+    queue.start()
+    queue.enqueue("slow", slow)
+    queue.enqueue("queued", slow)
+    await asyncio.sleep(0)
+    await queue.drain(timeout=0.05)
+    
+    # The running job was cancelled and the queued one never started
+    assert queue.stats()["lost"] == 2
+    assert queue.stats()["pending"] == 0
+
+async def test_run_periodically_can_run_at_start():
+    calls = []
+    
+    async def job():
+        calls.append(1)
+    
+    task = run_periodically("test", 60, job, run_at_start=True)
+    await asyncio.sleep(0.01)
+    task.cancel()
+    
+    assert calls == [1]
@@ -0,0 +1,55 @@
+# tests/test_tree_stats.py
+from datetime import datetime
+from app.models.review import Review
+from app.models.tree import Tree
+from app.services.sync import CREATE_REVIEW, run_sync_batch
+from app.services.tree_stats import recent_review, record_review_updated, refresh_tree_stats
+from factories import make_tree, make_user
+
+def legacy_review(tree_id: str) -> dict:
+    # Written before reviews carried version counters
+    return {"tree_id": tree_id, "user_id": "user-2", "user_name": "Climber", "rating": 4.0, "comment": "", "created_at": datetime.utcnow()}
+
+def test_recent_review_defaults_missing_counters():
+    copy = recent_review({"_id": "review-1", **legacy_review("tree-1")})
+    
+    assert copy["version"] == 0
+    assert copy["user_name_version"] == 0
+
+async def test_refresh_reads_legacy_reviews(mongo):
+    tree = make_tree()
+    await tree.insert()
+    await Review.get_motor_collection().insert_one(legacy_review(str(tree.id)))
+    
+    await refresh_tree_stats(str(tree.id))
+    
+    tree = await Tree.get(tree.id)
+    assert tree.climb_count == 1
+    assert tree.recent_reviews[0].version == 0
+
+async def test_update_skips_trees_without_read_model(mongo):
+    tree = make_tree()
+    await tree.insert()
+    await Tree.get_motor_collection().update_one({"_id": tree.id}, {"$unset": {"recent_reviews": "", "rating_histogram": ""}})
+    review = Review(tree_id=str(tree.id), user_id="user-2", user_name="Climber", rating=2.0, comment="", version=1)
+    await review.insert()
+    
+    await record_review_updated(review, old_rating=4.0)
+    
+    assert "recent_reviews" not in await Tree.get_motor_collection().find_one({"_id": tree.id})
+
+async def test_sync_review_updates_tree_detail(mongo):
+    user = make_user()
+    await user.insert()
+    tree = make_tree()
+    await tree.insert()
+    
+    results = await run_sync_batch(user, [
+        {"action": CREATE_REVIEW, "idempotency_key": "k1", "tree_id": str(tree.id), "rating": 5.0, "comment": "Great"},
+    ])
+    
+    # Before the queued full recompute runs
+    tree = await Tree.get(tree.id)
+    assert [review.id for review in tree.recent_reviews] == [results[0]["result"]["id"]]
+    assert tree.climb_count == 1
+    assert tree.rating_histogram == {"5": 1}
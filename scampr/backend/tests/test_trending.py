@@ -0,0 +1,23 @@
+# tests/test_trending.py
+from datetime import datetime, timedelta
+import pytest
+from app.core.config import settings
+from app.services.trending import activity_weight, decayed_score, validate_trending_settings
+
+def test_decayed_weight_halves_every_half_life():
+    now = datetime(2025, 6, 1)
+    weight = activity_weight(now - timedelta(hours=settings.TRENDING_HALF_LIFE_HOURS))
+    
+    assert decayed_score(weight, now) == pytest.approx(0.5)
+
+def test_default_settings_are_valid():
+    validate_trending_settings()
+
+def test_short_half_life_with_old_epoch_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "TRENDING_HALF_LIFE_HOURS", 24.0)
+    monkeypatch.setattr(settings, "TRENDING_EPOCH", datetime(2020, 1, 1))
+    
+    with pytest.raises(ValueError, match="TRENDING_EPOCH"):
+        validate_trending_settings()
+    # Weights saturate instead of raising OverflowError
+    assert activity_weight(datetime(2040, 1, 1)) < float("inf")
@@ -0,0 +1,74 @@
+# tests/test_versioning.py
+import json
+import pytest
+from fastapi import FastAPI, HTTPException
+from app.core.versioning import etag, parse_if_match
+from app.models.review import Review
+from app.models.tree import Tree
+from asgi import api_as, asgi_request
+from factories import make_tree, make_user
+
+def test_if_match_round_trips_etag():
+    assert parse_if_match(etag(7), 7) == 7
+    assert parse_if_match('W/"7"', 8) == 7
+    assert parse_if_match(None, 3) == 3
+
+def test_if_match_star_and_lists():
+    assert parse_if_match("*", 4) == 4
+    assert parse_if_match('"2", "4"', 4) == 4
+    # None of the listed versions is current: guard with one of them so the update conflicts
+    assert parse_if_match('"2", "3"', 4) == 2
+
+def test_if_match_rejects_foreign_etags():
+    with pytest.raises(HTTPException) as e:
+        parse_if_match('"abc123"', 0)
+    assert e.value.status_code == 400
+
+async def put(app: FastAPI, path: str, body: dict, if_match: str = None):
+    headers = [(b"content-type", b"application/json")]
+    if if_match is not None:
+        headers.append((b"if-match", if_match.encode()))
+    status, response_headers, _ = await asgi_request(app, "PUT", path, headers, [json.dumps(body).encode()])
+    return status, response_headers.get(b"etag")
+
+async def test_tree_update_checks_if_match(mongo):
+    user = make_user()
+    await user.insert()
+    tree = make_tree(str(user.id), description="Broad limbs")
+    await tree.insert()
+    app = api_as(user)
+
+    assert await put(app, f"/trees/{tree.id}", {"name": "Renamed"}, etag(0)) == (200, b'"1"')
+    # A second writer that also read version 0 loses
+    assert await put(app, f"/trees/{tree.id}", {"name": "Other"}, etag(0)) == (409, None)
+    assert await put(app, f"/trees/{tree.id}", {"height": 12.0}, '"0", "1"') == (200, b'"2"')
+    assert await put(app, f"/trees/{tree.id}", {"height": 14.0}, "*") == (200, b'"3"')
+
+    stored = await Tree.get(tree.id)
+    # Only the sent fields are written
+    assert (stored.name, stored.description, stored.height) == ("Renamed", "Broad limbs", 14.0)
+
+async def test_tree_update_matches_unversioned_documents(mongo):
+    user = make_user()
+    await user.insert()
+    tree = make_tree(str(user.id))
+    await tree.insert()
+    await Tree.get_motor_collection().update_one({"_id": tree.id}, {"$unset": {"version": ""}})
+
+    assert await put(api_as(user), f"/trees/{tree.id}", {"name": "Renamed"}, etag(0)) == (200, b'"1"')
+
+async def test_review_update_checks_if_match(mongo):
+    user = make_user()
+    await user.insert()
+    tree = make_tree()
+    await tree.insert()
+    review = Review(tree_id=str(tree.id), user_id=str(user.id), user_name="Climber", rating=3.0, comment="")
+    await review.insert()
+    app = api_as(user)
+
+    assert await put(app, f"/reviews/{review.id}", {"rating": 4.0, "comment": "Better"}, etag(0)) == (200, b'"1"')
+    assert await put(app, f"/reviews/{review.id}", {"rating": 1.0, "comment": "Stale"}, etag(0)) == (409, None)
+    assert await put(app, f"/reviews/{review.id}", {"rating": 1.0, "comment": ""}, "not-an-etag") == (400, None)
+
+    stored = await Review.get(review.id)
+    assert (stored.rating, stored.comment, stored.version) == (4.0, "Better", 1)